@@ -1,15 +1,39 @@
-from flask import Flask, jsonify, request, render_template
+from flask import Flask, jsonify, request, render_template, Response, stream_with_context
 from flask_cors import CORS
+from flask_caching import Cache
 from config import Config
+import atexit
+import json
 import logging
 import os
 
 # Import test modules
-from tests import website_tests, email_tests, connection_tests
+from tests import website_tests, email_tests, connection_tests, mail, tls
+from tests.runner import SUITES, iter_scan_events, run_scan_coalesced
+from tests.singleflight import SingleFlight
+from tests.result_cache import ResultCache
+from tests.history import HistoryStore, sqlite_path
+from tests.shared import normalize_domain
+from tests.resolver import resolvers
+from tests.dns_cache import DNSCache
+from tests.dns_transport import MultiplexedTransport
+from tests.dns_encrypted import TLSTransport, HTTPSTransport
+from tests.iterative import IterativeResolver
+from tests.upstreams import UpstreamPool, parse_upstreams
+from tests.spf_tree import spf_tree_cache
+from tests.dnssec_validator import zone_key_cache
+from tests.spf_policy import compile_spf_policy
+from tests.bulk import JSON_BYTES_PER_DOMAIN, iter_unique_domains, run_bulk
+from tests.prefetch import prefetch_stats
+from tests.tls_sessions import session_cache as tls_session_cache
+from tests.cert_cache import certificate_cache
+from tests.tls_enum import endpoint_cache as tls_endpoint_cache
+from tests.jobs import JobManager, JobQueueFull
 
 app = Flask(__name__, static_folder='static')
 app.config.from_object(Config)
 CORS(app)
+cache = Cache(app)
 
 # Configure logging
 logging.basicConfig(
@@ -21,8 +45,122 @@ logging.basicConfig(
     ]
 )
 
+# httpx logs every request at INFO, which with DNS-over-HTTPS means every lookup
+logging.getLogger('httpx').setLevel(logging.WARNING)
+
 logger = logging.getLogger(__name__)
 
+# DNS answers shared by all scans in this process
+if app.config['DNS_CACHE_MAX_ENTRIES'] > 0:
+    resolvers.set_cache(DNSCache(max_entries=app.config['DNS_CACHE_MAX_ENTRIES']))
+else:
+    resolvers.set_cache(None)
+
+# Resolve iteratively, or pipeline queries over a few sockets or encrypted connections, instead of one exchange per lookup
+dns_transport = None
+if app.config['DNS_RESOLUTION_MODE'] == 'iterative':
+    # Authoritative servers only speak plain DNS, so the transport settings don't apply
+    if app.config['DNS_TRANSPORT'] not in ('resolver', 'multiplexed') or app.config['DNS_UPSTREAMS']:
+        logger.warning("Iterative DNS resolution ignores DNS_TRANSPORT and DNS_UPSTREAMS")
+    dns_transport = IterativeResolver(
+        transport=MultiplexedTransport(
+            sockets=app.config['DNS_TRANSPORT_SOCKETS'],
+            max_outstanding=app.config['DNS_TRANSPORT_MAX_OUTSTANDING']
+        ),
+        root_hints=[hint.strip() for hint in app.config['DNS_ROOT_HINTS'].split(',') if hint.strip()],
+        max_zones=app.config['DNS_DELEGATION_CACHE_MAX_ZONES']
+    )
+elif app.config['DNS_TRANSPORT'] == 'tls':
+    dns_transport = TLSTransport(
+        server_name=app.config['DNS_TLS_SERVER_NAME'],
+        ca_file=app.config['DNS_TLS_CA_FILE'],
+        connections=app.config['DNS_ENCRYPTED_CONNECTIONS'],
+        max_outstanding=app.config['DNS_TRANSPORT_MAX_OUTSTANDING']
+    )
+elif app.config['DNS_TRANSPORT'] == 'https':
+    dns_transport = HTTPSTransport(
+        [url.strip() for url in app.config['DNS_DOH_URLS'].split(',') if url.strip()],
+        ca_file=app.config['DNS_TLS_CA_FILE'],
+        connections=app.config['DNS_ENCRYPTED_CONNECTIONS'],
+        max_outstanding=app.config['DNS_TRANSPORT_MAX_OUTSTANDING']
+    )
+elif app.config['DNS_TRANSPORT'] == 'multiplexed' or app.config['DNS_UPSTREAMS']:
+    dns_transport = MultiplexedTransport(
+        sockets=app.config['DNS_TRANSPORT_SOCKETS'],
+        max_outstanding=app.config['DNS_TRANSPORT_MAX_OUTSTANDING']
+    )
+
+# Spread queries over the fastest healthy upstreams (DoH endpoints fail over in order instead)
+if app.config['DNS_UPSTREAMS'] and isinstance(dns_transport, (MultiplexedTransport, TLSTransport)):
+    dns_transport = UpstreamPool(
+        parse_upstreams(app.config['DNS_UPSTREAMS'], 853 if app.config['DNS_TRANSPORT'] == 'tls' else 53),
+        transport=dns_transport,
+        attempt_timeout=app.config['DNS_UPSTREAM_ATTEMPT_TIMEOUT'],
+        eject_after=app.config['DNS_UPSTREAM_EJECT_AFTER'],
+        eject_seconds=app.config['DNS_UPSTREAM_EJECT_SECONDS'],
+        hedge_percentile=app.config['DNS_HEDGE_PERCENTILE'] / 100 or None
+    )
+
+if dns_transport is not None:
+    resolvers.set_transport(dns_transport)
+    atexit.register(dns_transport.close)
+
+# DKIM selector dictionary
+mail.configure_dkim(
+    selectors=mail.load_dkim_selectors(app.config['DKIM_SELECTORS_FILE']),
+    concurrency=app.config['DKIM_CONCURRENCY'],
+    time_budget=app.config['DKIM_TIME_BUDGET']
+)
+
+# TLS version and cipher suite enumeration
+tls.configure_enumeration(
+    enabled=app.config['TLS_ENUMERATION'],
+    per_host=app.config['TLS_ENUM_PER_HOST'],
+    endpoint_ttl=app.config['TLS_ENDPOINT_CACHE_TTL']
+)
+
+# TLS sessions resumed by later probes of the same endpoint
+tls_session_cache.max_entries = app.config['TLS_SESSION_CACHE_MAX_ENTRIES']
+tls_session_cache.ttl = app.config['TLS_SESSION_TTL']
+
+# Certificates analyzed once per fingerprint
+certificate_cache.max_entries = app.config['CERT_CACHE_MAX_ENTRIES']
+
+# Category results reused across scans
+result_cache = ResultCache(
+    cache,
+    default_ttl=app.config['CACHE_DEFAULT_TIMEOUT'],
+    category_ttls=app.config['RESULT_CACHE_TTLS'],
+    dns_categories=app.config['RESULT_CACHE_DNS_CATEGORIES'],
+    min_dns_ttl=app.config['RESULT_CACHE_MIN_DNS_TTL'],
+    max_dns_ttl=app.config['RESULT_CACHE_MAX_DNS_TTL'],
+    error_ttl=app.config['RESULT_CACHE_ERROR_TTL'],
+    stale_ttl=app.config['RESULT_CACHE_STALE_TTL']
+)
+
+# Persistent scan history, written in the background
+history = None
+if app.config['HISTORY_ENABLED']:
+    history_path = sqlite_path(app.config['SQLALCHEMY_DATABASE_URI'])
+    if history_path:
+        history = HistoryStore(history_path, batch_size=app.config['HISTORY_BATCH_SIZE'])
+        atexit.register(history.close)
+    else:
+        logger.warning("Scan history needs a sqlite:/// DATABASE_URL; history is disabled")
+
+# Identical concurrent scans share one execution
+scan_flight = SingleFlight(lock_dir=app.config['SCAN_COALESCE_DIR'])
+
+# Background workers for queued scans
+job_manager = JobManager(
+    max_workers=app.config['JOB_WORKERS'],
+    result_ttl=app.config['JOB_RESULT_TTL'],
+    max_queued=app.config['JOB_MAX_QUEUED'],
+    check_workers=app.config['MAX_CHECK_WORKERS'],
+    cache=result_cache,
+    history=history
+)
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -35,7 +173,16 @@ def api_info():
         "endpoints": [
             "/api/test/website",
             "/api/test/email",
-            "/api/test/connection"
+            "/api/test/connection",
+            "/api/test/bulk",
+            "/api/spf/check",
+            "/api/stream/website",
+            "/api/stream/email",
+            "/api/jobs",
+            "/api/jobs/<job_id>",
+            "/api/history/<suite>/<domain>",
+            "/api/history/<suite>/<domain>/latest",
+            "/api/stats"
         ]
     })
 
@@ -49,7 +196,14 @@ def test_website():
     logger.info(f"Starting website test for domain: {domain}")
     
     try:
-        results = website_tests.run_website_tests(domain)
+        results = run_scan_coalesced(
+            scan_flight,
+            'website',
+            domain,
+            max_workers=app.config['MAX_CHECK_WORKERS'],
+            cache=result_cache,
+            history=history
+        )
         return jsonify(results)
     except Exception as e:
         logger.error(f"Error testing website {domain}: {str(e)}")
@@ -65,7 +219,14 @@ def test_email():
     logger.info(f"Starting email test for domain: {domain}")
     
     try:
-        results = email_tests.run_email_tests(domain)
+        results = run_scan_coalesced(
+            scan_flight,
+            'email',
+            domain,
+            max_workers=app.config['MAX_CHECK_WORKERS'],
+            cache=result_cache,
+            history=history
+        )
         return jsonify(results)
     except Exception as e:
         logger.error(f"Error testing email {domain}: {str(e)}")
@@ -83,5 +244,192 @@ def test_connection():
         logger.error(f"Error testing connection: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/test/bulk', methods=['POST'])
+def test_bulk():
+    """
+    Scan a list of domains and stream one NDJSON line per finished domain.
+    
+    Domains come from a JSON body ({"suite": ..., "domains": [...]}), an
+    uploaded file field named "file", or a plain-text body, one per line.
+    At most BULK_MAX_DOMAINS distinct domains are scanned per request.
+    """
+    max_domains = app.config['BULK_MAX_DOMAINS']
+    if request.is_json:
+        # A JSON body is parsed as a whole, so its size is capped up front
+        max_bytes = max_domains * JSON_BYTES_PER_DOMAIN
+        if request.content_length is None or request.content_length > max_bytes:
+            return jsonify({"error": f"JSON body must declare a Content-Length of at most {max_bytes} bytes"}), 413
+        data = request.get_json()
+        if not data or not isinstance(data.get('domains'), list):
+            return jsonify({"error": "Domains are required"}), 400
+        if len(data['domains']) > max_domains:
+            return jsonify({"error": f"At most {max_domains} domains per request"}), 400
+        suite = data.get('suite', 'website')
+        lines = data['domains']
+    elif 'file' in request.files:
+        suite = request.form.get('suite', 'website')
+        lines = request.files['file'].stream
+    else:
+        suite = request.args.get('suite', 'website')
+        lines = request.stream
+    
+    if suite not in SUITES:
+        return jsonify({"error": f"Unknown test suite: {suite}"}), 400
+    
+    logger.info(f"Starting bulk {suite} test")
+    
+    def generate():
+        results = run_bulk(
+            iter_unique_domains(lines, max_domains=max_domains),
+            suite,
+            concurrency=app.config['BULK_CONCURRENCY'],
+            max_workers=app.config['MAX_CHECK_WORKERS'],
+            flight=scan_flight,
+            cache=result_cache,
+            history=history,
+            prefetch_window=app.config['BULK_PREFETCH_WINDOW'],
+            prefetch_concurrency=app.config['BULK_PREFETCH_CONCURRENCY']
+        )
+        for result in results:
+            yield json.dumps(result) + "\n"
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/api/spf/check', methods=['POST'])
+def check_spf():
+    """Evaluate a domain's SPF policy for a list of sender IP addresses."""
+    data = request.get_json()
+    if not data or 'domain' not in data:
+        return jsonify({"error": "Domain is required"}), 400
+    ips = data.get('ips')
+    if not isinstance(ips, list) or not ips:
+        return jsonify({"error": "IP addresses are required"}), 400
+    if len(ips) > app.config['SPF_CHECK_MAX_IPS']:
+        return jsonify({"error": f"At most {app.config['SPF_CHECK_MAX_IPS']} IP addresses per request"}), 400
+    
+    domain = normalize_domain(data['domain'])
+    if not domain:
+        return jsonify({"error": "Domain is required"}), 400
+    logger.info(f"Checking {len(ips)} addresses against the SPF policy of {domain}")
+    
+    try:
+        policy = compile_spf_policy(domain)
+        results = policy.check_hosts(ips)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error checking SPF for {domain}: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+    
+    return jsonify({
+        "domain": domain,
+        "record": policy.record,
+        "lookups": policy.lookups,
+        "unevaluated": policy.unevaluated,
+        "results": [{"ip": ip, **result._asdict()} for ip, result in zip(ips, results)]
+    })
+
+@app.route('/api/stream/<suite>', methods=['GET'])
+def stream_test(suite):
+    """Run a website or email test and push results as Server-Sent Events."""
+    if suite not in SUITES:
+        return jsonify({"error": f"Unknown test suite: {suite}"}), 404
+    
+    domain = request.args.get('domain', '').strip()
+    if not domain:
+        return jsonify({"error": "Domain is required"}), 400
+    
+    logger.info(f"Starting streamed {suite} test for domain: {domain}")
+    
+    def generate():
+        events = iter_scan_events(
+            suite,
+            domain,
+            max_workers=app.config['MAX_CHECK_WORKERS'],
+            cache=result_cache,
+            history=history
+        )
+        for event, data in events:
+            if event is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.route('/api/jobs', methods=['POST'])
+def create_job():
+    data = request.get_json()
+    if not data or 'domain' not in data:
+        return jsonify({"error": "Domain is required"}), 400
+    
+    suite = data.get('suite', 'website')
+    if suite not in SUITES:
+        return jsonify({"error": f"Unknown test suite: {suite}"}), 400
+    
+    try:
+        job = job_manager.submit(suite, data['domain'])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except JobQueueFull as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "30"}
+    return jsonify({
+        "job_id": job["id"],
+        "status": job["status"],
+        "url": f"/api/jobs/{job['id']}"
+    }), 202
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+@app.route('/api/history/<suite>/<domain>', methods=['GET'])
+def get_history(suite, domain):
+    """Past runs of a test suite for a domain, newest first."""
+    if history is None:
+        return jsonify({"error": "Scan history is disabled"}), 404
+    if suite not in SUITES:
+        return jsonify({"error": f"Unknown test suite: {suite}"}), 404
+    
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    before = request.args.get('before', type=float)
+    runs = history.history(suite, normalize_domain(domain), limit=limit, before=before)
+    return jsonify({"domain": normalize_domain(domain), "suite": suite, "runs": runs})
+
+@app.route('/api/history/<suite>/<domain>/latest', methods=['GET'])
+def get_latest(suite, domain):
+    """Most recent stored result of a test suite for a domain."""
+    if history is None:
+        return jsonify({"error": "Scan history is disabled"}), 404
+    if suite not in SUITES:
+        return jsonify({"error": f"Unknown test suite: {suite}"}), 404
+    
+    run = history.latest(suite, normalize_domain(domain))
+    if run is None:
+        return jsonify({"error": "No stored results"}), 404
+    return jsonify(run)
+
+@app.route('/api/stats', methods=['GET'])
+def get_stats():
+    """Counters of the shared scan infrastructure."""
+    return jsonify({
+        "dns": resolvers.stats.snapshot(),
+        "dns_cache": resolvers.cache.stats() if resolvers.cache else None,
+        "dns_transport": resolvers.transport.stats() if resolvers.transport else None,
+        "spf_tree_cache": spf_tree_cache.stats(),
+        "dnssec_zone_keys": zone_key_cache.stats(),
+        "dns_prefetch": prefetch_stats.snapshot(),
+        "tls_sessions": tls_session_cache.stats(),
+        "tls_endpoints": tls_endpoint_cache.stats(),
+        "certificate_cache": certificate_cache.stats()
+    })
+
 if __name__ == '__main__':
     app.run(debug=app.config['DEBUG'], host='0.0.0.0', port=5000)
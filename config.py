@@ -13,14 +13,36 @@ class Config:
     # Database settings
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///security_checker.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    HISTORY_ENABLED = os.environ.get('HISTORY_ENABLED', 'True').lower() == 'true'
+    HISTORY_BATCH_SIZE = int(os.environ.get('HISTORY_BATCH_SIZE', 500))  # runs committed per transaction
     
     # Cache settings
     CACHE_TYPE = "SimpleCache"  # Flask-Caching default
     CACHE_DEFAULT_TIMEOUT = 300
+    RESULT_CACHE_TTLS = {  # seconds category results stay fresh
+        'tls': int(os.environ.get('RESULT_CACHE_TLS_TTL', 3600)),
+        'appsecpriv': int(os.environ.get('RESULT_CACHE_APPSECPRIV_TTL', 900)),
+        'starttls': int(os.environ.get('RESULT_CACHE_STARTTLS_TTL', 3600))
+    }
+    RESULT_CACHE_DNS_CATEGORIES = ('ipv6', 'dnssec', 'spf', 'dkim', 'dmarc')  # follow DNS record TTLs
+    RESULT_CACHE_MIN_DNS_TTL = int(os.environ.get('RESULT_CACHE_MIN_DNS_TTL', 60))  # seconds
+    RESULT_CACHE_MAX_DNS_TTL = int(os.environ.get('RESULT_CACHE_MAX_DNS_TTL', 86400))  # seconds
+    RESULT_CACHE_ERROR_TTL = int(os.environ.get('RESULT_CACHE_ERROR_TTL', 60))  # seconds results with errors stay fresh
+    RESULT_CACHE_STALE_TTL = int(os.environ.get('RESULT_CACHE_STALE_TTL', 3600))  # seconds expired results are served while refreshing
     
     # Test settings
     CONN_TEST_DOMAIN = os.environ.get('CONN_TEST_DOMAIN') or 'internet.nl'
     SMTP_EHLO_DOMAIN = os.environ.get('SMTP_EHLO_DOMAIN') or 'internet.nl'
+    DKIM_SELECTORS_FILE = os.environ.get('DKIM_SELECTORS_FILE')  # one selector per line, defaults to the bundled list
+    DKIM_CONCURRENCY = int(os.environ.get('DKIM_CONCURRENCY', 16))  # selector lookups in flight per domain
+    DKIM_TIME_BUDGET = int(os.environ.get('DKIM_TIME_BUDGET', 30))  # seconds for all selector lookups of a domain
+    SPF_CHECK_MAX_IPS = int(os.environ.get('SPF_CHECK_MAX_IPS', 100000))  # addresses per SPF check request
+    TLS_ENUMERATION = os.environ.get('TLS_ENUMERATION', 'True').lower() == 'true'  # probe every TLS version and cipher suite
+    TLS_ENUM_PER_HOST = int(os.environ.get('TLS_ENUM_PER_HOST', 8))  # enumeration handshakes in flight per host
+    TLS_ENDPOINT_CACHE_TTL = int(os.environ.get('TLS_ENDPOINT_CACHE_TTL', 3600))  # seconds names on one IP:port share findings, 0 disables
+    TLS_SESSION_CACHE_MAX_ENTRIES = int(os.environ.get('TLS_SESSION_CACHE_MAX_ENTRIES', 10000))  # resumable sessions, 0 disables
+    TLS_SESSION_TTL = int(os.environ.get('TLS_SESSION_TTL', 3600))  # upper bound on the lifetime of a cached session
+    CERT_CACHE_MAX_ENTRIES = int(os.environ.get('CERT_CACHE_MAX_ENTRIES', 10000))  # analyzed certificates, 0 disables the cache
     
     # Feature flags - which tests to enable
     CHECK_SUPPORT_IPV6 = os.environ.get('CHECK_SUPPORT_IPV6', 'True').lower() == 'true'
@@ -36,6 +58,43 @@ class Config:
     DNS_TIMEOUT = 5  # seconds
     HTTP_TIMEOUT = 10  # seconds
     
+    # DNS cache settings
+    DNS_CACHE_MAX_ENTRIES = int(os.environ.get('DNS_CACHE_MAX_ENTRIES', 10000))  # cached answers, 0 disables the cache
+    
+    # DNS transport settings
+    DNS_TRANSPORT = os.environ.get('DNS_TRANSPORT', 'resolver')  # "resolver", "multiplexed", "tls" (DoT) or "https" (DoH)
+    DNS_TRANSPORT_SOCKETS = int(os.environ.get('DNS_TRANSPORT_SOCKETS', 4))  # UDP sockets of the multiplexed transport
+    DNS_TRANSPORT_MAX_OUTSTANDING = int(os.environ.get('DNS_TRANSPORT_MAX_OUTSTANDING', 1024))  # queries in flight
+    DNS_DOH_URLS = os.environ.get('DNS_DOH_URLS', '')  # comma separated DNS-over-HTTPS endpoints, tried in order
+    DNS_TLS_SERVER_NAME = os.environ.get('DNS_TLS_SERVER_NAME')  # name verified in DoT certificates, the address if unset
+    DNS_TLS_CA_FILE = os.environ.get('DNS_TLS_CA_FILE')  # CA bundle for DoT/DoH servers, the system store if unset
+    DNS_ENCRYPTED_CONNECTIONS = int(os.environ.get('DNS_ENCRYPTED_CONNECTIONS', 2))  # DoT/DoH connections kept per server
+    
+    # DNS resolution settings
+    DNS_RESOLUTION_MODE = os.environ.get('DNS_RESOLUTION_MODE', 'recursive')  # "recursive" or "iterative" (from the root)
+    DNS_ROOT_HINTS = os.environ.get('DNS_ROOT_HINTS', '')  # comma separated root server addresses, the IANA ones if unset
+    DNS_DELEGATION_CACHE_MAX_ZONES = int(os.environ.get('DNS_DELEGATION_CACHE_MAX_ZONES', 10000))  # cached zone cuts
+    
+    # DNS upstream settings
+    DNS_UPSTREAMS = os.environ.get('DNS_UPSTREAMS', '')  # comma separated resolvers, e.g. "1.1.1.1, 9.9.9.9:53"
+    DNS_UPSTREAM_ATTEMPT_TIMEOUT = float(os.environ.get('DNS_UPSTREAM_ATTEMPT_TIMEOUT', 2))  # seconds before failing over
+    DNS_UPSTREAM_EJECT_AFTER = int(os.environ.get('DNS_UPSTREAM_EJECT_AFTER', 3))  # consecutive failures that eject an upstream
+    DNS_UPSTREAM_EJECT_SECONDS = int(os.environ.get('DNS_UPSTREAM_EJECT_SECONDS', 30))  # seconds an upstream stays ejected
+    DNS_HEDGE_PERCENTILE = int(os.environ.get('DNS_HEDGE_PERCENTILE', 0))  # latency percentile before a hedged query, 0 disables
+    
+    # Concurrency settings
+    MAX_CHECK_WORKERS = int(os.environ.get('MAX_CHECK_WORKERS', 8))  # sub-checks run in parallel per scan
+    BULK_CONCURRENCY = int(os.environ.get('BULK_CONCURRENCY', 16))  # domains scanned in parallel per bulk request
+    BULK_PREFETCH_WINDOW = int(os.environ.get('BULK_PREFETCH_WINDOW', 64))  # domains whose DNS is prefetched ahead, 0 disables
+    BULK_PREFETCH_CONCURRENCY = int(os.environ.get('BULK_PREFETCH_CONCURRENCY', 64))  # prefetch queries in flight
+    BULK_MAX_DOMAINS = int(os.environ.get('BULK_MAX_DOMAINS', 100000))  # distinct domains scanned per bulk request
+    SCAN_COALESCE_DIR = os.environ.get('SCAN_COALESCE_DIR')  # shared dir to coalesce scans across workers
+    
+    # Background job settings
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 4))  # queued scans run in parallel
+    JOB_RESULT_TTL = int(os.environ.get('JOB_RESULT_TTL', 3600))  # seconds finished jobs stay pollable
+    JOB_MAX_QUEUED = int(os.environ.get('JOB_MAX_QUEUED', 1000))  # jobs waiting or running before new ones get 503
+    
     # Security Headers
     SECURITY_HEADERS = [
         'Strict-Transport-Security',
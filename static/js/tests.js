@@ -25,16 +25,8 @@ websiteTestBtn.addEventListener('click', async () => {
     websiteTestBtn.innerHTML = '<i class="fas fa-spinner fa-spin"></i> <span lang="en">Testing...</span><span lang="hi">परीक्षण जारी...</span><span lang="bn">পরীক্ষা চলছে...</span>';
     websiteResults.innerHTML = '<div class="test-result"><div class="test-name"><i class="fas fa-spinner spinner"></i> <span lang="en">Running tests...</span><span lang="hi">परीक्षण चल रहा है...</span><span lang="bn">পরীক্ষা চলছে...</span></div></div>';
     
-    try {        const response = await fetch(`${API_URL}/test/website`, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({ domain })
-        });
-        
-        const data = await response.json();
-        displayResults(websiteResults, data);
+    try {
+        await runTest('website', domain, websiteResults);
     } catch (error) {        websiteResults.innerHTML = `<div class="test-result failure"><div class="test-name"><i class="fas fa-exclamation-circle"></i> Error</div><div class="test-description">${error.message}</div></div>`;
     } finally {
         websiteTestBtn.disabled = false;
@@ -67,16 +59,7 @@ emailTestBtn.addEventListener('click', async () => {
     emailResults.innerHTML = '<div class="test-result"><div class="test-name"><i class="fas fa-spinner spinner"></i> <span lang="en">Running tests...</span><span lang="hi">परीक्षण चल रहा है...</span><span lang="bn">পরীক্ষা চলছে...</span></div></div>';
     
     try {
-        const response = await fetch(`${API_URL}/test/email`, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({ domain })
-        });
-        
-        const data = await response.json();
-        displayResults(emailResults, data);
+        await runTest('email', domain, emailResults);
     } catch (error) {
         emailResults.innerHTML = `<div class="test-result failure"><div class="test-name"><i class="fas fa-exclamation-circle"></i> Error</div><div class="test-description">${error.message}</div></div>`;
     } finally {
@@ -106,6 +89,99 @@ connectionTestBtn.addEventListener('click', async () => {
     }
 });
 
+// Run a website or email test, streaming results when the browser supports it
+async function runTest(suite, domain, container) {
+    if (window.EventSource) {
+        try {
+            await streamResults(suite, domain, container);
+            return;
+        } catch (error) {
+            // Fall back to a single request if the stream could not be used
+        }
+    }
+    
+    const response = await fetch(`${API_URL}/test/${suite}`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({ domain })
+    });
+    
+    const data = await response.json();
+    displayResults(container, data);
+}
+
+// Render results incrementally from the Server-Sent Events stream
+function streamResults(suite, domain, container) {
+    return new Promise((resolve, reject) => {
+        const source = new EventSource(`${API_URL}/stream/${suite}?domain=${encodeURIComponent(domain)}`);
+        const partial = {};
+        let received = false;
+        let finished = false;
+        
+        container.innerHTML = `
+        <div class="test-result" data-stream-status>
+            <div class="test-name"><i class="fas fa-spinner spinner"></i> <span lang="en">Running tests...</span><span lang="hi">परीक्षण चल रहा है...</span><span lang="bn">পরীক্ষা চলছে...</span></div>
+        </div>`;
+        
+        source.addEventListener('check', (event) => {
+            received = true;
+            const data = JSON.parse(event.data);
+            // A single-test category (e.g. dkim) is rendered by its category event
+            if (data.test === data.category) {
+                return;
+            }
+            const categoryData = partial[data.category] || { name: data.category, tests: {}, score: null };
+            categoryData.tests[data.test] = data.result;
+            partial[data.category] = categoryData;
+            renderStreamedCategory(container, data.category, categoryData, true);
+        });
+        
+        source.addEventListener('category', (event) => {
+            received = true;
+            const data = JSON.parse(event.data);
+            partial[data.category] = data.result;
+            renderStreamedCategory(container, data.category, data.result, false);
+        });
+        
+        source.addEventListener('done', (event) => {
+            finished = true;
+            source.close();
+            displayResults(container, JSON.parse(event.data));
+            resolve();
+        });
+        
+        source.addEventListener('error', () => {
+            if (finished) {
+                return;
+            }
+            source.close();
+            if (received) {
+                reject(new Error('Connection to the server was lost'));
+            } else {
+                reject(new Error('Streaming not available'));
+            }
+        });
+    }).catch((error) => {
+        if (error.message === 'Streaming not available') {
+            throw error;
+        }
+        container.innerHTML = `<div class="test-result failure"><div class="test-name"><i class="fas fa-exclamation-circle"></i> Error</div><div class="test-description">${error.message}</div></div>`;
+    });
+}
+
+// Insert or replace the block of a single category while streaming
+function renderStreamedCategory(container, category, categoryData, pending) {
+    let block = container.querySelector(`[data-category="${category}"]`);
+    if (!block) {
+        block = document.createElement('div');
+        block.setAttribute('data-category', category);
+        container.appendChild(block);
+    }
+    block.innerHTML = renderCategory(categoryData, pending);
+}
+
 // Function to display test results
 function displayResults(container, data) {
     if (data.error) {
@@ -140,39 +216,46 @@ function displayResults(container, data) {
     
     // Display category results
     if (data.categories) {
-        for (const [category, categoryData] of Object.entries(data.categories)) {
-            const categoryScoreClass = categoryData.score >= 80 ? 'success' : categoryData.score >= 50 ? 'warning' : 'failure';
-            
-            html += `
-            <div class="test-result ${categoryScoreClass}">
-                <div class="test-name">
-                    <i class="fas ${categoryData.score >= 80 ? 'fa-check-circle' : categoryData.score >= 50 ? 'fa-exclamation-triangle' : 'fa-times-circle'}"></i>
-                    <span lang="en">${categoryData.name}: ${categoryData.score}/100</span>
-                    <span lang="hi">${getCategoryNameHindi(categoryData.name)}: ${categoryData.score}/100</span>
-                    <span lang="bn">${getCategoryNameBengali(categoryData.name)}: ${categoryData.score}/100</span>
-                </div>`;
-            
-            // Display individual tests
-            if (categoryData.tests) {
-                for (const [testName, testData] of Object.entries(categoryData.tests)) {
-                    const testScoreClass = testData.score >= 80 ? 'success' : testData.score >= 50 ? 'warning' : 'failure';
-                    
-                    html += `
-                    <div class="test-description">
-                        <i class="fas ${testData.score >= 80 ? 'fa-check' : testData.score >= 50 ? 'fa-exclamation' : 'fa-times'}" style="font-size: 0.8em;"></i>
-                        <span lang="en">${testData.name}: ${testData.status}</span>
-                        <span lang="hi">${getTestNameHindi(testData.name)}: ${getStatusHindi(testData.status)}</span>
-                        <span lang="bn">${getTestNameBengali(testData.name)}: ${getStatusBengali(testData.status)}</span>
-                    </div>`;
-                }
-            }
-            html += `</div>`;
+        for (const categoryData of Object.values(data.categories)) {
+            html += renderCategory(categoryData, false);
         }
     }
     
     container.innerHTML = html;
 }
 
+// Build the HTML of one category and its individual tests
+function renderCategory(categoryData, pending) {
+    const categoryScoreClass = pending ? '' : categoryData.score >= 80 ? 'success' : categoryData.score >= 50 ? 'warning' : 'failure';
+    const categoryIcon = pending ? 'fa-spinner spinner' : categoryData.score >= 80 ? 'fa-check-circle' : categoryData.score >= 50 ? 'fa-exclamation-triangle' : 'fa-times-circle';
+    const categoryScore = pending ? '' : `: ${categoryData.score}/100`;
+    
+    let html = `
+    <div class="test-result ${categoryScoreClass}">
+        <div class="test-name">
+            <i class="fas ${categoryIcon}"></i>
+            <span lang="en">${categoryData.name}${categoryScore}</span>
+            <span lang="hi">${getCategoryNameHindi(categoryData.name)}${categoryScore}</span>
+            <span lang="bn">${getCategoryNameBengali(categoryData.name)}${categoryScore}</span>
+        </div>`;
+    
+    // Display individual tests
+    if (categoryData.tests) {
+        for (const testData of Object.values(categoryData.tests)) {
+            html += `
+            <div class="test-description">
+                <i class="fas ${testData.score >= 80 ? 'fa-check' : testData.score >= 50 ? 'fa-exclamation' : 'fa-times'}" style="font-size: 0.8em;"></i>
+                <span lang="en">${testData.name}: ${testData.status}</span>
+                <span lang="hi">${getTestNameHindi(testData.name)}: ${getStatusHindi(testData.status)}</span>
+                <span lang="bn">${getTestNameBengali(testData.name)}: ${getStatusBengali(testData.status)}</span>
+            </div>`;
+        }
+    }
+    html += `</div>`;
+    
+    return html;
+}
+
 // Helper function to translate category names to Hindi
 function getCategoryNameHindi(name) {
     const translations = {
@@ -3,15 +3,38 @@
 
 from . import (
     scoring,
+    dns_cache,
+    dns_transport,
+    dns_encrypted,
+    upstreams,
+    iterative,
+    resolver,
     shared,
+    scheduler,
+    context,
+    singleflight,
+    result_cache,
+    history,
+    aio,
     ipv6,
+    dnssec_validator,
     dnssec,
+    tls_sessions,
+    cert_cache,
+    tls_probe,
+    tls_enum,
     tls,
     appsecpriv,
     mail,
+    spf_tree,
+    spf_policy,
     spf_parser,
     dmarc_parser,
     website_tests,
     email_tests,
-    connection_tests
+    connection_tests,
+    runner,
+    prefetch,
+    bulk,
+    jobs
 )
@@ -0,0 +1,230 @@
+"""
+Asyncio network primitives for Internet security tests.
+Non-blocking counterparts of the DNS, TCP, TLS, HTTP and SMTP probes.
+"""
+import asyncio
+import logging
+import smtplib
+import ssl
+import weakref
+import httpx
+from dns.resolver import NXDOMAIN, NoAnswer, NoNameservers
+from .resolver import resolvers
+from .context import memoize_async
+from .shared import dns_key, format_answer, observe_ttl
+
+logger = logging.getLogger(__name__)
+
+# Shared HTTP clients of each event loop, keyed by certificate verification
+_http_clients = weakref.WeakKeyDictionary()
+
+async def dns_lookup(domain, record_type='A', timeout=5, nameservers=None):
+    """
+    Perform a DNS lookup for a specific record type without blocking
+
+    Args:
+        domain (str): Domain name to query
+        record_type (str): DNS record type (A, AAAA, MX, TXT, etc.)
+        timeout (int): Timeout in seconds
+        nameservers (list): Optional list of nameservers to use
+
+    Returns:
+        list: List of record values
+
+    Raises:
+        NXDOMAIN: If domain does not exist
+        NoAnswer: If no records exist for the requested type
+        Exception: For other errors
+    """
+    try:
+        answer = await resolve(domain, record_type, timeout=timeout, nameservers=nameservers)
+        return format_answer(answer, record_type)
+    except (NXDOMAIN, NoAnswer, NoNameservers) as e:
+        logger.debug(f"DNS lookup failed for {domain} ({record_type}): {str(e)}")
+        raise
+    except Exception as e:
+        logger.error(f"Error in DNS lookup for {domain} ({record_type}): {str(e)}")
+        raise
+
+async def resolve(domain, record_type='A', timeout=5, nameservers=None, use_dnssec=False):
+    """
+    Resolve a DNS record and return the raw answer
+
+    Args:
+        domain (str): Domain name to query
+        record_type (str): DNS record type
+        timeout (int): Timeout in seconds
+        nameservers (list): Optional list of nameservers to use
+        use_dnssec (bool): Set the DO bit on the query
+
+    Returns:
+        dns.resolver.Answer: DNS answer
+    """
+    answer = await memoize_async(
+        dns_key(domain, record_type, nameservers, use_dnssec),
+        lambda: resolvers.resolve_async(
+            domain, record_type, timeout=timeout, nameservers=nameservers, use_dnssec=use_dnssec
+        )
+    )
+    observe_ttl(answer)
+    return answer
+
+async def is_port_open(host, port, timeout=5):
+    """
+    Check if a port is open on a host without blocking
+
+    Args:
+        host (str): Hostname or IP address
+        port (int): Port number
+        timeout (int): Timeout in seconds
+
+    Returns:
+        bool: True if port is open, False otherwise
+    """
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        writer.close()
+        await writer.wait_closed()
+        return True
+    except Exception:
+        return False
+
+async def http_get(url, timeout=10, allow_redirects=True, verify=True):
+    """
+    Perform an HTTP GET request without blocking
+
+    Args:
+        url (str): URL to fetch
+        timeout (int): Timeout in seconds
+        allow_redirects (bool): Follow redirects
+        verify (bool): Verify the server certificate
+
+    Returns:
+        httpx.Response: Response of the final request
+    """
+    client = await _http_client(verify)
+    return await client.get(url, timeout=timeout, follow_redirects=allow_redirects)
+
+async def close_http_clients():
+    """
+    Close the shared HTTP clients of the running event loop
+
+    asyncio.run() closes them when it shuts the loop down; loops managed
+    by hand should await this before closing.
+    """
+    entry = _http_clients.pop(asyncio.get_running_loop(), None)
+    if entry is not None:
+        await entry[1].aclose()
+
+async def _http_client(verify):
+    """HTTP client shared by the requests of the running loop, so connections are reused"""
+    loop = asyncio.get_running_loop()
+    entry = _http_clients.get(loop)
+    if entry is None:
+        clients = {}
+        # The loop finalizes pending async generators on shutdown, which
+        # closes the clients along with it
+        closer = _close_on_shutdown(clients)
+        await closer.__anext__()
+        entry = _http_clients[loop] = (clients, closer)
+    clients = entry[0]
+    client = clients.get(verify)
+    if client is None or client.is_closed:
+        client = clients[verify] = httpx.AsyncClient(verify=verify)
+    return client
+
+async def _close_on_shutdown(clients):
+    """Async generator that closes `clients` when it is finalized"""
+    try:
+        yield
+    finally:
+        # The generator refers to its loop, so the entry must not outlive it
+        _http_clients.pop(asyncio.get_running_loop(), None)
+        for client in list(clients.values()):
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.debug(f"Error closing HTTP client: {str(e)}")
+        clients.clear()
+
+async def smtp_starttls(host, port=25, timeout=10, ehlo_domain='internet.nl'):
+    """
+    Connect to an SMTP server and upgrade the session with STARTTLS
+
+    Args:
+        host (str): Mail server hostname
+        port (int): Port number
+        timeout (int): Timeout in seconds
+        ehlo_domain (str): Domain announced in EHLO
+
+    Returns:
+        dict: "starttls" flag and negotiated "protocol" when supported
+    """
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    try:
+        await _smtp_reply(reader, timeout)
+        extensions = await _smtp_command(reader, writer, f"EHLO {ehlo_domain}", timeout)
+        if not any(line.upper().startswith('STARTTLS') for line in extensions):
+            await _smtp_quit(reader, writer, timeout)
+            return {"starttls": False}
+
+        await _smtp_command(reader, writer, "STARTTLS", timeout)
+        if not hasattr(writer, 'start_tls'):
+            # StreamWriter.start_tls only exists on Python 3.11+
+            writer.close()
+            return await asyncio.get_running_loop().run_in_executor(
+                None, _smtp_starttls_blocking, host, port, timeout
+            )
+
+        context = ssl.create_default_context()
+        await asyncio.wait_for(writer.start_tls(context, server_hostname=host.rstrip('.')), timeout)
+        await _smtp_command(reader, writer, f"EHLO {ehlo_domain}", timeout)
+        protocol = writer.get_extra_info('ssl_object').version()
+        await _smtp_quit(reader, writer, timeout)
+        return {"starttls": True, "protocol": protocol}
+    finally:
+        writer.close()
+
+async def _smtp_reply(reader, timeout):
+    """Read a (possibly multi-line) SMTP reply and return its text lines"""
+    lines = []
+    while True:
+        line = await asyncio.wait_for(reader.readline(), timeout)
+        if not line:
+            raise ConnectionError("Connection closed by SMTP server")
+        line = line.decode('utf-8', 'replace').rstrip('\r\n')
+        code, separator, text = line[:3], line[3:4], line[4:]
+        if not code.isdigit() or int(code) >= 400:
+            raise smtplib.SMTPResponseException(int(code) if code.isdigit() else -1, line)
+        lines.append(text)
+        if separator != '-':
+            return lines
+
+async def _smtp_command(reader, writer, command, timeout):
+    """Send an SMTP command and return the reply lines"""
+    writer.write(f"{command}\r\n".encode('ascii'))
+    await writer.drain()
+    return await _smtp_reply(reader, timeout)
+
+async def _smtp_quit(reader, writer, timeout):
+    """Close an SMTP session politely"""
+    try:
+        await _smtp_command(reader, writer, "QUIT", timeout)
+    except Exception:
+        pass
+
+def _smtp_starttls_blocking(host, port, timeout):
+    """STARTTLS probe using smtplib, used where asyncio cannot upgrade streams"""
+    smtp = smtplib.SMTP(host, port, timeout=timeout)
+    try:
+        smtp.ehlo()
+        if not smtp.has_extn('STARTTLS'):
+            return {"starttls": False}
+        smtp.starttls(context=ssl.create_default_context())
+        smtp.ehlo()
+        return {"starttls": True, "protocol": smtp.sock.version()}
+    finally:
+        try:
+            smtp.quit()
+        except Exception:
+            pass
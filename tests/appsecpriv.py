@@ -7,6 +7,9 @@ import requests
 from urllib.parse import urlparse
 from .shared import create_test_result
 from .scoring import Score, TestStatus
+from .scheduler import Check, run_category
+from .context import memoize, memoize_async
+from . import aio
 
 logger = logging.getLogger(__name__)
 
@@ -50,37 +53,45 @@ def test_website_security(domain):
     """
     logger.info(f"Testing website security for domain: {domain}")
     
-    results = {
-        "name": "Security & Privacy",
-        "status": TestStatus.RUNNING.value,
-        "tests": {},
-        "score": None
-    }
+    return run_category("Security & Privacy", get_checks(domain))
+
+def get_checks(domain):
+    """
+    Build the security and privacy checks
     
-    try:
-        # Test HTTPS redirection
-        redirect_test = test_https_redirect(domain)
-        results["tests"]["https_redirect"] = redirect_test
-        
-        # Test security headers
-        headers_test = test_security_headers(domain)
-        results["tests"]["security_headers"] = headers_test
-        
-        # Test cookie security
-        cookie_test = test_cookie_security(domain)
-        results["tests"]["cookie_security"] = cookie_test
-        
-        # Calculate overall score
-        score_sum = sum(test["score"] for test in results["tests"].values())
-        results["score"] = score_sum / len(results["tests"])
-        results["status"] = TestStatus.DONE.value
+    Args:
+        domain (str): Domain name to test
         
-    except Exception as e:
-        logger.error(f"Error in security test for {domain}: {str(e)}")
-        results["status"] = TestStatus.ERROR.value
-        results["error"] = str(e)
-    
-    return results
+    Returns:
+        list: List of Check objects
+    """
+    return [
+        Check(
+            "https_redirect",
+            lambda: test_https_redirect(domain),
+            afunc=lambda: test_https_redirect_async(domain)
+        ),
+        Check(
+            "security_headers",
+            lambda: test_security_headers(domain),
+            afunc=lambda: test_security_headers_async(domain)
+        ),
+        Check(
+            "cookie_security",
+            lambda: test_cookie_security(domain),
+            afunc=lambda: test_cookie_security_async(domain)
+        )
+    ]
+
+def _http_get(url):
+    """GET a URL once per scan, following redirects and verifying certificates"""
+    return memoize(("http_get", url), lambda: requests.get(url, timeout=10, allow_redirects=True, verify=True))
+
+async def _http_get_async(url):
+    """GET a URL once per scan without blocking"""
+    return await memoize_async(
+        ("aio_http_get", url), lambda: aio.http_get(url, timeout=10, allow_redirects=True, verify=True)
+    )
 
 def test_https_redirect(domain):
     """
@@ -93,25 +104,29 @@ def test_https_redirect(domain):
         dict: Test result
     """
     try:
-        response = requests.get(f"http://{domain}", timeout=10, allow_redirects=True)
-        final_url = response.url
-        
-        redirects_to_https = final_url.startswith('https://')
+        response = _http_get(f"http://{domain}")
+        return _https_redirect_result(response.url)
+    except Exception as e:
+        return create_test_result(
+            "HTTPS Redirect",
+            "error",
+            Score.FAILED,
+            {"error": str(e)}
+        )
+
+async def test_https_redirect_async(domain):
+    """
+    Test if a domain redirects HTTP to HTTPS without blocking
+    
+    Args:
+        domain (str): Domain name to test
         
-        if redirects_to_https:
-            return create_test_result(
-                "HTTPS Redirect",
-                "done",
-                Score.GOOD,
-                {"redirects": True, "final_url": final_url}
-            )
-        else:
-            return create_test_result(
-                "HTTPS Redirect",
-                "done",
-                Score.FAILED,
-                {"redirects": False, "final_url": final_url}
-            )
+    Returns:
+        dict: Test result
+    """
+    try:
+        response = await _http_get_async(f"http://{domain}")
+        return _https_redirect_result(str(response.url))
     except Exception as e:
         return create_test_result(
             "HTTPS Redirect",
@@ -120,6 +135,25 @@ def test_https_redirect(domain):
             {"error": str(e)}
         )
 
+def _https_redirect_result(final_url):
+    """Score the final URL reached from the plain HTTP site"""
+    redirects_to_https = final_url.startswith('https://')
+    
+    if redirects_to_https:
+        return create_test_result(
+            "HTTPS Redirect",
+            "done",
+            Score.GOOD,
+            {"redirects": True, "final_url": final_url}
+        )
+    else:
+        return create_test_result(
+            "HTTPS Redirect",
+            "done",
+            Score.FAILED,
+            {"redirects": False, "final_url": final_url}
+        )
+
 def test_security_headers(domain):
     """
     Test security headers for a domain
@@ -131,38 +165,29 @@ def test_security_headers(domain):
         dict: Test result
     """
     try:
-        response = requests.get(f"https://{domain}", timeout=10, verify=True)
-        
-        headers = response.headers
-        security_headers_found = {}
-        
-        for header in SECURITY_HEADERS:
-            security_headers_found[header] = header in headers
-        
-        # Count how many security headers are present
-        headers_count = sum(1 for present in security_headers_found.values() if present)
-        total_headers = len(SECURITY_HEADERS)
-        
-        # Determine score based on percentage of headers present
-        if headers_count == total_headers:
-            score = Score.GOOD
-        elif headers_count >= total_headers * 0.7:
-            score = Score.SUFFICIENT
-        elif headers_count >= total_headers * 0.4:
-            score = Score.WARNING
-        else:
-            score = Score.BAD
-            
+        response = _http_get(f"https://{domain}")
+        return _security_headers_result(response.headers)
+    except Exception as e:
         return create_test_result(
             "Security Headers",
-            "done",
-            score,
-            {
-                "headers": security_headers_found,
-                "found": headers_count,
-                "total": total_headers
-            }
+            "error",
+            Score.FAILED,
+            {"error": str(e)}
         )
+
+async def test_security_headers_async(domain):
+    """
+    Test security headers for a domain without blocking
+    
+    Args:
+        domain (str): Domain name to test
+        
+    Returns:
+        dict: Test result
+    """
+    try:
+        response = await _http_get_async(f"https://{domain}")
+        return _security_headers_result(response.headers)
     except Exception as e:
         return create_test_result(
             "Security Headers",
@@ -171,6 +196,38 @@ def test_security_headers(domain):
             {"error": str(e)}
         )
 
+def _security_headers_result(headers):
+    """Score the security headers present in a response"""
+    security_headers_found = {}
+    
+    for header in SECURITY_HEADERS:
+        security_headers_found[header] = header in headers
+    
+    # Count how many security headers are present
+    headers_count = sum(1 for present in security_headers_found.values() if present)
+    total_headers = len(SECURITY_HEADERS)
+    
+    # Determine score based on percentage of headers present
+    if headers_count == total_headers:
+        score = Score.GOOD
+    elif headers_count >= total_headers * 0.7:
+        score = Score.SUFFICIENT
+    elif headers_count >= total_headers * 0.4:
+        score = Score.WARNING
+    else:
+        score = Score.BAD
+        
+    return create_test_result(
+        "Security Headers",
+        "done",
+        score,
+        {
+            "headers": security_headers_found,
+            "found": headers_count,
+            "total": total_headers
+        }
+    )
+
 def test_cookie_security(domain):
     """
     Test cookie security for a domain
@@ -182,59 +239,29 @@ def test_cookie_security(domain):
         dict: Test result
     """
     try:
-        response = requests.get(f"https://{domain}", timeout=10, verify=True)
-        
-        cookies = response.cookies
-        cookie_count = len(cookies)
-        
-        if cookie_count == 0:
-            return create_test_result(
-                "Cookie Security",
-                "done",
-                Score.GOOD,
-                {"cookies": 0, "note": "No cookies set"}
-            )
-        
-        secure_count = 0
-        httponly_count = 0
-        samesite_count = 0
-        
-        for cookie in cookies:
-            if cookie.secure:
-                secure_count += 1
-            if cookie.has_nonstandard_attr('httponly'):
-                httponly_count += 1
-            if cookie.has_nonstandard_attr('samesite'):
-                samesite_count += 1
-        
-        secure_percent = secure_count / cookie_count
-        httponly_percent = httponly_count / cookie_count
-        samesite_percent = samesite_count / cookie_count
-        
-        # Calculate average security score
-        security_score = (secure_percent + httponly_percent + samesite_percent) / 3
-        
-        if security_score >= 0.9:
-            score = Score.GOOD
-        elif security_score >= 0.7:
-            score = Score.SUFFICIENT
-        elif security_score >= 0.4:
-            score = Score.WARNING
-        else:
-            score = Score.BAD
-            
+        response = _http_get(f"https://{domain}")
+        return _cookie_security_result(list(response.cookies))
+    except Exception as e:
         return create_test_result(
             "Cookie Security",
-            "done",
-            score,
-            {
-                "cookies": cookie_count,
-                "secure": secure_count,
-                "httponly": httponly_count,
-                "samesite": samesite_count,
-                "security_score": round(security_score * 100, 1)
-            }
+            "error",
+            Score.FAILED,
+            {"error": str(e)}
         )
+
+async def test_cookie_security_async(domain):
+    """
+    Test cookie security for a domain without blocking
+    
+    Args:
+        domain (str): Domain name to test
+        
+    Returns:
+        dict: Test result
+    """
+    try:
+        response = await _http_get_async(f"https://{domain}")
+        return _cookie_security_result(list(response.cookies.jar))
     except Exception as e:
         return create_test_result(
             "Cookie Security",
@@ -242,3 +269,64 @@ def test_cookie_security(domain):
             Score.FAILED,
             {"error": str(e)}
         )
+
+def _cookie_security_result(cookies):
+    """
+    Score the attributes of the cookies set by a site
+    
+    Args:
+        cookies (list): List of http.cookiejar.Cookie objects
+        
+    Returns:
+        dict: Test result
+    """
+    cookie_count = len(cookies)
+    
+    if cookie_count == 0:
+        return create_test_result(
+            "Cookie Security",
+            "done",
+            Score.GOOD,
+            {"cookies": 0, "note": "No cookies set"}
+        )
+    
+    secure_count = 0
+    httponly_count = 0
+    samesite_count = 0
+    
+    for cookie in cookies:
+        if cookie.secure:
+            secure_count += 1
+        if cookie.has_nonstandard_attr('httponly'):
+            httponly_count += 1
+        if cookie.has_nonstandard_attr('samesite'):
+            samesite_count += 1
+    
+    secure_percent = secure_count / cookie_count
+    httponly_percent = httponly_count / cookie_count
+    samesite_percent = samesite_count / cookie_count
+    
+    # Calculate average security score
+    security_score = (secure_percent + httponly_percent + samesite_percent) / 3
+    
+    if security_score >= 0.9:
+        score = Score.GOOD
+    elif security_score >= 0.7:
+        score = Score.SUFFICIENT
+    elif security_score >= 0.4:
+        score = Score.WARNING
+    else:
+        score = Score.BAD
+        
+    return create_test_result(
+        "Cookie Security",
+        "done",
+        score,
+        {
+            "cookies": cookie_count,
+            "secure": secure_count,
+            "httponly": httponly_count,
+            "samesite": samesite_count,
+            "security_score": round(security_score * 100, 1)
+        }
+    )
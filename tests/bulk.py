@@ -0,0 +1,154 @@
+"""
+Bulk scanning for Internet security tests.
+Runs a suite over a stream of domains with bounded concurrency.
+"""
+import hashlib
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from .prefetch import Prefetcher
+from .resolver import resolvers
+from .runner import run_scan, run_scan_coalesced
+from .scoring import TestStatus
+from .shared import normalize_domain
+
+logger = logging.getLogger(__name__)
+
+# Default number of domains scanned at the same time
+DEFAULT_CONCURRENCY = 16
+
+# JSON body bytes allowed per domain: a quoted name, separator and indentation
+JSON_BYTES_PER_DOMAIN = 300
+
+def iter_unique_domains(lines, max_domains=None):
+    """
+    Normalize and deduplicate domains from an iterable of lines
+
+    An 8-byte digest of each domain seen is kept for deduplication, so
+    `max_domains` bounds the memory used as well as the number of scans;
+    input past the limit is not read.
+
+    Items that are neither str nor bytes (numbers, null, objects of a
+    JSON array) are skipped, as they can't name a domain.
+
+    Args:
+        lines (iterable): Domain names (str or bytes), one per item
+        max_domains (int): Maximum number of distinct domains, None for no limit
+
+    Yields:
+        str: Normalized domain names, first occurrence only
+    """
+    seen = set()
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', 'replace')
+        elif not isinstance(line, str):
+            logger.warning(f"Skipping bulk entry that is not a domain name: {line!r:.100}")
+            continue
+        domain = normalize_domain(line)
+        if not domain or domain.startswith('#'):
+            continue
+        digest = hashlib.blake2b(domain.encode('utf-8'), digest_size=8).digest()
+        if digest in seen:
+            continue
+        if max_domains is not None and len(seen) >= max_domains:
+            logger.warning(f"Bulk input has more than {max_domains} domains, the rest are not scanned")
+            return
+        seen.add(digest)
+        yield domain
+
+def run_bulk(domains, suite, concurrency=None, max_workers=None, flight=None, cache=None,
+             history=None, prefetch_window=0, prefetch_concurrency=None):
+    """
+    Scan many domains, yielding each result as soon as it completes
+
+    At most `concurrency` scans are in flight; a new domain is only pulled
+    from `domains` after a finished result has been consumed, so a slow
+    consumer throttles the scans (backpressure) and memory use is bounded.
+
+    With `prefetch_window`, that many domains beyond the running scans are
+    read ahead and their predictable DNS lookups resolved into the answer
+    cache while earlier scans run, so their scans mostly hit the cache.
+
+    Args:
+        domains (iterable): Domain names to scan (consumed lazily)
+        suite (str): Suite name ("website" or "email")
+        concurrency (int): Maximum number of domains scanned at once
+        max_workers (int): Maximum number of sub-checks per scan
+        flight (SingleFlight): Optional group to coalesce scans with other requests
+        cache (ResultCache): Optional cache of category results
+        history (HistoryStore): Optional store the results are recorded in
+        prefetch_window (int): Domains whose DNS lookups are prefetched ahead
+            of their scans, 0 to disable
+        prefetch_concurrency (int): Prefetch queries in flight at the same time
+
+    Yields:
+        dict: Scan results in completion order
+    """
+    concurrency = concurrency or DEFAULT_CONCURRENCY
+    domains = iter(domains)
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    running = {}
+    exhausted = False
+    # Prefetched answers are only kept by the resolvers' answer cache
+    prefetcher = None
+    if prefetch_window and resolvers.cache is not None:
+        prefetcher = Prefetcher(suite, concurrency=prefetch_concurrency)
+    upcoming = deque()
+
+    try:
+        while True:
+            # Read ahead of the scans and prefetch what they will look up
+            while prefetcher is not None and not exhausted and len(upcoming) < concurrency + prefetch_window:
+                try:
+                    domain = next(domains)
+                except StopIteration:
+                    exhausted = True
+                    break
+                prefetcher.feed(domain)
+                upcoming.append(domain)
+
+            # Top up the window of in-flight scans
+            while len(running) < concurrency:
+                if upcoming:
+                    domain = upcoming.popleft()
+                elif exhausted or prefetcher is not None:
+                    break
+                else:
+                    try:
+                        domain = next(domains)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                if flight is not None:
+                    future = executor.submit(
+                        run_scan_coalesced, flight, suite, domain, max_workers, cache, history
+                    )
+                else:
+                    future = executor.submit(
+                        run_scan, suite, domain, max_workers, cache=cache, history=history
+                    )
+                running[future] = domain
+
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                domain = running.pop(future)
+                try:
+                    yield future.result()
+                except GeneratorExit:
+                    raise
+                except Exception as e:
+                    logger.error(f"Error in bulk {suite} test for {domain}: {str(e)}")
+                    yield {
+                        "domain": domain,
+                        "status": TestStatus.ERROR.value,
+                        "error": str(e)
+                    }
+    finally:
+        # Drop queued scans when the consumer goes away early
+        executor.shutdown(wait=False, cancel_futures=True)
+        if prefetcher is not None:
+            prefetcher.close()
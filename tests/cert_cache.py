@@ -0,0 +1,225 @@
+"""
+Certificate analysis cache for Internet security tests.
+Parses each distinct certificate once, keyed by its SHA-256 fingerprint.
+"""
+import datetime
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from cryptography import x509
+from cryptography.hazmat.primitives.asymmetric import dsa, ec, ed448, ed25519, rsa
+from OpenSSL import crypto
+from requests.certs import where as default_ca_bundle
+
+logger = logging.getLogger(__name__)
+
+# Default number of cached certificates
+DEFAULT_MAX_ENTRIES = 10000
+
+class ParsedCertificate:
+    """
+    Analyzed form of a certificate, independent of the host presenting it
+
+    Host names are split into exact names and wildcard parents, so matching
+    a host costs two set lookups. The subject common name only counts when
+    there are no DNS alternative names (RFC 6125 section 6.4.4). The
+    outcome of verifying the most recent chain the certificate came with
+    is kept until the first certificate of that chain expires.
+
+    Args:
+        der (bytes): DER encoded certificate
+        fingerprint (str): Hex SHA-256 fingerprint of `der`
+    """
+    def __init__(self, der, fingerprint):
+        cert = x509.load_der_x509_certificate(der)
+        self.fingerprint = fingerprint
+        self.not_before = cert.not_valid_before
+        self.not_after = cert.not_valid_after
+        self.subject = _common_name(cert.subject)
+        self.issuer = _common_name(cert.issuer)
+        self.key_type, self.key_bits = _key_description(cert.public_key())
+
+        self.alt_names = []
+        names = []
+        try:
+            san = cert.extensions.get_extension_for_class(x509.SubjectAlternativeName).value
+        except x509.ExtensionNotFound:
+            san = None
+        if san is not None:
+            for name in san:
+                if isinstance(name, x509.DNSName):
+                    self.alt_names.append(f"DNS:{name.value}")
+                    names.append(name.value)
+                elif isinstance(name, x509.IPAddress):
+                    self.alt_names.append(f"IP Address:{name.value}")
+        if not names and self.subject:
+            names.append(self.subject)
+
+        self.names = set()
+        self.wildcards = set()
+        for name in names:
+            name = name.lower().rstrip('.')
+            if name.startswith('*.'):
+                self.wildcards.add(name[2:])
+            else:
+                self.names.add(name)
+        # (chain key, valid until, trusted, error) of the latest verification
+        self._verified = None
+
+    def is_valid(self, now=None):
+        """True if `now` (UTC, the current time by default) is within the validity window"""
+        now = now or datetime.datetime.utcnow()
+        return self.not_before <= now <= self.not_after
+
+    def matches(self, hostname):
+        """
+        Check whether the certificate covers a host name
+
+        A wildcard covers exactly one label, so "*.example.com" matches
+        "www.example.com" but neither "example.com" nor "a.b.example.com".
+
+        Args:
+            hostname (str): Host name to match
+
+        Returns:
+            bool: True if a DNS alternative name, or the subject without any, covers it
+        """
+        hostname = hostname.lower().rstrip('.')
+        if hostname in self.names:
+            return True
+        parent = hostname.partition('.')[2]
+        return bool(parent) and parent in self.wildcards
+
+class CertificateCache:
+    """
+    Thread-safe LRU cache of analyzed certificates keyed by SHA-256 fingerprint
+
+    Sites behind the same CDN or hosting platform present identical
+    certificates, so a bulk scan parses each one once and only matches
+    host names against it afterwards.
+
+    Args:
+        max_entries (int): Maximum number of cached certificates, 0 disables the cache
+        ca_file (str): CA bundle chains are verified against, the one requests
+            uses by default
+    """
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ca_file=None):
+        self.max_entries = max_entries
+        self.ca_file = ca_file
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._store = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def analyze(self, chain):
+        """
+        Analyze the certificate chain a server presented
+
+        Args:
+            chain (list): DER encoded certificates, leaf first
+
+        Returns:
+            ParsedCertificate: Analyzed leaf certificate, or None for an empty chain
+        """
+        if not chain:
+            return None
+        fingerprint = hashlib.sha256(chain[0]).hexdigest()
+        with self._lock:
+            parsed = self._entries.get(fingerprint)
+            if parsed is not None:
+                self._entries.move_to_end(fingerprint)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if parsed is None:
+            parsed = ParsedCertificate(chain[0], fingerprint)
+            self._store_entry(fingerprint, parsed)
+        return parsed
+
+    def verify(self, parsed, chain):
+        """
+        Verify a chain up to a trusted root, reusing the last outcome if the chain is the same
+
+        Args:
+            parsed (ParsedCertificate): Analyzed leaf certificate
+            chain (list): DER encoded certificates, leaf first
+
+        Returns:
+            tuple: (trusted, error message or None)
+        """
+        key = tuple(hashlib.sha256(der).digest() for der in chain[1:])
+        now = datetime.datetime.utcnow()
+        outcome = parsed._verified
+        if outcome is not None and outcome[0] == key and now <= outcome[1]:
+            return outcome[2], outcome[3]
+
+        certs = [crypto.load_certificate(crypto.FILETYPE_ASN1, der) for der in chain]
+        try:
+            crypto.X509StoreContext(self._trust_store(), certs[0], certs[1:]).verify_certificate()
+            trusted, error = True, None
+        except crypto.X509StoreContextError as e:
+            trusted, error = False, str(e)
+        # An outcome holds until a certificate of the chain expires
+        until = min(cert.to_cryptography().not_valid_after for cert in certs)
+        parsed._verified = (key, until, trusted, error)
+        return trusted, error
+
+    def clear(self):
+        """Remove all entries"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Hit, miss and eviction counters as a dict"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None
+            }
+
+    def _trust_store(self):
+        """Trusted roots, loaded on first use"""
+        if self._store is None:
+            store = crypto.X509Store()
+            store.load_locations(self.ca_file or default_ca_bundle())
+            self._store = store
+        return self._store
+
+    def _store_entry(self, fingerprint, parsed):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[fingerprint] = parsed
+            self._entries.move_to_end(fingerprint)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+def _common_name(name):
+    attributes = name.get_attributes_for_oid(x509.NameOID.COMMON_NAME)
+    return attributes[0].value if attributes else None
+
+def _key_description(key):
+    """Key algorithm and size in bits of a public key"""
+    if isinstance(key, rsa.RSAPublicKey):
+        return "RSA", key.key_size
+    if isinstance(key, ec.EllipticCurvePublicKey):
+        return f"EC ({key.curve.name})", key.key_size
+    if isinstance(key, ed25519.Ed25519PublicKey):
+        return "Ed25519", 256
+    if isinstance(key, ed448.Ed448PublicKey):
+        return "Ed448", 456
+    if isinstance(key, dsa.DSAPublicKey):
+        return "DSA", key.key_size
+    return type(key).__name__, None
+
+# Certificates shared by all scans in this process
+certificate_cache = CertificateCache()
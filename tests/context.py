@@ -0,0 +1,145 @@
+"""
+Scan context for Internet security tests.
+Memoizes DNS answers and network fetches for the lifetime of one scan.
+"""
+import asyncio
+import contextvars
+import logging
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Scan context of the scan running in the current context, if any
+_scan_context = contextvars.ContextVar('scan_context', default=None)
+
+class ScanContext:
+    """
+    Per-scan memo of lookups shared by all sub-checks of a scan
+
+    The first caller asking for a key performs the lookup; concurrent and
+    later callers wait for and reuse its outcome, including exceptions.
+    Threads and coroutines share the same memo.
+    """
+    def __init__(self):
+        self._futures = {}
+        self._lock = threading.Lock()
+        self.performed = 0
+        self.saved = 0
+
+    def memoize(self, key, fn):
+        """
+        Return the memoized outcome of `fn` for `key`, running it once
+
+        Args:
+            key (hashable): Identity of the lookup
+            fn (callable): Zero-argument callable performing the lookup
+
+        Returns:
+            Result of `fn`
+        """
+        future, leader = self._claim(key)
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        future.set_result(result)
+        return result
+
+    async def memoize_async(self, key, afn):
+        """
+        Coroutine counterpart of memoize
+
+        Args:
+            key (hashable): Identity of the lookup
+            afn (callable): Zero-argument coroutine function performing the lookup
+
+        Returns:
+            Result of `afn`
+        """
+        future, leader = self._claim(key)
+        if not leader:
+            return await asyncio.wrap_future(future)
+
+        try:
+            result = await afn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        future.set_result(result)
+        return result
+
+    def report(self):
+        """Number of lookups performed and saved by sharing"""
+        with self._lock:
+            return {"performed": self.performed, "saved": self.saved}
+
+    def _claim(self, key):
+        """Future for a key and whether the caller has to compute it"""
+        with self._lock:
+            future = self._futures.get(key)
+            if future is not None:
+                self.saved += 1
+                return future, False
+            future = self._futures[key] = Future()
+            self.performed += 1
+            return future, True
+
+def current_context():
+    """ScanContext of the running scan, or None outside a scan"""
+    return _scan_context.get()
+
+@contextmanager
+def scan_context(context=None):
+    """
+    Run the enclosed code inside a scan context
+
+    Args:
+        context (ScanContext): Context to use, a new one by default
+
+    Yields:
+        ScanContext: The active context
+    """
+    context = context or ScanContext()
+    token = _scan_context.set(context)
+    try:
+        yield context
+    finally:
+        _scan_context.reset(token)
+
+def memoize(key, fn):
+    """
+    Memoize a lookup in the running scan, or just run it outside a scan
+
+    Args:
+        key (hashable): Identity of the lookup
+        fn (callable): Zero-argument callable performing the lookup
+
+    Returns:
+        Result of `fn`
+    """
+    context = _scan_context.get()
+    if context is None:
+        return fn()
+    return context.memoize(key, fn)
+
+async def memoize_async(key, afn):
+    """
+    Coroutine counterpart of memoize
+
+    Args:
+        key (hashable): Identity of the lookup
+        afn (callable): Zero-argument coroutine function performing the lookup
+
+    Returns:
+        Result of `afn`
+    """
+    context = _scan_context.get()
+    if context is None:
+        return await afn()
+    return await context.memoize_async(key, afn)
@@ -0,0 +1,172 @@
+"""
+DNS answer cache for Internet security tests.
+Bounded LRU cache honouring record TTLs and negative caching (RFC 2308).
+"""
+import copy
+import logging
+import threading
+import time
+from collections import OrderedDict
+import dns.rdatatype
+from dns.resolver import NXDOMAIN, NoAnswer
+
+logger = logging.getLogger(__name__)
+
+# Default number of cached answers
+DEFAULT_MAX_ENTRIES = 10000
+
+class DNSCache:
+    """
+    Thread-safe LRU cache of DNS answers keyed by (qname, rdtype, DO bit)
+
+    Positive answers expire with their TTL. NXDOMAIN and NoAnswer are
+    cached for the negative TTL taken from the SOA record in the authority
+    section, i.e. min(SOA TTL, SOA MINIMUM) as in RFC 2308; negative answers
+    without an SOA are not cached. When full, the least recently used entry
+    is evicted.
+
+    Args:
+        max_entries (int): Maximum number of cached answers
+        max_negative_ttl (int): Upper bound for negative caching in seconds
+    """
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_negative_ttl=3600):
+        self.max_entries = max_entries
+        self.max_negative_ttl = max_negative_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+
+    def get(self, qname, rdtype, dnssec=False):
+        """
+        Look up a cached answer
+
+        Args:
+            qname (str): Queried name
+            rdtype (str): DNS record type
+            dnssec (bool): Whether the DO bit was set
+
+        Returns:
+            dns.resolver.Answer: Cached answer, or None on a miss
+
+        Raises:
+            NXDOMAIN: If a cached negative answer says the name does not exist
+            NoAnswer: If a cached negative answer says the type does not exist
+        """
+        key = _key(qname, rdtype, dnssec)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires, answer, error = entry
+            if expires <= time.time():
+                del self._entries[key]
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            if error is not None:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+
+        if error is not None:
+            # Raise a copy so concurrent callers don't share a traceback
+            raise copy.copy(error)
+        return answer
+
+    def put(self, qname, rdtype, dnssec, answer):
+        """
+        Cache a positive answer until it expires
+
+        Args:
+            qname (str): Queried name
+            rdtype (str): DNS record type
+            dnssec (bool): Whether the DO bit was set
+            answer (dns.resolver.Answer): Answer to cache
+        """
+        self._store(_key(qname, rdtype, dnssec), answer.expiration, answer, None)
+
+    def put_negative(self, qname, rdtype, dnssec, error):
+        """
+        Cache an NXDOMAIN or NoAnswer for its SOA derived negative TTL
+
+        Args:
+            qname (str): Queried name
+            rdtype (str): DNS record type
+            dnssec (bool): Whether the DO bit was set
+            error (Exception): NXDOMAIN or NoAnswer raised by the resolver
+        """
+        ttl = negative_ttl(error)
+        if ttl is None:
+            return
+        ttl = min(ttl, self.max_negative_ttl)
+        self._store(_key(qname, rdtype, dnssec), time.time() + ttl, None, error)
+
+    def clear(self):
+        """Remove all entries"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Hit, miss and eviction counters as a dict"""
+        with self._lock:
+            lookups = self.hits + self.negative_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expired": self.expired,
+                "hit_rate": round((self.hits + self.negative_hits) / lookups, 4) if lookups else None
+            }
+
+    def _store(self, key, expires, answer, error):
+        if expires <= time.time() or self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (expires, answer, error)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+def negative_ttl(error):
+    """
+    Negative caching TTL of an NXDOMAIN or NoAnswer (RFC 2308 section 5)
+
+    Args:
+        error (Exception): NXDOMAIN or NoAnswer raised by the resolver
+
+    Returns:
+        int: Seconds the answer may be cached, or None without an SOA
+    """
+    if isinstance(error, NXDOMAIN):
+        responses = list(error.kwargs.get("responses", {}).values())
+    elif isinstance(error, NoAnswer):
+        responses = [error.kwargs.get("response")]
+    else:
+        return None
+
+    ttls = []
+    for response in responses:
+        if response is None:
+            return None
+        soa_ttl = None
+        for rrset in response.authority:
+            if rrset.rdtype == dns.rdatatype.SOA:
+                soa_ttl = min(rrset.ttl, rrset[0].minimum)
+                break
+        if soa_ttl is None:
+            return None
+        ttls.append(soa_ttl)
+    return min(ttls) if ttls else None
+
+def _key(qname, rdtype, dnssec):
+    return (str(qname).lower().rstrip('.'), str(rdtype).upper(), bool(dnssec))
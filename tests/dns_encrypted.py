@@ -0,0 +1,373 @@
+"""
+Encrypted DNS transports for Internet security tests.
+Sends queries over long-lived DNS-over-TLS (RFC 7858) and DNS-over-HTTPS (RFC 8484) connections.
+"""
+import asyncio
+import logging
+import random
+import ssl
+from urllib.parse import urlsplit
+import dns.exception
+import dns.message
+import dns.rcode
+import httpx
+from dns.resolver import NoNameservers, LifetimeTimeout
+from .dns_transport import LoopTransport, _answers
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401 - enables HTTP/2 in httpx
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+DOH_CONTENT_TYPE = 'application/dns-message'
+
+# Connections dropped before answering anything, after which a DoT server is skipped
+MAX_UNANSWERED_DROPS = 3
+
+# Connections per DNS-over-HTTPS server when HTTP/2 is unavailable, one query each
+HTTP1_CONNECTIONS = 32
+
+class _TLSConnection:
+    """One DNS-over-TLS connection and the queries pipelined on it"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.pending = {}
+        self.sent = 0
+        self.answered = 0
+        self.closed = False
+        self._reader_task = asyncio.ensure_future(self._read())
+
+    def send(self, request, future):
+        """
+        Give a request an ID that is unused on this connection and write it
+
+        Returns:
+            int: Query ID, to release once the query is finished
+
+        Raises:
+            ConnectionResetError: If the connection is already closing
+        """
+        if not self.usable:
+            raise ConnectionResetError("DNS-over-TLS connection closed")
+        while True:
+            query_id = random.getrandbits(16)
+            if query_id not in self.pending:
+                break
+        request.id = query_id
+        self.pending[query_id] = (request, future)
+        self.sent += 1
+        wire = request.to_wire()
+        self.writer.write(len(wire).to_bytes(2, 'big') + wire)
+        return query_id
+
+    @property
+    def usable(self):
+        """True until the connection is closed by either side"""
+        # The stream sees a reset before the reader task does
+        return not (self.closed or self.writer.is_closing() or self.reader.exception() is not None
+                    or self.reader.at_eof())
+
+    def release(self, query_id):
+        self.pending.pop(query_id, None)
+
+    def close(self):
+        self._reader_task.cancel()
+
+    async def _read(self):
+        """Match responses to queries by ID, in whatever order they arrive"""
+        error = ConnectionResetError("DNS-over-TLS connection closed")
+        try:
+            while True:
+                length = int.from_bytes(await self.reader.readexactly(2), 'big')
+                wire = await self.reader.readexactly(length)
+                entry = self.pending.get(int.from_bytes(wire[:2], 'big')) if len(wire) >= 12 else None
+                if entry is None or entry[1].done():
+                    continue
+                try:
+                    response = dns.message.from_wire(wire)
+                except Exception as e:
+                    logger.debug(f"Malformed DNS-over-TLS response: {str(e)}")
+                    continue
+                if _answers(entry[0], response):
+                    self.answered += 1
+                    entry[1].set_result(response)
+        except (asyncio.IncompleteReadError, OSError) as e:
+            if isinstance(e, OSError):
+                error = e
+        finally:
+            self.closed = True
+            for _, future in self.pending.values():
+                if not future.done():
+                    future.set_exception(error)
+            self.writer.close()
+
+class TLSTransport(LoopTransport):
+    """
+    DNS-over-TLS client keeping a few pipelined connections per server
+
+    Each server gets up to `connections` TLS connections that stay open
+    between queries. Queries are pipelined on them with distinct IDs and
+    answered out of order as the server replies. A connection closed by
+    the server (idle timeout, restart) is reopened on the next query, and
+    every query that was in flight on it is sent again on the new one, as
+    often as that happens within the timeout. Each server gets an equal
+    share of the time left; servers timing out, answering with
+    SERVFAIL/REFUSED or failing to connect are skipped in favour of the
+    next one.
+
+    Args:
+        nameservers (list): Server addresses, the system ones by default
+        port (int): Server port
+        server_name (str): Name checked against the server certificates,
+            the server address by default
+        ca_file (str): CA bundle used to verify the servers, the system
+            store by default
+        connections (int): TLS connections per server
+        max_outstanding (int): Queries in flight at the same time
+    """
+    def __init__(self, nameservers=None, port=853, server_name=None, ca_file=None, connections=2,
+                 max_outstanding=1024):
+        super().__init__(nameservers, port, max_outstanding)
+        self.server_name = server_name
+        self.connections = connections
+        self._context = ssl.create_default_context(cafile=ca_file)
+        self._slots = {}
+        self._connecting = {}
+        self._next = 0
+        self.queries = 0
+        self.connects = 0
+        self.reconnects = 0
+        self.requeued = 0
+
+    def stats(self):
+        """Counters of the queries and connections of this transport"""
+        open_connections = [
+            connection for slots in self._slots.values() for connection in slots
+            if connection is not None and not connection.closed
+        ]
+        return {
+            "queries": self.queries,
+            "connects": self.connects,
+            "reconnects": self.reconnects,
+            "requeued": self.requeued,
+            "open_connections": len(open_connections),
+            "outstanding": sum(len(connection.pending) for connection in open_connections)
+        }
+
+    async def _shutdown(self):
+        """Close the TLS connections"""
+        for slots in self._slots.values():
+            for connection in slots:
+                if connection is not None:
+                    connection.close()
+        self._slots = {}
+        self._connecting = {}
+
+    async def _connection(self, server, timeout):
+        """Open connection to a server, connecting or reconnecting as needed"""
+        slots = self._slots.setdefault(server, [None] * self.connections)
+        self._next += 1
+        index = self._next % len(slots)
+        connection = slots[index]
+        if connection is not None and connection.usable:
+            return connection
+
+        lock = self._connecting.setdefault((server, index), asyncio.Lock())
+        async with lock:
+            connection = slots[index]
+            if connection is not None and connection.usable:
+                return connection
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(
+                server[0], server[1], ssl=self._context, server_hostname=self.server_name or server[0]
+            ), timeout)
+            if connection is not None:
+                self.reconnects += 1
+            self.connects += 1
+            slots[index] = _TLSConnection(reader, writer)
+            return slots[index]
+
+    async def _exchange(self, request, servers, timeout):
+        """
+        Send a request over the server connections until a usable response arrives
+
+        Args:
+            request (dns.message.Message): Query to send
+            servers (list): (address, port) tuples
+            timeout (float): Overall timeout in seconds
+
+        Returns:
+            tuple: (response, (address, port) of the answering server)
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        errors = []
+
+        for index, server in enumerate(servers):
+            unanswered = 0
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise LifetimeTimeout(timeout=timeout, errors=errors)
+                # The servers left share the time left equally
+                share = remaining / (len(servers) - index)
+                future = loop.create_future()
+                connection = None
+                query_id = None
+                try:
+                    connection = await self._connection(server, share)
+                    query_id = connection.send(request, future)
+                    self.queries += 1
+                    response = await asyncio.wait_for(future, share)
+                except asyncio.TimeoutError:
+                    errors.append((server[0], True, server[1], dns.exception.Timeout(timeout=share), None))
+                    break
+                except OSError as e:
+                    errors.append((server[0], True, server[1], e, None))
+                    if query_id is None:
+                        break
+                    # Queries in flight on a dropped connection go to a new one, for as long as
+                    # the server's connections answer at all
+                    if connection.answered == 0:
+                        unanswered += 1
+                        if unanswered > MAX_UNANSWERED_DROPS:
+                            break
+                    self.requeued += 1
+                    continue
+                finally:
+                    if query_id is not None:
+                        connection.release(query_id)
+
+                if response.rcode() in (dns.rcode.NOERROR, dns.rcode.NXDOMAIN):
+                    return response, server
+                errors.append((server[0], True, server[1], dns.rcode.to_text(response.rcode()), response))
+                break
+
+        if loop.time() >= deadline:
+            raise LifetimeTimeout(timeout=timeout, errors=errors)
+        raise NoNameservers(request=request, errors=errors)
+
+class HTTPSTransport(LoopTransport):
+    """
+    DNS-over-HTTPS client sharing a keep-alive connection pool
+
+    Queries are POSTed as application/dns-message with ID 0, as RFC 8484
+    recommends for cacheability. httpx keeps up to `connections` connections
+    per server open, reopening any the server has closed, and multiplexes
+    queries over them with HTTP/2 (the h2 package). Without h2 every
+    HTTP/1.1 connection carries one query at a time, so the pool grows to
+    at least HTTP1_CONNECTIONS. Each server gets an equal share of the time
+    left; servers timing out, failing or answering with SERVFAIL/REFUSED
+    are skipped in favour of the next URL.
+
+    Args:
+        urls (list): DoH endpoints such as "https://resolver.example/dns-query"
+        ca_file (str): CA bundle used to verify the servers, the system
+            store by default
+        connections (int): Connections kept open per server
+        http2 (bool): Use HTTP/2, by default when h2 is installed
+        max_outstanding (int): Queries in flight at the same time
+    """
+    def __init__(self, urls, ca_file=None, connections=2, http2=None, max_outstanding=1024):
+        if not urls:
+            raise ValueError("At least one DNS-over-HTTPS URL is required")
+        super().__init__(urls, 443, max_outstanding)
+        self.ca_file = ca_file
+        self.connections = connections
+        self.http2 = HTTP2_AVAILABLE if http2 is None else http2
+        self._client = None
+        self.queries = 0
+        self.connects = 0
+        self.errors = 0
+
+    def stats(self):
+        """Counters of the queries and connections of this transport"""
+        return {
+            "queries": self.queries,
+            "connects": self.connects,
+            "errors": self.errors,
+            "http2": self.http2
+        }
+
+    async def _shutdown(self):
+        """Close the connection pool"""
+        client, self._client = self._client, None
+        if client is not None:
+            await client.aclose()
+
+    def _servers(self, nameservers):
+        """URLs, with the host and port reported as the answering server"""
+        return list(nameservers)
+
+    async def _trace(self, event, info):
+        if event == "connection.connect_tcp.complete":
+            self.connects += 1
+
+    async def _exchange(self, request, servers, timeout):
+        """
+        POST a request to each URL in turn until a usable response arrives
+
+        Args:
+            request (dns.message.Message): Query to send
+            servers (list): DoH URLs
+            timeout (float): Overall timeout in seconds
+
+        Returns:
+            tuple: (response, (host, port) of the answering server)
+        """
+        if self._client is None:
+            connections = self.connections if self.http2 else max(self.connections, HTTP1_CONNECTIONS)
+            self._client = httpx.AsyncClient(
+                http2=self.http2,
+                verify=self.ca_file or True,
+                timeout=None,
+                limits=httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+            )
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        request.id = 0
+        wire = request.to_wire()
+        errors = []
+
+        for index, url in enumerate(servers):
+            parts = urlsplit(url)
+            server = (parts.hostname, parts.port or 443)
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise LifetimeTimeout(timeout=timeout, errors=errors)
+            # The servers left share the time left equally
+            share = remaining / (len(servers) - index)
+            self.queries += 1
+            try:
+                reply = await asyncio.wait_for(self._client.post(
+                    url,
+                    content=wire,
+                    headers={"Content-Type": DOH_CONTENT_TYPE, "Accept": DOH_CONTENT_TYPE},
+                    extensions={"trace": self._trace}
+                ), share)
+                reply.raise_for_status()
+                response = dns.message.from_wire(reply.content)
+            except asyncio.TimeoutError:
+                self.errors += 1
+                errors.append((server[0], True, server[1], dns.exception.Timeout(timeout=share), None))
+                continue
+            except Exception as e:
+                self.errors += 1
+                errors.append((server[0], True, server[1], e, None))
+                continue
+
+            if not _answers(request, response):
+                self.errors += 1
+                errors.append((server[0], True, server[1], "mismatched response", response))
+            elif response.rcode() in (dns.rcode.NOERROR, dns.rcode.NXDOMAIN):
+                return response, server
+            else:
+                errors.append((server[0], True, server[1], dns.rcode.to_text(response.rcode()), response))
+
+        if loop.time() >= deadline:
+            raise LifetimeTimeout(timeout=timeout, errors=errors)
+        raise NoNameservers(request=request, errors=errors)
@@ -0,0 +1,448 @@
+"""
+Multiplexed DNS transport for Internet security tests.
+Pipelines many queries over a few UDP sockets driven by one event loop.
+"""
+import abc
+import asyncio
+import logging
+import secrets
+import socket
+import threading
+import dns.flags
+import dns.message
+import dns.name
+import dns.rcode
+import dns.rdataclass
+import dns.rdatatype
+import dns.resolver
+from dns.resolver import NXDOMAIN, NoAnswer, NoNameservers, LifetimeTimeout
+
+logger = logging.getLogger(__name__)
+
+# EDNS buffer size that avoids IP fragmentation (DNS flag day 2020)
+EDNS_PAYLOAD = 1232
+
+# Queries sent from one UDP socket before it is replaced by one on a new source port
+SOCKET_QUERIES = 1000
+
+class _UDPSocket(asyncio.DatagramProtocol):
+    """One UDP socket and the queries waiting for a response on it"""
+
+    def __init__(self):
+        self.transport = None
+        self.pending = {}
+        self.sent = 0
+        self.replaced = False
+        self.retired = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        if len(data) < 12:
+            return
+        entry = self.pending.get(int.from_bytes(data[:2], 'big'))
+        if entry is None:
+            return
+        request, servers, future = entry
+        source = (addr[0], addr[1])
+        if source not in servers or future.done():
+            return
+
+        if int.from_bytes(data[2:4], 'big') & dns.flags.TC:
+            # Retried over TCP by the sender
+            future.set_result((None, source))
+            return
+        try:
+            response = dns.message.from_wire(data)
+        except Exception as e:
+            logger.debug(f"Malformed DNS response from {addr[0]}: {str(e)}")
+            return
+        if _answers(request, response):
+            future.set_result((response, source))
+
+    def error_received(self, exc):
+        logger.debug(f"DNS socket error: {str(exc)}")
+
+    def allocate(self, request, servers, future):
+        """Give a request an ID that is unused on this socket and register it
+
+        The request keeps the last ID it was given; responses are matched by
+        the ID they arrive with and by their question section.
+        """
+        while True:
+            # Unpredictable IDs, together with the source port, protect against off-path spoofing
+            query_id = secrets.randbits(16)
+            if query_id not in self.pending:
+                break
+        request.id = query_id
+        self.pending[query_id] = (request, servers, future)
+        self.sent += 1
+        return query_id
+
+    def release(self, query_id):
+        """Forget a finished query, closing a retired socket once nothing waits on it"""
+        self.pending.pop(query_id, None)
+        if self.retired and not self.pending:
+            self.transport.close()
+
+    def retire(self):
+        """Stop handing out the socket and close it once its queries are finished"""
+        self.retired = True
+        if not self.pending:
+            self.transport.close()
+
+class LoopTransport(abc.ABC):
+    """
+    Base of the DNS transports that run all queries on one background event loop
+
+    The blocking methods can be called from any thread; the coroutine
+    methods from any event loop. Subclasses implement _exchange() and may
+    release their connections in _shutdown().
+
+    Args:
+        nameservers (list): Nameserver addresses, the system ones by default
+        port (int): Nameserver port
+        max_outstanding (int): Queries in flight at the same time
+    """
+    def __init__(self, nameservers=None, port=53, max_outstanding=1024):
+        self.nameservers = list(nameservers or dns.resolver.Resolver().nameservers)
+        self.port = port
+        self.max_outstanding = max_outstanding
+        self._loop = None
+        self._semaphore = None
+        self._lock = threading.Lock()
+
+    def resolve(self, domain, record_type='A', timeout=5, nameservers=None, use_dnssec=False):
+        """
+        Resolve a DNS record, blocking the calling thread
+
+        Args:
+            domain (str): Domain name to query
+            record_type (str): DNS record type
+            timeout (int): Overall timeout in seconds
+            nameservers (list): Nameservers to use instead of the default ones
+            use_dnssec (bool): Set the DO and CD bits
+
+        Returns:
+            dns.resolver.Answer: DNS answer
+
+        Raises:
+            NXDOMAIN, NoAnswer, NoNameservers, LifetimeTimeout: Like dnspython
+        """
+        return self.run(self.query(domain, record_type, timeout, nameservers, use_dnssec))
+
+    async def resolve_async(self, domain, record_type='A', timeout=5, nameservers=None, use_dnssec=False):
+        """
+        Coroutine counterpart of resolve
+
+        Args:
+            domain (str): Domain name to query
+            record_type (str): DNS record type
+            timeout (int): Overall timeout in seconds
+            nameservers (list): Nameservers to use instead of the default ones
+            use_dnssec (bool): Set the DO and CD bits
+
+        Returns:
+            dns.resolver.Answer: DNS answer
+        """
+        return await self.run_async(self.query(domain, record_type, timeout, nameservers, use_dnssec))
+
+    def run(self, coro):
+        """
+        Run a coroutine on the transport's event loop and wait for it
+
+        Args:
+            coro (coroutine): Coroutine using query()
+
+        Returns:
+            Result of the coroutine
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self._start()).result()
+
+    async def run_async(self, coro):
+        """
+        Run a coroutine on the transport's event loop and await it from another loop
+
+        Args:
+            coro (coroutine): Coroutine using query()
+
+        Returns:
+            Result of the coroutine
+        """
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self._start()))
+
+    def close(self):
+        """Close the connections and stop the event loop"""
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), loop).result(timeout=5)
+        except Exception as e:
+            logger.debug(f"Error closing DNS transport: {str(e)}")
+        self._semaphore = None
+        loop.call_soon_threadsafe(loop.stop)
+
+    def _start(self):
+        """Event loop of the transport, started on first use"""
+        if self._loop is not None:
+            return self._loop
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="dns-transport", daemon=True).start()
+                self._loop = loop
+            return self._loop
+
+    async def _shutdown(self):
+        """Release the connections of the transport, on its event loop"""
+
+    async def query(self, domain, record_type='A', timeout=5, nameservers=None, use_dnssec=False):
+        """
+        Send a query and turn the response into an Answer
+
+        Must run on the transport's event loop, see run() and run_async().
+
+        Args:
+            domain (str): Domain name to query
+            record_type (str): DNS record type
+            timeout (int): Overall timeout in seconds
+            nameservers (list): Addresses or (address, port) tuples to use
+                instead of the default nameservers
+            use_dnssec (bool): Set the DO and CD bits
+
+        Returns:
+            dns.resolver.Answer: DNS answer
+        """
+        qname = dns.name.from_text(domain)
+        rdtype = dns.rdatatype.from_text(record_type)
+        request = dns.message.make_query(qname, rdtype, use_edns=0, payload=EDNS_PAYLOAD, want_dnssec=use_dnssec)
+        if use_dnssec:
+            request.flags |= dns.flags.CD
+
+        response, server = await self.send(request, nameservers or self.nameservers, timeout)
+        return _to_answer(qname, rdtype, response, server)
+
+    async def send(self, request, nameservers, timeout):
+        """
+        Send a prepared request and return the raw response
+
+        Must run on the transport's event loop. Used for queries that are
+        not plain recursive lookups, such as non-recursive queries to
+        authoritative servers.
+
+        Args:
+            request (dns.message.Message): Query to send
+            nameservers (list): Addresses or (address, port) tuples
+            timeout (float): Overall timeout in seconds
+
+        Returns:
+            tuple: (response, (address, port) of the answering server)
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_outstanding)
+        async with self._semaphore:
+            return await self._exchange(request, self._servers(nameservers), timeout)
+
+    def _servers(self, nameservers):
+        """Nameservers as (address, port) tuples"""
+        return [(server, self.port) if isinstance(server, str) else tuple(server) for server in nameservers]
+
+    @abc.abstractmethod
+    async def _exchange(self, request, servers, timeout):
+        """
+        Send a request until a usable response arrives
+
+        Args:
+            request (dns.message.Message): Query to send
+            servers (list): (address, port) tuples
+            timeout (float): Overall timeout in seconds
+
+        Returns:
+            tuple: (response, (address, port) of the answering server)
+        """
+
+class MultiplexedTransport(LoopTransport):
+    """
+    DNS client sending many concurrent queries over a small socket pool
+
+    All queries run on one background event loop. Each query gets a free
+    16-bit ID on one of `sockets` UDP sockets and responses are matched by
+    ID, source address and question, so thousands of queries can be in
+    flight without a thread each. Unanswered queries are retransmitted with
+    exponential backoff, rotating through the nameservers, and truncated
+    responses are retried over TCP. IDs are drawn with `secrets` and every
+    socket is replaced by one on a new random source port after
+    `rotate_after` queries, so a spoofed response has to guess both.
+
+    Args:
+        nameservers (list): Nameserver addresses, the system ones by default
+        port (int): Nameserver port
+        sockets (int): UDP sockets per address family
+        retransmit (float): Seconds before the first retransmission
+        max_outstanding (int): Queries in flight at the same time
+        rotate_after (int): Queries sent from a socket before it is replaced
+    """
+    def __init__(self, nameservers=None, port=53, sockets=4, retransmit=1.0, max_outstanding=1024,
+                 rotate_after=SOCKET_QUERIES):
+        super().__init__(nameservers, port, max_outstanding)
+        self.sockets = sockets
+        self.retransmit = retransmit
+        self.rotate_after = rotate_after
+        self._pools = {}
+        self._pool_lock = None
+        self._next = 0
+        self.queries = 0
+        self.retransmits = 0
+        self.tcp_fallbacks = 0
+        self.rotations = 0
+
+    def stats(self):
+        """Counters of the queries sent through this transport"""
+        return {
+            "queries": self.queries,
+            "retransmits": self.retransmits,
+            "tcp_fallbacks": self.tcp_fallbacks,
+            "socket_rotations": self.rotations,
+            "outstanding": sum(
+                len(protocol.pending) for pool in self._pools.values() for protocol in pool
+            )
+        }
+
+    async def _shutdown(self):
+        """Close the UDP sockets"""
+        for pool in self._pools.values():
+            for protocol in pool:
+                protocol.transport.close()
+        self._pools = {}
+
+    async def _exchange(self, request, servers, timeout):
+        """
+        Send a request over UDP until a usable response arrives
+
+        Retransmissions rotate through the servers and keep the earlier
+        transmissions registered, so a late answer to any of them is used.
+        Servers answering with an error rcode are dropped.
+
+        Args:
+            request (dns.message.Message): Query to send
+            servers (list): (address, port) tuples
+            timeout (float): Overall timeout in seconds
+
+        Returns:
+            tuple: (response, (address, port) of the answering server)
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        errors = []
+        interval = self.retransmit
+        attempt = 0
+
+        while servers:
+            future = loop.create_future()
+            registrations = []
+            try:
+                while True:
+                    server = servers[attempt % len(servers)]
+                    protocol = await self._socket(server[0])
+                    registrations.append((protocol, protocol.allocate(request, servers, future)))
+                    protocol.transport.sendto(request.to_wire(), server)
+                    self.queries += 1
+
+                    remaining = deadline - loop.time()
+                    try:
+                        response, source = await asyncio.wait_for(asyncio.shield(future), min(interval, remaining))
+                        break
+                    except asyncio.TimeoutError:
+                        if loop.time() >= deadline:
+                            raise LifetimeTimeout(timeout=timeout, errors=errors)
+                        attempt += 1
+                        interval *= 2
+                        self.retransmits += 1
+            finally:
+                for protocol, query_id in registrations:
+                    protocol.release(query_id)
+
+            if response is None:
+                self.tcp_fallbacks += 1
+                response = await self._tcp(request, source, deadline - loop.time(), timeout, errors)
+            if response.rcode() in (dns.rcode.NOERROR, dns.rcode.NXDOMAIN):
+                return response, source
+
+            errors.append((source[0], False, source[1], dns.rcode.to_text(response.rcode()), response))
+            servers = [candidate for candidate in servers if candidate != source]
+
+        raise NoNameservers(request=request, errors=errors)
+
+    async def _tcp(self, request, server, remaining, timeout, errors):
+        """Repeat a truncated query over TCP"""
+        if remaining <= 0:
+            raise LifetimeTimeout(timeout=timeout, errors=errors)
+        wire = request.to_wire()
+
+        async def exchange():
+            reader, writer = await asyncio.open_connection(*server)
+            try:
+                writer.write(len(wire).to_bytes(2, 'big') + wire)
+                await writer.drain()
+                length = int.from_bytes(await reader.readexactly(2), 'big')
+                return dns.message.from_wire(await reader.readexactly(length))
+            finally:
+                writer.close()
+
+        try:
+            response = await asyncio.wait_for(exchange(), remaining)
+        except asyncio.TimeoutError:
+            raise LifetimeTimeout(timeout=timeout, errors=errors)
+        if not _answers(request, response):
+            raise NoNameservers(request=request, errors=errors + [(server[0], True, server[1], "mismatched response", response)])
+        return response
+
+    async def _socket(self, server):
+        """Next socket of the pool for the address family of a server"""
+        family = socket.AF_INET6 if ':' in server else socket.AF_INET
+        pool = self._pools.get(family)
+        if pool is None:
+            if self._pool_lock is None:
+                self._pool_lock = asyncio.Lock()
+            # Concurrent first queries must not each open a pool
+            async with self._pool_lock:
+                pool = self._pools.get(family)
+                if pool is None:
+                    pool = [await self._open(family) for _ in range(self.sockets)]
+                    self._pools[family] = pool
+
+        self._next += 1
+        index = self._next % len(pool)
+        protocol = pool[index]
+        if protocol.sent >= self.rotate_after and not protocol.replaced:
+            # Marked before the await, so only one query replaces the socket;
+            # the old one keeps serving until its replacement is in the pool
+            protocol.replaced = True
+            pool[index] = await self._open(family)
+            protocol.retire()
+            self.rotations += 1
+            return pool[index]
+        return protocol
+
+    async def _open(self, family):
+        """UDP socket on a port picked by the system (randomized ephemeral ports)"""
+        loop = asyncio.get_running_loop()
+        local = ('::', 0) if family == socket.AF_INET6 else ('0.0.0.0', 0)
+        _, protocol = await loop.create_datagram_endpoint(_UDPSocket, local_addr=local, family=family)
+        return protocol
+
+def _answers(request, response):
+    """True if a message is a response to the question of a request"""
+    return bool(response.flags & dns.flags.QR) and response.question == request.question
+
+def _to_answer(qname, rdtype, response, server):
+    """Turn a response into an Answer, raising NXDOMAIN or NoAnswer like dnspython"""
+    if response.rcode() == dns.rcode.NXDOMAIN:
+        raise NXDOMAIN(qnames=[qname], responses={qname: response})
+    answer = dns.resolver.Answer(qname, rdtype, dns.rdataclass.IN, response, server[0], server[1])
+    if answer.rrset is None:
+        raise NoAnswer(response=response)
+    return answer
@@ -5,8 +5,11 @@ Replaces Django-specific DNSSEC testing implementation.
 import logging
 import dns.resolver
 import dns.dnssec
-from .shared import create_test_result, dns_lookup
+from .shared import create_test_result, resolve
 from .scoring import Score, TestStatus
+from .scheduler import Check, run_category
+from .dnssec_validator import validate_chain, validate_chain_async
+from . import aio
 
 logger = logging.getLogger(__name__)
 
@@ -22,37 +25,35 @@ def test_dnssec(domain):
     """
     logger.info(f"Testing DNSSEC for domain: {domain}")
     
-    results = {
-        "name": "DNSSEC",
-        "status": TestStatus.RUNNING.value,
-        "tests": {},
-        "score": None
-    }
+    return run_category("DNSSEC", get_checks(domain))
+
+def get_checks(domain):
+    """
+    Build the DNSSEC checks
     
-    try:
-        # Test for DNSKEY records
-        dnskey_test = test_dnskey_records(domain)
-        results["tests"]["dnskey_records"] = dnskey_test
-        
-        # Test for DS records
-        ds_test = test_ds_records(domain)
-        results["tests"]["ds_records"] = ds_test
-        
-        # Test DNSSEC validation
-        validation_test = test_dnssec_validation(domain)
-        results["tests"]["validation"] = validation_test
-        
-        # Calculate overall score
-        score_sum = sum(test["score"] for test in results["tests"].values())
-        results["score"] = score_sum / len(results["tests"])
-        results["status"] = TestStatus.DONE.value
+    Args:
+        domain (str): Domain name to test
         
-    except Exception as e:
-        logger.error(f"Error in DNSSEC test for {domain}: {str(e)}")
-        results["status"] = TestStatus.ERROR.value
-        results["error"] = str(e)
-    
-    return results
+    Returns:
+        list: List of Check objects
+    """
+    return [
+        Check(
+            "dnskey_records",
+            lambda: test_dnskey_records(domain),
+            afunc=lambda: test_dnskey_records_async(domain)
+        ),
+        Check(
+            "ds_records",
+            lambda: test_ds_records(domain),
+            afunc=lambda: test_ds_records_async(domain)
+        ),
+        Check(
+            "validation",
+            lambda: test_dnssec_validation(domain),
+            afunc=lambda: test_dnssec_validation_async(domain)
+        )
+    ]
 
 def test_dnskey_records(domain):
     """
@@ -65,43 +66,41 @@ def test_dnskey_records(domain):
         dict: Test result
     """
     try:
-        resolver = dns.resolver.Resolver()
-        resolver.timeout = 5
-        resolver.lifetime = 5
+        chain = validate_chain(domain)
+        if chain.status == "secure" and chain.exists:
+            return _dnskey_result(chain.dnskey, chain.zone)
+        try:
+            answer = resolve(domain, 'DNSKEY', use_dnssec=True)
+        except (dns.resolver.NoAnswer, dns.resolver.NXDOMAIN) as e:
+            return _missing_records_result("DNSKEY Records", e)
+        return _dnskey_result(answer)
+    except Exception as e:
+        return create_test_result(
+            "DNSKEY Records",
+            "error",
+            Score.FAILED,
+            {"error": str(e)}
+        )
+
+async def test_dnskey_records_async(domain):
+    """
+    Test if a domain has DNSKEY records without blocking
+    
+    Args:
+        domain (str): Domain name to test
         
+    Returns:
+        dict: Test result
+    """
+    try:
+        chain = await validate_chain_async(domain)
+        if chain.status == "secure" and chain.exists:
+            return _dnskey_result(chain.dnskey, chain.zone)
         try:
-            answer = resolver.resolve(domain, 'DNSKEY')
-            keys = []
-            for key in answer:
-                key_tag = dns.dnssec.key_tag(key)
-                algorithm = key.algorithm
-                key_type = "ZSK" if key.flags & 256 else "KSK" if key.flags & 257 else "Unknown"
-                keys.append({
-                    "key_tag": key_tag,
-                    "algorithm": algorithm,
-                    "type": key_type
-                })
-                
-            return create_test_result(
-                "DNSKEY Records",
-                "done",
-                Score.GOOD,
-                {"records": keys}
-            )
-        except dns.resolver.NoAnswer:
-            return create_test_result(
-                "DNSKEY Records",
-                "done",
-                Score.FAILED,
-                {"records": []}
-            )
-        except dns.resolver.NXDOMAIN:
-            return create_test_result(
-                "DNSKEY Records",
-                "done",
-                Score.FAILED,
-                {"error": "Domain does not exist"}
-            )
+            answer = await aio.resolve(domain, 'DNSKEY', use_dnssec=True)
+        except (dns.resolver.NoAnswer, dns.resolver.NXDOMAIN) as e:
+            return _missing_records_result("DNSKEY Records", e)
+        return _dnskey_result(answer)
     except Exception as e:
         return create_test_result(
             "DNSKEY Records",
@@ -110,10 +109,37 @@ def test_dnskey_records(domain):
             {"error": str(e)}
         )
 
+def _dnskey_result(answer, zone=None):
+    """Describe the DNSKEY records of a domain, or of the zone it belongs to"""
+    keys = []
+    for key in answer:
+        key_tag = dns.dnssec.key_id(key)
+        algorithm = key.algorithm
+        # Zone keys with the SEP bit are key signing keys
+        key_type = "KSK" if key.flags & 257 == 257 else "ZSK" if key.flags & 256 else "Unknown"
+        keys.append({
+            "key_tag": key_tag,
+            "algorithm": algorithm,
+            "type": key_type
+        })
+        
+    details = {"records": keys}
+    if zone:
+        details["zone"] = zone
+    return create_test_result(
+        "DNSKEY Records",
+        "done",
+        Score.GOOD,
+        details
+    )
+
 def test_ds_records(domain):
     """
     Test if a domain has DS records in parent zone
     
+    For a validated domain, the DS records are those of the zone the
+    domain belongs to, which need not be the domain itself.
+    
     Args:
         domain (str): Domain name to test
         
@@ -121,43 +147,41 @@ def test_ds_records(domain):
         dict: Test result
     """
     try:
-        # Get parent domain
-        parent_domain = '.'.join(domain.split('.')[1:]) if domain.count('.') > 1 else domain
-        
-        resolver = dns.resolver.Resolver()
-        resolver.timeout = 5
-        resolver.lifetime = 5
+        chain = validate_chain(domain)
+        if chain.status == "secure" and chain.exists:
+            return _ds_result(chain.ds, chain.zone)
+        try:
+            answer = resolve(domain, 'DS', use_dnssec=True)
+        except (dns.resolver.NoAnswer, dns.resolver.NXDOMAIN) as e:
+            return _missing_records_result("DS Records", e)
+        return _ds_result(answer)
+    except Exception as e:
+        return create_test_result(
+            "DS Records",
+            "error",
+            Score.FAILED,
+            {"error": str(e)}
+        )
+
+async def test_ds_records_async(domain):
+    """
+    Test if a domain has DS records in parent zone without blocking
+    
+    Args:
+        domain (str): Domain name to test
         
+    Returns:
+        dict: Test result
+    """
+    try:
+        chain = await validate_chain_async(domain)
+        if chain.status == "secure" and chain.exists:
+            return _ds_result(chain.ds, chain.zone)
         try:
-            answer = resolver.resolve(domain, 'DS')
-            ds_records = []
-            for ds in answer:
-                ds_records.append({
-                    "key_tag": ds.key_tag,
-                    "algorithm": ds.algorithm,
-                    "digest_type": ds.digest_type
-                })
-                
-            return create_test_result(
-                "DS Records",
-                "done",
-                Score.GOOD,
-                {"records": ds_records}
-            )
-        except dns.resolver.NoAnswer:
-            return create_test_result(
-                "DS Records",
-                "done",
-                Score.FAILED,
-                {"records": []}
-            )
-        except dns.resolver.NXDOMAIN:
-            return create_test_result(
-                "DS Records",
-                "done",
-                Score.FAILED,
-                {"error": "Domain does not exist"}
-            )
+            answer = await aio.resolve(domain, 'DS', use_dnssec=True)
+        except (dns.resolver.NoAnswer, dns.resolver.NXDOMAIN) as e:
+            return _missing_records_result("DS Records", e)
+        return _ds_result(answer)
     except Exception as e:
         return create_test_result(
             "DS Records",
@@ -166,10 +190,49 @@ def test_ds_records(domain):
             {"error": str(e)}
         )
 
+def _ds_result(answer, zone=None):
+    """Describe the DS records of a domain, or of the zone it belongs to"""
+    ds_records = []
+    for ds in answer:
+        ds_records.append({
+            "key_tag": ds.key_tag,
+            "algorithm": ds.algorithm,
+            "digest_type": ds.digest_type
+        })
+        
+    details = {"records": ds_records}
+    if zone:
+        details["zone"] = zone
+    return create_test_result(
+        "DS Records",
+        "done",
+        Score.GOOD,
+        details
+    )
+
+def _missing_records_result(name, error):
+    """Result for a record set that is absent (NoAnswer) or a missing domain (NXDOMAIN)"""
+    if isinstance(error, dns.resolver.NXDOMAIN):
+        return create_test_result(
+            name,
+            "done",
+            Score.FAILED,
+            {"error": "Domain does not exist"}
+        )
+    return create_test_result(
+        name,
+        "done",
+        Score.FAILED,
+        {"records": []}
+    )
+
 def test_dnssec_validation(domain):
     """
     Test DNSSEC validation for a domain
     
+    The signatures are verified from the root trust anchor down to the
+    domain's A records.
+    
     Args:
         domain (str): Domain name to test
         
@@ -177,48 +240,70 @@ def test_dnssec_validation(domain):
         dict: Test result
     """
     try:
-        resolver = dns.resolver.Resolver()
-        resolver.timeout = 5
-        resolver.lifetime = 5
-        resolver.use_dnssec = True
+        return _validation_result(validate_chain(domain))
+    except Exception as e:
+        return create_test_result(
+            "DNSSEC Validation",
+            "error",
+            Score.FAILED,
+            {"error": str(e)}
+        )
+
+async def test_dnssec_validation_async(domain):
+    """
+    Test DNSSEC validation for a domain without blocking
+    
+    Args:
+        domain (str): Domain name to test
         
-        try:
-            # Try to validate A record with DNSSEC
-            answer = resolver.resolve(domain, 'A')
-            return create_test_result(
-                "DNSSEC Validation",
-                "done",
-                Score.GOOD,
-                {"valid": True}
-            )
-        except dns.resolver.NoAnswer:
-            # No A record but validation passed
+    Returns:
+        dict: Test result
+    """
+    try:
+        return _validation_result(await validate_chain_async(domain))
+    except Exception as e:
+        return create_test_result(
+            "DNSSEC Validation",
+            "error",
+            Score.FAILED,
+            {"error": str(e)}
+        )
+
+def _validation_result(chain):
+    """Score the outcome of a chain of trust validation"""
+    if not chain.exists:
+        return create_test_result(
+            "DNSSEC Validation",
+            "done",
+            Score.FAILED,
+            {"valid": False, "error": "Domain does not exist", **chain.to_dict()}
+        )
+    if chain.status == "secure":
+        if not chain.has_records:
+            # No A record but its absence is signed
             return create_test_result(
                 "DNSSEC Validation",
                 "done",
                 Score.GOOD,
-                {"valid": True, "note": "No A record but validation passed"}
-            )
-        except dns.resolver.NXDOMAIN:
-            # Domain doesn't exist but validation passed
-            return create_test_result(
-                "DNSSEC Validation",
-                "done",
-                Score.FAILED,
-                {"valid": False, "error": "Domain does not exist"}
+                {"valid": True, "note": "No A record but validation passed", **chain.to_dict()}
             )
-        except dns.dnssec.ValidationFailure:
-            # DNSSEC validation failed
-            return create_test_result(
-                "DNSSEC Validation",
-                "done",
-                Score.FAILED,
-                {"valid": False, "error": "DNSSEC validation failed"}
-            )
-    except Exception as e:
         return create_test_result(
             "DNSSEC Validation",
-            "error",
+            "done",
+            Score.GOOD,
+            {"valid": True, **chain.to_dict()}
+        )
+    if chain.status == "insecure":
+        return create_test_result(
+            "DNSSEC Validation",
+            "done",
             Score.FAILED,
-            {"error": str(e)}
+            {"valid": False, "error": "No DNSSEC chain of trust", **chain.to_dict()}
         )
+    # DNSSEC validation failed
+    return create_test_result(
+        "DNSSEC Validation",
+        "done",
+        Score.FAILED,
+        {"valid": False, "error": "DNSSEC validation failed", **chain.to_dict()}
+    )
@@ -0,0 +1,542 @@
+"""
+DNSSEC chain-of-trust validation for Internet security tests.
+Verifies signatures from the root trust anchor down to a domain's records.
+"""
+import base64
+import logging
+import threading
+import time
+from collections import OrderedDict
+import dns.dnssec
+import dns.name
+import dns.rdata
+import dns.rdataclass
+import dns.rdatatype
+import dns.rrset
+from dns.resolver import NXDOMAIN, NoAnswer
+from .shared import resolve
+from .context import memoize, memoize_async
+from . import aio
+
+logger = logging.getLogger(__name__)
+
+# Root zone KSKs (https://data.iana.org/root-anchors/root-anchors.xml)
+ROOT_TRUST_ANCHORS = (
+    "20326 8 2 E06D44B80B8F1D39A95C0B0D7C65D08458E880409BBC683457104237C7F8EC8D",
+    "38696 8 2 683D2D0ACB8C9B712A1948B27F741219298D0A450D612C483AF444A4C0FB2B16",
+)
+
+# Algorithms a validator must be able to verify (RFC 8624); zones signed
+# only with other algorithms are treated as insecure
+SUPPORTED_ALGORITHMS = {
+    dns.dnssec.Algorithm.RSASHA1,
+    dns.dnssec.Algorithm.RSASHA1NSEC3SHA1,
+    dns.dnssec.Algorithm.RSASHA256,
+    dns.dnssec.Algorithm.RSASHA512,
+    dns.dnssec.Algorithm.ECDSAP256SHA256,
+    dns.dnssec.Algorithm.ECDSAP384SHA384,
+    dns.dnssec.Algorithm.ED25519,
+    dns.dnssec.Algorithm.ED448,
+}
+SUPPORTED_DIGESTS = {1, 2, 4}  # SHA-1, SHA-256, SHA-384
+
+# NSEC3 flag marking a span that may hide unsigned delegations (RFC 5155)
+NSEC3_OPT_OUT = 0x01
+
+class _Insecure(Exception):
+    """The chain of trust ends above the domain"""
+
+class _Bogus(Exception):
+    """A signature or delegation does not verify"""
+
+class ZoneKeys:
+    """
+    Validated DNSKEY set of a zone
+
+    Attributes:
+        zone (dns.name.Name): Zone apex
+        ds (list): DS records the keys were authenticated with
+        dnskey (dns.rrset.RRset): DNSKEY records of the zone
+        expires (float): Time after which the keys must be validated again
+    """
+    def __init__(self, zone, ds, dnskey, expires):
+        self.zone = zone
+        self.ds = ds
+        self.dnskey = dnskey
+        self.expires = expires
+
+class ZoneKeyCache:
+    """
+    Thread-safe LRU cache of validated zone keys
+
+    Entries expire with the DNSKEY and DS TTLs or the earliest signature
+    expiration, whichever comes first, so the root and TLD keys are
+    validated once per TTL no matter how many domains below them are scanned.
+
+    Args:
+        max_entries (int): Maximum number of cached zones
+    """
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, zone):
+        """Validated keys of a zone, or None"""
+        with self._lock:
+            keys = self._entries.get(zone)
+            if keys is None or keys.expires <= time.time():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(zone)
+            self.hits += 1
+            return keys
+
+    def put(self, keys):
+        """Cache validated keys until they expire"""
+        if keys.expires <= time.time() or self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[keys.zone] = keys
+            self._entries.move_to_end(keys.zone)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+class DNSSECChain:
+    """
+    Outcome of validating a domain
+
+    Attributes:
+        domain (str): Validated domain
+        status (str): "secure", "insecure" (no chain of trust) or "bogus"
+        reason (str): Why the domain is insecure or bogus
+        zone (str): Deepest zone whose keys were validated
+        ds (list): DS records of that zone
+        dnskey (dns.rrset.RRset): DNSKEY records of that zone
+        zones (list): Zones of the chain, from the root down
+        exists (bool): False if the domain does not exist
+        has_records (bool): False if the domain has no records of the queried type
+    """
+    def __init__(self, domain):
+        self.domain = domain
+        self.status = None
+        self.reason = None
+        self.zone = None
+        self.ds = []
+        self.dnskey = None
+        self.zones = []
+        self.exists = True
+        self.has_records = True
+
+    def to_dict(self):
+        """JSON friendly summary"""
+        result = {"status": self.status, "zone": self.zone, "chain": list(self.zones)}
+        if self.reason:
+            result["reason"] = self.reason
+        return result
+
+class ChainValidator:
+    """
+    DNSSEC validator following the chain of trust from the root
+
+    Every zone cut between the root and the domain is authenticated: the
+    DS records are verified with the parent's keys, the child's DNSKEY set
+    must contain a key matching a DS record and be signed by it. Finally
+    the domain's own records are verified with the keys of its zone.
+    Absent DS records are only accepted when the parent proves their
+    absence with signed NSEC or NSEC3 records.
+
+    All queries set the DO and CD bits, so the upstream resolver returns
+    the signatures instead of validating itself.
+
+    Args:
+        trust_anchors (iterable): Root DS records in presentation format
+        cache (ZoneKeyCache): Cache of validated zone keys, or None
+    """
+    def __init__(self, trust_anchors=ROOT_TRUST_ANCHORS, cache=None):
+        self.trust_anchors = [
+            dns.rdata.from_text(dns.rdataclass.IN, dns.rdatatype.DS, anchor) for anchor in trust_anchors
+        ]
+        self.cache = cache
+
+    def validate(self, domain, record_type='A'):
+        """
+        Validate a domain's records of one type
+
+        Args:
+            domain (str): Domain name
+            record_type (str): Record type to validate
+
+        Returns:
+            DNSSECChain: Validation outcome
+
+        Raises:
+            Exception: If a lookup fails for other reasons than a missing record
+        """
+        walk = self._walk(domain, record_type)
+        try:
+            query = next(walk)
+            while True:
+                try:
+                    answer = resolve(query[0], query[1], use_dnssec=True)
+                except Exception as e:
+                    query = walk.throw(e)
+                else:
+                    query = walk.send(answer)
+        except StopIteration as stop:
+            return stop.value
+
+    async def validate_async(self, domain, record_type='A'):
+        """
+        Validate a domain's records of one type without blocking
+
+        Args:
+            domain (str): Domain name
+            record_type (str): Record type to validate
+
+        Returns:
+            DNSSECChain: Validation outcome
+        """
+        walk = self._walk(domain, record_type)
+        try:
+            query = next(walk)
+            while True:
+                try:
+                    answer = await aio.resolve(query[0], query[1], use_dnssec=True)
+                except Exception as e:
+                    query = walk.throw(e)
+                else:
+                    query = walk.send(answer)
+        except StopIteration as stop:
+            return stop.value
+
+    def _walk(self, domain, record_type):
+        """
+        Validation steps as a generator
+
+        Yields (name, record type) queries and receives their answers, or
+        the NXDOMAIN/NoAnswer they raised, so the same logic serves the
+        blocking and the asyncio lookups.
+        """
+        name = dns.name.from_text(domain)
+        chain = DNSSECChain(domain)
+        keys = None
+        try:
+            keys = yield from self._root_keys()
+            chain.zones.append(keys.zone.to_text())
+
+            # Zone cuts from the TLD down to the domain itself
+            for depth in range(len(name.labels) - 2, -1, -1):
+                candidate = dns.name.Name(name.labels[depth:])
+                cached = self.cache.get(candidate) if self.cache is not None else None
+                if cached is not None:
+                    keys = cached
+                    chain.zones.append(keys.zone.to_text())
+                    continue
+
+                try:
+                    ds_answer = yield (candidate.to_text(), 'DS')
+                except NXDOMAIN as e:
+                    self._check_denial(e.kwargs["responses"].get(candidate), candidate, keys, nodata=False)
+                    chain.exists = False
+                    break
+                except NoAnswer as e:
+                    response = e.kwargs.get("response")
+                    if response is not None and _alias(response, candidate) is not None:
+                        # A CNAME owner cannot be a zone cut
+                        self._verify(response.answer, _alias(response, candidate), keys)
+                    elif self._check_denial(response, candidate, keys):
+                        raise _Insecure(f"{candidate} is an unsigned delegation (no DS records)")
+                    continue
+
+                if ds_answer.canonical_name != candidate:
+                    self._verify(ds_answer.response.answer, _alias(ds_answer.response, candidate), keys)
+                    continue
+                ds_rrset = ds_answer.rrset
+                self._verify(ds_answer.response.answer, ds_rrset, keys)
+                usable = [
+                    ds for ds in ds_rrset
+                    if ds.algorithm in SUPPORTED_ALGORITHMS and ds.digest_type in SUPPORTED_DIGESTS
+                ]
+                if not usable:
+                    raise _Insecure(f"DS records of {candidate} only use unsupported algorithms")
+
+                try:
+                    dnskey_answer = yield (candidate.to_text(), 'DNSKEY')
+                except (NXDOMAIN, NoAnswer):
+                    raise _Bogus(f"{candidate} has DS records but no DNSKEY records")
+                keys = self._trust(candidate, dnskey_answer, usable, ds_answer)
+                if self.cache is not None:
+                    self.cache.put(keys)
+                chain.zones.append(keys.zone.to_text())
+            else:
+                # The domain's own records, signed by the deepest zone
+                try:
+                    answer = yield (domain, record_type)
+                except NXDOMAIN as e:
+                    self._check_denial(e.kwargs["responses"].get(name), name, keys, nodata=False)
+                    chain.exists = False
+                except NoAnswer as e:
+                    self._check_denial(e.kwargs.get("response"), name, keys)
+                    chain.has_records = False
+                else:
+                    response = answer.response
+                    # Only the records owned by the domain itself (a CNAME or
+                    # the answer); CNAME targets may live in other zones
+                    rrset = next(rrset for rrset in response.answer
+                                 if rrset.name == name and rrset.rdtype != dns.rdatatype.RRSIG)
+                    self._verify(response.answer, rrset, keys)
+            chain.status = "secure"
+        except _Insecure as e:
+            chain.status = "insecure"
+            chain.reason = str(e)
+        except _Bogus as e:
+            chain.status = "bogus"
+            chain.reason = str(e)
+
+        if keys is not None:
+            chain.zone = keys.zone.to_text()
+            chain.ds = list(keys.ds)
+            chain.dnskey = keys.dnskey
+        return chain
+
+    def _root_keys(self):
+        """Root zone keys, authenticated with the trust anchors"""
+        root = dns.name.root
+        cached = self.cache.get(root) if self.cache is not None else None
+        if cached is not None:
+            return cached
+
+        try:
+            answer = yield ('.', 'DNSKEY')
+        except (NXDOMAIN, NoAnswer):
+            raise _Bogus("The root zone returned no DNSKEY records")
+        keys = self._trust(root, answer, self.trust_anchors, None)
+        if self.cache is not None:
+            self.cache.put(keys)
+        return keys
+
+    def _trust(self, zone, answer, ds_records, ds_answer):
+        """
+        Authenticate a zone's DNSKEY set with its DS records
+
+        Returns:
+            ZoneKeys: Validated keys
+        """
+        dnskey = answer.rrset
+        entry_keys = [key for key in dnskey if any(_ds_matches(zone, key, ds) for ds in ds_records)]
+        if not entry_keys:
+            raise _Bogus(f"No DNSKEY of {zone} matches its DS records")
+
+        sigs = _signatures(answer.response.answer, dnskey)
+        if sigs is None:
+            raise _Bogus(f"DNSKEY records of {zone} are not signed")
+        try:
+            dns.dnssec.validate(dnskey, sigs, {zone: dns.rrset.from_rdata_list(zone, dnskey.ttl, entry_keys)})
+        except dns.dnssec.ValidationFailure as e:
+            raise _Bogus(f"DNSKEY signature of {zone} does not verify: {str(e)}")
+
+        expires = min([answer.expiration] + [sig.expiration for sig in sigs])
+        if ds_answer is not None:
+            expires = min(expires, ds_answer.expiration)
+        return ZoneKeys(zone, ds_records, dnskey, expires)
+
+    def _verify(self, section, rrset, keys):
+        """Verify an RRset with the keys of the zone expected to sign it"""
+        sigs = _signatures(section, rrset)
+        if sigs is None:
+            raise _Bogus(f"{rrset.name} {dns.rdatatype.to_text(rrset.rdtype)} is not signed")
+
+        signers = {sig.signer for sig in sigs}
+        if keys.zone not in signers:
+            # Even a child zone's signature proves nothing without a chain
+            # of trust; only a DS denial from the parent makes it insecure
+            raise _Bogus(f"{rrset.name} is signed by {', '.join(map(str, signers))}, expected {keys.zone}")
+
+        try:
+            dns.dnssec.validate(rrset, sigs, {keys.zone: keys.dnskey})
+        except dns.dnssec.ValidationFailure as e:
+            raise _Bogus(f"Signature of {rrset.name} {dns.rdatatype.to_text(rrset.rdtype)} "
+                         f"does not verify: {str(e)}")
+
+    def _check_denial(self, response, name, keys, nodata=True):
+        """
+        Verify a signed denial of existence
+
+        For a missing DS record set (`nodata`), the name must either be
+        matched by an NSEC or NSEC3 record, be covered by an NSEC record
+        (an empty non-terminal, RFC 4035 section 5.4), or be covered by an
+        NSEC3 opt-out span with a closest encloser proof (RFC 5155 section
+        8.6). A nonexistent name needs a covering NSEC record or an NSEC3
+        closest encloser proof.
+
+        Returns:
+            bool: True if it proves an unsigned delegation at `name`
+
+        Raises:
+            _Bogus: If no record proves the denial
+        """
+        records = [] if response is None else [
+            rrset for rrset in response.authority
+            if rrset.rdtype in (dns.rdatatype.NSEC, dns.rdatatype.NSEC3)
+        ]
+        if not records:
+            raise _Bogus(f"Denial of existence for {name} is not signed")
+        for rrset in records:
+            self._verify(response.authority, rrset, keys)
+        nsec = [rrset for rrset in records if rrset.rdtype == dns.rdatatype.NSEC]
+        nsec3 = [rrset for rrset in records if rrset.rdtype == dns.rdatatype.NSEC3]
+        if not nodata:
+            if nsec:
+                if not any(_nsec_covers(rrset, name) for rrset in nsec):
+                    raise _Bogus(f"No NSEC record proves that {name} does not exist")
+            else:
+                self._next_closer_proof(nsec3, name, keys)
+            return False
+
+        for rrset in records:
+            record = rrset[0]
+            if rrset.rdtype == dns.rdatatype.NSEC:
+                matches = rrset.name == name
+            else:
+                matches = _nsec3_owner(rrset) == _nsec3_hash(name, record)
+            if matches:
+                types = _bitmap_types(record.windows)
+                return dns.rdatatype.NS in types and dns.rdatatype.SOA not in types
+
+        if nsec:
+            # The name is an empty non-terminal, so it is no zone cut
+            if any(_nsec_covers(rrset, name) for rrset in nsec):
+                return False
+            raise _Bogus(f"No NSEC record proves the absence of DS records for {name}")
+
+        closest, covering = self._next_closer_proof(nsec3, name, keys)
+        # Only an opt-out span can hide an unsigned delegation
+        if any(rrset[0].flags & NSEC3_OPT_OUT for rrset in covering):
+            return True
+        # Otherwise the name can only exist through a wildcard (RFC 5155 section 8.7)
+        wildcard = dns.name.Name((b'*',) + closest.labels)
+        for rrset in nsec3:
+            if _nsec3_owner(rrset) == _nsec3_hash(wildcard, rrset[0]):
+                return False
+        raise _Bogus(f"NSEC3 records of {name} prove neither a delegation nor a wildcard")
+
+    def _next_closer_proof(self, nsec3, name, keys):
+        """
+        Closest encloser proof of a name without NSEC3 record (RFC 5155 section 7.2.1)
+
+        Returns:
+            tuple: (closest encloser, NSEC3 RRsets covering the next closer name)
+        """
+        if not nsec3:
+            raise _Bogus(f"No NSEC3 record proves the denial for {name}")
+        # Closest encloser: the nearest ancestor with a matching NSEC3 record
+        closest = name.parent()
+        while not any(_nsec3_owner(rrset) == _nsec3_hash(closest, rrset[0]) for rrset in nsec3):
+            if closest == keys.zone or closest == dns.name.root:
+                raise _Bogus(f"No closest encloser proof for {name}")
+            closest = closest.parent()
+        next_closer = dns.name.Name(name.labels[-len(closest.labels) - 1:])
+        covering = [rrset for rrset in nsec3 if _nsec3_covers(rrset, _nsec3_hash(next_closer, rrset[0]))]
+        if not covering:
+            raise _Bogus(f"No NSEC3 record covers {next_closer}")
+        return closest, covering
+
+def _ds_matches(zone, key, ds):
+    """True if a DNSKEY is the one a DS record refers to"""
+    if ds.key_tag != dns.dnssec.key_id(key) or ds.algorithm != key.algorithm:
+        return False
+    try:
+        return dns.dnssec.make_ds(zone, key, ds.digest_type, validating=True) == ds
+    except (dns.dnssec.UnsupportedAlgorithm, dns.dnssec.DeniedByPolicy, ValueError):
+        return False
+
+def _alias(response, name):
+    """CNAME RRset owned by a name in a response, or None"""
+    for rrset in response.answer:
+        if rrset.name == name and rrset.rdtype == dns.rdatatype.CNAME:
+            return rrset
+    return None
+
+def _signatures(section, rrset):
+    """RRSIG records covering an RRset, or None"""
+    for candidate in section:
+        if (candidate.rdtype == dns.rdatatype.RRSIG and candidate.name == rrset.name
+                and candidate.covers == rrset.rdtype):
+            return candidate
+    return None
+
+def _nsec_covers(rrset, name):
+    """True if a name falls strictly between an NSEC owner and its next name in canonical order"""
+    owner = rrset.name
+    following = rrset[0].next
+    if owner < following:
+        return owner < name < following
+    # The last record of the zone points back to the apex
+    return name > owner and name.is_subdomain(following)
+
+def _nsec3_hash(name, record):
+    """Hashed owner name of `name` under the parameters of an NSEC3 record"""
+    return dns.dnssec.nsec3_hash(name, record.salt, record.iterations, record.algorithm)
+
+def _nsec3_owner(rrset):
+    """Hash in the first label of an NSEC3 owner name"""
+    return rrset.name.labels[0].decode().upper()
+
+def _nsec3_covers(rrset, hashed):
+    """True if a hash falls strictly between an NSEC3 owner and its next hash"""
+    owner = _nsec3_owner(rrset)
+    following = base64.b32hexencode(rrset[0].next).decode().rstrip('=')
+    if owner < following:
+        return owner < hashed < following
+    # The last record of the zone wraps around to the first
+    return hashed > owner or hashed < following
+
+def _bitmap_types(windows):
+    """Record types listed in an NSEC/NSEC3 type bitmap"""
+    types = set()
+    for window, bitmap in windows:
+        for index, byte in enumerate(bitmap):
+            for bit in range(8):
+                if byte & (0x80 >> bit):
+                    types.add(window * 256 + index * 8 + bit)
+    return types
+
+# Zone keys shared by all scans in this process
+zone_key_cache = ZoneKeyCache()
+
+validator = ChainValidator(cache=zone_key_cache)
+
+def validate_chain(domain):
+    """
+    Validate a domain's A records, once per scan
+
+    Args:
+        domain (str): Domain name
+
+    Returns:
+        DNSSECChain: Validation outcome
+    """
+    return memoize(("dnssec_chain", domain.lower()), lambda: validator.validate(domain))
+
+async def validate_chain_async(domain):
+    """
+    Validate a domain's A records without blocking, once per scan
+
+    Args:
+        domain (str): Domain name
+
+    Returns:
+        DNSSECChain: Validation outcome
+    """
+    return await memoize_async(("dnssec_chain", domain.lower()), lambda: validator.validate_async(domain))
@@ -1,16 +1,23 @@
 import logging
 from .scoring import Score, TestStatus
 from .shared import dns_lookup
+from .scheduler import Category, Check, run_suite, run_suite_async
+from .result_cache import run_cached_suite
+from .context import ScanContext, scan_context
 from . import tls, mail, spf_parser, dmarc_parser
 
 logger = logging.getLogger(__name__)
 
-def run_email_tests(domain):
+def run_email_tests(domain, max_workers=None, on_check=None, on_category=None, cache=None):
     """
     Run all email tests for a given domain
     
     Args:
         domain (str): Domain name to test
+        max_workers (int): Maximum number of sub-checks running concurrently
+        on_check (callable): Optional callback(category, test, result) per finished sub-check
+        on_category (callable): Optional callback(category, result) per finished category
+        cache (ResultCache): Optional cache of category results
     
     Returns:
         dict: Results of all tests
@@ -26,20 +33,77 @@ def run_email_tests(domain):
         "score": None
     }
     
+    context = ScanContext()
     try:
-        # Run tests for each category
-        spf_results = spf_parser.test_spf(domain)
-        dkim_results = mail.test_dkim(domain)
-        dmarc_results = dmarc_parser.test_dmarc(domain)
-        starttls_results = mail.test_starttls(domain)
+        with scan_context(context):
+            # Run the sub-checks of all categories as one dependency graph
+            if cache is not None:
+                # Reuse cached categories and only scan the missing ones
+                results["categories"], results["cache"] = run_cached_suite(
+                    cache,
+                    "email",
+                    domain,
+                    get_categories(domain),
+                    max_workers=max_workers,
+                    on_check=on_check,
+                    on_category=on_category
+                )
+            else:
+                results["categories"] = run_suite(
+                    get_categories(domain),
+                    max_workers=max_workers,
+                    on_check=on_check,
+                    on_category=on_category
+                )
         
-        # Combine results
-        results["categories"] = {
-            "spf": spf_results,
-            "dkim": dkim_results,
-            "dmarc": dmarc_results,
-            "starttls": starttls_results
-        }
+        # Calculate overall score
+        results["score"] = calculate_email_score(results["categories"])
+        results["status"] = TestStatus.DONE.value
+        
+    except Exception as e:
+        logger.error(f"Error in email test for {domain}: {str(e)}")
+        results["status"] = TestStatus.ERROR.value
+        results["error"] = str(e)
+    
+    results["lookups"] = context.report()
+    
+    return results
+
+async def run_email_tests_async(domain, max_concurrency=None, on_check=None, on_category=None):
+    """
+    Run all email tests for a given domain on the running event loop
+    
+    Network probes use asyncio, so many scans can be in flight in one process.
+    
+    Args:
+        domain (str): Domain name to test
+        max_concurrency (int): Maximum number of sub-checks running concurrently
+        on_check (callable): Optional callback(category, test, result) per finished sub-check
+        on_category (callable): Optional callback(category, result) per finished category
+    
+    Returns:
+        dict: Results of all tests
+    """
+    logger.info(f"Running email tests (async) for domain: {domain}")
+    
+    # Initialize results dictionary
+    results = {
+        "domain": domain,
+        "timestamp": _get_timestamp(),
+        "status": TestStatus.RUNNING.value,
+        "categories": {},
+        "score": None
+    }
+    
+    context = ScanContext()
+    try:
+        with scan_context(context):
+            results["categories"] = await run_suite_async(
+                get_categories(domain),
+                max_concurrency=max_concurrency,
+                on_check=on_check,
+                on_category=on_category
+            )
         
         # Calculate overall score
         results["score"] = calculate_email_score(results["categories"])
@@ -50,8 +114,37 @@ def run_email_tests(domain):
         results["status"] = TestStatus.ERROR.value
         results["error"] = str(e)
     
+    results["lookups"] = context.report()
+    
     return results
 
+def get_categories(domain):
+    """
+    Build the email test categories for a given domain
+    
+    DKIM and STARTTLS are single checks whose result is the category result.
+    
+    Args:
+        domain (str): Domain name to test
+    
+    Returns:
+        dict: Mapping of category key to Category or Check
+    """
+    return {
+        "spf": Category("SPF", spf_parser.get_checks(domain)),
+        "dkim": Check(
+            "dkim",
+            lambda: mail.test_dkim(domain),
+            afunc=lambda: mail.test_dkim_async(domain)
+        ),
+        "dmarc": Category("DMARC", dmarc_parser.get_checks(domain)),
+        "starttls": Check(
+            "starttls",
+            lambda: mail.test_starttls(domain),
+            afunc=lambda: mail.test_starttls_async(domain)
+        )
+    }
+
 def calculate_email_score(categories):
     """
     Calculate the overall score for email tests
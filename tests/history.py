@@ -0,0 +1,251 @@
+"""
+Scan history for Internet security tests.
+Persists every scan run and its per-check results in SQLite.
+"""
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    suite TEXT NOT NULL,
+    domain TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    status TEXT,
+    score REAL,
+    result TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_domain_suite_timestamp ON runs (domain, suite, timestamp);
+CREATE TABLE IF NOT EXISTS checks (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    category TEXT NOT NULL,
+    test TEXT NOT NULL,
+    status TEXT,
+    score REAL,
+    details TEXT,
+    PRIMARY KEY (run_id, category, test)
+) WITHOUT ROWID;
+"""
+
+_STOP = object()
+
+def sqlite_path(uri):
+    """
+    Database file of a `sqlite:///path` URI
+
+    Args:
+        uri (str): SQLAlchemy style database URI
+
+    Returns:
+        str: Path of the database file, or None if the URI is not SQLite
+    """
+    if not uri or not uri.startswith('sqlite:///'):
+        return None
+    path = uri[len('sqlite:///'):]
+    return path or None
+
+class HistoryStore:
+    """
+    Scan history in a SQLite database in WAL mode
+
+    Writes are queued and committed in batches by a background thread, so
+    recording a scan never waits on disk. Runs are indexed on
+    (domain, suite, timestamp), which keeps latest-result and per-domain
+    history lookups logarithmic in the number of stored runs.
+
+    Args:
+        path (str): Database file
+        batch_size (int): Maximum number of runs committed in one transaction
+        max_pending (int): Runs queued before new ones are dropped
+    """
+    def __init__(self, path, batch_size=500, max_pending=10000):
+        self.path = path
+        self.batch_size = batch_size
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._local = threading.local()
+
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        conn.commit()
+
+        self._writer = threading.Thread(target=self._write_loop, name="history-writer", daemon=True)
+        self._writer.start()
+
+    def record(self, suite, result):
+        """
+        Queue a scan result for storage without blocking
+
+        Args:
+            suite (str): Suite name ("website" or "email")
+            result (dict): Result of the scan
+
+        Returns:
+            bool: False if the queue was full and the result was dropped
+        """
+        try:
+            self._queue.put_nowait((suite, result, time.time()))
+            return True
+        except queue.Full:
+            logger.warning(f"History queue full, dropping {suite} result for {result.get('domain')}")
+            return False
+
+    def latest(self, suite, domain):
+        """
+        Most recent run of a suite for a domain
+
+        Args:
+            suite (str): Suite name
+            domain (str): Domain name
+
+        Returns:
+            dict: Stored run including its full result, or None
+        """
+        row = self._connect().execute(
+            "SELECT id, suite, domain, timestamp, status, score, result FROM runs "
+            "WHERE domain = ? AND suite = ? ORDER BY timestamp DESC LIMIT 1",
+            (domain, suite)
+        ).fetchone()
+        if row is None:
+            return None
+        run = _run_from_row(row)
+        del run["checks"]
+        run["result"] = json.loads(row[6])
+        return run
+
+    def history(self, suite, domain, limit=50, before=None):
+        """
+        Past runs of a suite for a domain, newest first
+
+        Args:
+            suite (str): Suite name
+            domain (str): Domain name
+            limit (int): Maximum number of runs returned
+            before (float): Only return runs older than this timestamp
+
+        Returns:
+            list: Runs with their per-check scores
+        """
+        conn = self._connect()
+        if before is None:
+            before = float('inf')
+        rows = conn.execute(
+            "SELECT id, suite, domain, timestamp, status, score FROM runs "
+            "WHERE domain = ? AND suite = ? AND timestamp < ? ORDER BY timestamp DESC LIMIT ?",
+            (domain, suite, before, limit)
+        ).fetchall()
+
+        runs = [_run_from_row(row) for row in rows]
+        if not runs:
+            return runs
+
+        by_id = {run["id"]: run for run in runs}
+        placeholders = ",".join("?" * len(by_id))
+        checks = conn.execute(
+            f"SELECT run_id, category, test, status, score FROM checks WHERE run_id IN ({placeholders})",
+            list(by_id)
+        )
+        for run_id, category, test, status, score in checks:
+            by_id[run_id]["checks"].setdefault(category, {})[test] = {"status": status, "score": score}
+        return runs
+
+    def flush(self, timeout=None):
+        """Wait until every queued run has been written"""
+        done = threading.Event()
+        self._queue.put(done, timeout=timeout)
+        return done.wait(timeout)
+
+    def close(self):
+        """Write the queued runs and stop the writer thread"""
+        self._queue.put(_STOP)
+        self._writer.join()
+
+    def _connect(self):
+        """Connection of the calling thread"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA foreign_keys=ON")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _write_loop(self):
+        """Commit queued runs in batches"""
+        conn = self._connect()
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            runs = [item for item in batch if isinstance(item, tuple)]
+            if runs:
+                try:
+                    self._write(conn, runs)
+                except (sqlite3.Error, TypeError, ValueError) as e:
+                    logger.error(f"Error writing {len(runs)} runs to history: {str(e)}")
+
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    item.set()
+            if any(item is _STOP for item in batch):
+                conn.close()
+                return
+
+    def _write(self, conn, runs):
+        """Insert runs and their checks in one transaction"""
+        checks = []
+        with conn:
+            for suite, result, timestamp in runs:
+                cursor = conn.execute(
+                    "INSERT INTO runs (suite, domain, timestamp, status, score, result) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (suite, result.get("domain"), timestamp, result.get("status"),
+                     result.get("score"), json.dumps(result))
+                )
+                checks.extend(_check_rows(cursor.lastrowid, result))
+            conn.executemany(
+                "INSERT OR REPLACE INTO checks (run_id, category, test, status, score, details) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                checks
+            )
+
+def _check_rows(run_id, result):
+    """Rows of the checks table for one scan result"""
+    rows = []
+    for cat_key, category in result.get("categories", {}).items():
+        # Single-check categories (dkim, starttls) are stored as their own test
+        tests = category.get("tests") if "tests" in category else {cat_key: category}
+        for test_key, test in tests.items():
+            if not test:
+                continue
+            rows.append((
+                run_id,
+                cat_key,
+                test_key,
+                test.get("status"),
+                test.get("score"),
+                json.dumps(test.get("details"))
+            ))
+    return rows
+
+def _run_from_row(row):
+    """Run dict from a row of the runs table"""
+    return {
+        "id": row[0],
+        "suite": row[1],
+        "domain": row[2],
+        "timestamp": row[3],
+        "status": row[4],
+        "score": row[5],
+        "checks": {}
+    }
@@ -2,10 +2,13 @@
 IPv6 testing module for Internet security tests.
 Replaces Django-specific IPv6 testing implementation.
 """
+import asyncio
 import logging
 import socket
 from .shared import dns_lookup, create_test_result, get_domain_ip_addresses
 from .scoring import Score, TestStatus
+from .scheduler import Check, run_category
+from . import aio
 
 logger = logging.getLogger(__name__)
 
@@ -21,42 +24,39 @@ def test_ipv6_website(domain):
     """
     logger.info(f"Testing IPv6 for website: {domain}")
     
-    results = {
-        "name": "IPv6",
-        "status": TestStatus.RUNNING.value,
-        "tests": {},
-        "score": None
-    }
+    return run_category("IPv6", get_website_checks(domain))
+
+def get_website_checks(domain):
+    """
+    Build the IPv6 website checks and their dependencies
     
-    try:
-        # Test for AAAA records
-        aaaa_test = test_aaaa_records(domain)
-        results["tests"]["aaaa_records"] = aaaa_test
+    Args:
+        domain (str): Domain name to test
         
-        # Test for IPv6 reachability
-        if aaaa_test["score"] > 0:
-            reach_test = test_ipv6_reachability(domain)
-            results["tests"]["reachability"] = reach_test
-        else:
-            reach_test = create_test_result(
+    Returns:
+        list: List of Check objects
+    """
+    return [
+        Check(
+            "aaaa_records",
+            lambda: test_aaaa_records(domain),
+            afunc=lambda: test_aaaa_records_async(domain)
+        ),
+        # Reachability is only meaningful when AAAA records exist
+        Check(
+            "reachability",
+            lambda: test_ipv6_reachability(domain),
+            afunc=lambda: test_ipv6_reachability_async(domain),
+            requires=("aaaa_records",),
+            when=lambda deps: deps["aaaa_records"]["score"] > 0,
+            skip=create_test_result(
                 "IPv6 Reachability",
                 "skipped",
                 Score.FAILED,
                 {"reason": "No AAAA records found"}
             )
-            results["tests"]["reachability"] = reach_test
-        
-        # Calculate overall score
-        score_sum = sum(test["score"] for test in results["tests"].values())
-        results["score"] = score_sum / len(results["tests"])
-        results["status"] = TestStatus.DONE.value
-        
-    except Exception as e:
-        logger.error(f"Error in IPv6 test for {domain}: {str(e)}")
-        results["status"] = TestStatus.ERROR.value
-        results["error"] = str(e)
-    
-    return results
+        )
+    ]
 
 def test_aaaa_records(domain):
     """
@@ -69,22 +69,27 @@ def test_aaaa_records(domain):
         dict: Test result
     """
     try:
-        records = dns_lookup(domain, 'AAAA')
+        return _aaaa_result(dns_lookup(domain, 'AAAA'))
+    except Exception as e:
+        return create_test_result(
+            "AAAA Records",
+            "error",
+            Score.FAILED,
+            {"error": str(e)}
+        )
+
+async def test_aaaa_records_async(domain):
+    """
+    Test if a domain has AAAA records without blocking
+    
+    Args:
+        domain (str): Domain name to test
         
-        if records and len(records) > 0:
-            return create_test_result(
-                "AAAA Records",
-                "done",
-                Score.GOOD,
-                {"records": records}
-            )
-        else:
-            return create_test_result(
-                "AAAA Records",
-                "done",
-                Score.FAILED,
-                {"records": []}
-            )
+    Returns:
+        dict: Test result
+    """
+    try:
+        return _aaaa_result(await aio.dns_lookup(domain, 'AAAA'))
     except Exception as e:
         return create_test_result(
             "AAAA Records",
@@ -93,6 +98,23 @@ def test_aaaa_records(domain):
             {"error": str(e)}
         )
 
+def _aaaa_result(records):
+    """Score the AAAA records of a domain"""
+    if records and len(records) > 0:
+        return create_test_result(
+            "AAAA Records",
+            "done",
+            Score.GOOD,
+            {"records": records}
+        )
+    else:
+        return create_test_result(
+            "AAAA Records",
+            "done",
+            Score.FAILED,
+            {"records": []}
+        )
+
 def test_ipv6_reachability(domain):
     """
     Test if a domain is reachable over IPv6
@@ -107,14 +129,6 @@ def test_ipv6_reachability(domain):
         ips = get_domain_ip_addresses(domain)
         ipv6_addresses = ips.get('ipv6', [])
         
-        if not ipv6_addresses:
-            return create_test_result(
-                "IPv6 Reachability",
-                "done",
-                Score.FAILED,
-                {"reachable": False, "reason": "No IPv6 addresses found"}
-            )
-        
         # Try to connect to port 80 (HTTP) on each IPv6 address
         reachable = False
         for ip in ipv6_addresses:
@@ -128,20 +142,35 @@ def test_ipv6_reachability(domain):
             except:
                 continue
         
-        if reachable:
-            return create_test_result(
-                "IPv6 Reachability",
-                "done",
-                Score.GOOD,
-                {"reachable": True}
-            )
-        else:
-            return create_test_result(
-                "IPv6 Reachability",
-                "done",
-                Score.FAILED,
-                {"reachable": False, "reason": "Cannot connect to IPv6 addresses"}
-            )
+        return _reachability_result(ipv6_addresses, reachable)
+    except Exception as e:
+        return create_test_result(
+            "IPv6 Reachability",
+            "error",
+            Score.FAILED,
+            {"error": str(e)}
+        )
+
+async def test_ipv6_reachability_async(domain):
+    """
+    Test if a domain is reachable over IPv6 without blocking
+    
+    All IPv6 addresses are tried at once; one successful connection suffices.
+    
+    Args:
+        domain (str): Domain name to test
+        
+    Returns:
+        dict: Test result
+    """
+    try:
+        try:
+            ipv6_addresses = await aio.dns_lookup(domain, 'AAAA')
+        except Exception:
+            ipv6_addresses = []
+        
+        connected = await asyncio.gather(*(aio.is_port_open(ip, 80) for ip in ipv6_addresses))
+        return _reachability_result(ipv6_addresses, any(connected))
     except Exception as e:
         return create_test_result(
             "IPv6 Reachability",
@@ -150,6 +179,31 @@ def test_ipv6_reachability(domain):
             {"error": str(e)}
         )
 
+def _reachability_result(ipv6_addresses, reachable):
+    """Score IPv6 reachability given the addresses tried"""
+    if not ipv6_addresses:
+        return create_test_result(
+            "IPv6 Reachability",
+            "done",
+            Score.FAILED,
+            {"reachable": False, "reason": "No IPv6 addresses found"}
+        )
+    
+    if reachable:
+        return create_test_result(
+            "IPv6 Reachability",
+            "done",
+            Score.GOOD,
+            {"reachable": True}
+        )
+    else:
+        return create_test_result(
+            "IPv6 Reachability",
+            "done",
+            Score.FAILED,
+            {"reachable": False, "reason": "Cannot connect to IPv6 addresses"}
+        )
+
 def test_client_ipv6(client_ip):
     """
     Test if a client has IPv6 connectivity
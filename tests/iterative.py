@@ -0,0 +1,370 @@
+"""
+Iterative DNS resolution for Internet security tests.
+Walks from the root to the authoritative servers, caching delegations and glue by TTL.
+"""
+import asyncio
+import copy
+import logging
+import random
+import time
+from collections import OrderedDict
+import dns.flags
+import dns.message
+import dns.name
+import dns.rcode
+import dns.rdataclass
+import dns.rdatatype
+import dns.rrset
+from dns.resolver import NXDOMAIN, NoAnswer, NoNameservers, LifetimeTimeout
+from .dns_transport import MultiplexedTransport, EDNS_PAYLOAD, _to_answer
+
+logger = logging.getLogger(__name__)
+
+# IPv4 addresses of a.root-servers.net through m.root-servers.net
+ROOT_HINTS = [
+    '198.41.0.4', '170.247.170.2', '192.33.4.12', '199.7.91.13', '192.203.230.10',
+    '192.5.5.241', '192.112.36.4', '198.97.190.53', '192.36.148.17', '192.58.128.30',
+    '193.0.14.129', '199.7.83.42', '202.12.27.33'
+]
+
+# Referrals followed for one name before giving up
+MAX_REFERRALS = 30
+
+# CNAMEs followed across zones
+MAX_CNAMES = 8
+
+# Nested lookups of nameserver addresses missing glue
+MAX_DEPTH = 4
+
+# Delegations kept in the cache
+DEFAULT_MAX_ZONES = 10000
+
+class Delegation:
+    """
+    Nameservers of a zone cut and their addresses
+
+    Args:
+        zone (dns.name.Name): Delegated zone
+        nameservers (list): Nameserver names
+        addresses (list): Nameserver addresses known so far
+        expires (float): Expiry time, from the NS and glue TTLs
+    """
+    def __init__(self, zone, nameservers, addresses, expires):
+        self.zone = zone
+        self.nameservers = nameservers
+        self.addresses = addresses
+        self.expires = expires
+
+class DelegationCache:
+    """
+    LRU cache of zone cuts keyed by zone name
+
+    Entries expire with the smallest TTL of the NS records and the glue
+    they were learned with. The root delegation comes from the hints and
+    never expires.
+
+    Args:
+        root_hints (list): Root server addresses
+        max_zones (int): Maximum number of cached delegations
+    """
+    def __init__(self, root_hints=None, max_zones=DEFAULT_MAX_ZONES):
+        self.root = Delegation(dns.name.root, [], list(root_hints or ROOT_HINTS), float('inf'))
+        self.max_zones = max_zones
+        self._zones = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def closest(self, name):
+        """
+        Deepest cached delegation enclosing a name
+
+        Args:
+            name (dns.name.Name): Name being resolved
+
+        Returns:
+            Delegation: Cached delegation, or the root one
+        """
+        now = time.time()
+        while name != dns.name.root:
+            delegation = self._zones.get(name)
+            if delegation is not None:
+                if delegation.expires > now:
+                    self._zones.move_to_end(name)
+                    self.hits += 1
+                    return delegation
+                del self._zones[name]
+            name = name.parent()
+        self.misses += 1
+        return self.root
+
+    def put(self, delegation):
+        """Cache a delegation, evicting the least recently used one when full"""
+        self._zones[delegation.zone] = delegation
+        self._zones.move_to_end(delegation.zone)
+        while len(self._zones) > self.max_zones:
+            self._zones.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        """Size and hit counters of the cache"""
+        return {
+            "zones": len(self._zones),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+class IterativeResolver:
+    """
+    Resolver walking the delegation chain itself, used as a DNS transport
+
+    Each lookup starts at the deepest cached zone cut enclosing the name,
+    the root servers when nothing is cached, and follows referrals down to
+    the authoritative servers with non-recursive queries. Delegations and
+    their in-bailiwick glue are cached by TTL, so later names under a known
+    zone are sent straight to its servers; addresses of nameservers without
+    glue are resolved the same way and kept with the delegation. DS queries
+    go to the servers of the parent zone. CNAMEs leaving the zone are
+    followed and the chain is returned in one answer.
+
+    Concurrent lookups that need the same referral wait for the first one
+    instead of all asking the parent zone.
+
+    Queries with explicit nameservers are sent to them as usual.
+
+    Args:
+        transport (MultiplexedTransport): Transport sending the queries
+        root_hints (list): Root server addresses
+        port (int): Port of all servers
+        max_zones (int): Maximum number of cached delegations
+        ipv6 (bool): Also use IPv6 nameserver addresses
+    """
+    def __init__(self, transport=None, root_hints=None, port=53, max_zones=DEFAULT_MAX_ZONES, ipv6=False):
+        self.transport = transport or MultiplexedTransport()
+        self.cache = DelegationCache(root_hints, max_zones)
+        self.port = port
+        self.ipv6 = ipv6
+        self._inflight = {}
+        self.lookups = 0
+        self.queries = 0
+        self.referrals = 0
+        self.coalesced = 0
+
+    def resolve(self, domain, record_type='A', timeout=5, nameservers=None, use_dnssec=False):
+        """
+        Resolve a DNS record iteratively, blocking the calling thread
+
+        Args:
+            domain (str): Domain name to query
+            record_type (str): DNS record type
+            timeout (int): Overall timeout in seconds
+            nameservers (list): Explicit nameservers, bypassing iteration
+            use_dnssec (bool): Set the DO bit
+
+        Returns:
+            dns.resolver.Answer: DNS answer
+        """
+        return self.transport.run(self.query(domain, record_type, timeout, nameservers, use_dnssec))
+
+    async def resolve_async(self, domain, record_type='A', timeout=5, nameservers=None, use_dnssec=False):
+        """
+        Coroutine counterpart of resolve
+
+        Args:
+            domain (str): Domain name to query
+            record_type (str): DNS record type
+            timeout (int): Overall timeout in seconds
+            nameservers (list): Explicit nameservers, bypassing iteration
+            use_dnssec (bool): Set the DO bit
+
+        Returns:
+            dns.resolver.Answer: DNS answer
+        """
+        return await self.transport.run_async(self.query(domain, record_type, timeout, nameservers, use_dnssec))
+
+    def stats(self):
+        """Lookup, referral and delegation cache counters"""
+        return {
+            "lookups": self.lookups,
+            "queries": self.queries,
+            "referrals": self.referrals,
+            "coalesced": self.coalesced,
+            "delegations": self.cache.stats(),
+            "transport": self.transport.stats()
+        }
+
+    def close(self):
+        """Close the underlying transport"""
+        self.transport.close()
+
+    async def query(self, domain, record_type='A', timeout=5, nameservers=None, use_dnssec=False):
+        """
+        Resolve a record on the transport's event loop
+
+        Args:
+            domain (str): Domain name to query
+            record_type (str): DNS record type
+            timeout (int): Overall timeout in seconds
+            nameservers (list): Explicit nameservers, bypassing iteration
+            use_dnssec (bool): Set the DO bit
+
+        Returns:
+            dns.resolver.Answer: DNS answer
+        """
+        if nameservers:
+            return await self.transport.query(domain, record_type, timeout, nameservers, use_dnssec)
+
+        self.lookups += 1
+        qname = dns.name.from_text(domain)
+        rdtype = dns.rdatatype.from_text(record_type)
+        deadline = asyncio.get_running_loop().time() + timeout
+        response, server = await self._resolve(qname, rdtype, use_dnssec, deadline, timeout, 0)
+        return _to_answer(qname, rdtype, response, server)
+
+    async def _resolve(self, qname, rdtype, use_dnssec, deadline, timeout, depth):
+        """Resolve a name, following CNAMEs into other zones"""
+        chain = []
+        name = qname
+        for _ in range(MAX_CNAMES + 1):
+            response, server = await self._walk(name, rdtype, use_dnssec, deadline, timeout, depth)
+            target = _chain_end(response, name, rdtype)
+            if target is None or response.rcode() != dns.rcode.NOERROR:
+                break
+            chain.extend(response.answer)
+            name = target
+        else:
+            raise NoNameservers(request=dns.message.make_query(qname, rdtype), errors=[
+                (server[0], False, server[1], "CNAME chain too long", response)
+            ])
+
+        if chain:
+            # One response carrying the whole chain, as a recursive resolver returns it
+            response = copy.copy(response)
+            response.question = [dns.rrset.RRset(qname, dns.rdataclass.IN, rdtype)]
+            response.answer = chain + response.answer
+            # The rrset index of the copy no longer matches its sections
+            response.index = None
+        return response, server
+
+    async def _walk(self, qname, rdtype, use_dnssec, deadline, timeout, depth):
+        """Follow referrals from the closest cached zone cut to an authoritative answer"""
+        loop = asyncio.get_running_loop()
+        # The parent side of a zone cut holds the DS records
+        start = qname.parent() if rdtype == dns.rdatatype.DS and qname != dns.name.root else qname
+        delegation = self.cache.closest(start)
+        request = dns.message.make_query(qname, rdtype, use_edns=0, payload=EDNS_PAYLOAD, want_dnssec=use_dnssec)
+        request.flags &= ~dns.flags.RD
+
+        for _ in range(MAX_REFERRALS):
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise LifetimeTimeout(timeout=timeout, errors=[])
+
+            key = (delegation.zone, _child(qname, delegation.zone))
+            pending = self._inflight.get(key)
+            if pending is not None:
+                # Someone is already asking this zone about the same child
+                self.coalesced += 1
+                try:
+                    await asyncio.wait_for(asyncio.shield(pending), remaining)
+                except asyncio.TimeoutError:
+                    raise LifetimeTimeout(timeout=timeout, errors=[])
+                closer = self.cache.closest(start)
+                if len(closer.zone) > len(delegation.zone):
+                    delegation = closer
+                    continue
+
+            servers = await self._addresses(delegation, deadline, timeout, depth)
+            future = loop.create_future()
+            self._inflight.setdefault(key, future)
+            try:
+                self.queries += 1
+                response, server = await self.transport.send(request, servers, deadline - loop.time())
+                referral = self._referral(response, delegation.zone, qname)
+                if referral is not None:
+                    self.cache.put(referral)
+            finally:
+                if self._inflight.get(key) is future:
+                    del self._inflight[key]
+                future.set_result(None)
+
+            if referral is None:
+                return response, server
+            self.referrals += 1
+            delegation = referral
+
+        raise NoNameservers(request=request, errors=[(server[0], False, server[1], "too many referrals", response)])
+
+    def _referral(self, response, zone, qname):
+        """Delegation to a child zone of `zone` in a response, or None if it is an answer"""
+        if response.rcode() != dns.rcode.NOERROR or response.answer:
+            return None
+        for rrset in response.authority:
+            if rrset.rdtype != dns.rdatatype.NS or rrset.name == zone:
+                continue
+            if not (rrset.name.is_subdomain(zone) and qname.is_subdomain(rrset.name)):
+                logger.debug(f"Ignoring out-of-zone referral to {rrset.name} from {zone}")
+                return None
+
+            nameservers = [rdata.target for rdata in rrset]
+            address_types = (dns.rdatatype.A, dns.rdatatype.AAAA) if self.ipv6 else (dns.rdatatype.A,)
+            addresses = []
+            ttl = rrset.ttl
+            for glue in response.additional:
+                # Only glue the referring zone is authoritative for (bailiwick rule)
+                if glue.rdtype in address_types and glue.name in nameservers and glue.name.is_subdomain(zone):
+                    addresses.extend(rdata.address for rdata in glue)
+                    ttl = min(ttl, glue.ttl)
+            return Delegation(rrset.name, nameservers, addresses, time.time() + ttl)
+        return None
+
+    async def _addresses(self, delegation, deadline, timeout, depth):
+        """Servers of a delegation, resolving nameservers that came without glue"""
+        if not delegation.addresses:
+            if depth >= MAX_DEPTH:
+                raise NoNameservers(request=dns.message.make_query(delegation.zone, dns.rdatatype.NS), errors=[])
+            results = await asyncio.gather(*[
+                self._resolve(nameserver, dns.rdatatype.A, False, deadline, timeout, depth + 1)
+                for nameserver in delegation.nameservers
+            ], return_exceptions=True)
+            for nameserver, result in zip(delegation.nameservers, results):
+                if isinstance(result, Exception):
+                    logger.debug(f"Could not resolve nameserver {nameserver}: {str(result)}")
+                    continue
+                try:
+                    answer = _to_answer(nameserver, dns.rdatatype.A, *result)
+                except (NXDOMAIN, NoAnswer):
+                    continue
+                delegation.addresses.extend(rdata.address for rdata in answer.rrset)
+            if not delegation.addresses:
+                raise NoNameservers(request=dns.message.make_query(delegation.zone, dns.rdatatype.NS), errors=[])
+
+        servers = [(address, self.port) for address in delegation.addresses]
+        random.shuffle(servers)
+        return servers
+
+def _child(name, zone):
+    """Name one label below `zone` on the way to `name`"""
+    if len(name) <= len(zone) + 1:
+        return name
+    return name.split(len(zone) + 1)[1]
+
+def _chain_end(response, name, rdtype):
+    """
+    Last target of a CNAME chain in a response that has no answer for it yet
+
+    Returns:
+        dns.name.Name: Name to continue with, or None if the response answers `name`
+    """
+    if rdtype == dns.rdatatype.CNAME:
+        return None
+    target = None
+    for _ in range(MAX_CNAMES + 1):
+        if response.get_rrset(response.answer, name, dns.rdataclass.IN, rdtype) is not None:
+            return None
+        cname = response.get_rrset(response.answer, name, dns.rdataclass.IN, dns.rdatatype.CNAME)
+        if cname is None:
+            return target
+        name = target = cname[0].target
+    return target
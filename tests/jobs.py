@@ -0,0 +1,174 @@
+"""
+Background scan jobs for Internet security tests.
+Scans are queued on a worker pool and polled by job id.
+"""
+import copy
+import logging
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from .runner import run_scan
+from .scoring import TestStatus
+from .shared import normalize_domain
+
+logger = logging.getLogger(__name__)
+
+# Seconds between two sweeps of expired jobs
+PRUNE_INTERVAL = 60
+
+# Letters, digits, hyphens and underscores, no hyphen at either end
+_LABEL = re.compile(r'[a-z0-9_](?:[a-z0-9_-]{0,61}[a-z0-9_])?')
+
+class JobQueueFull(Exception):
+    """Too many jobs are waiting or running to accept another one"""
+
+class JobManager:
+    """
+    Queue of scan jobs executed by a fixed pool of background workers
+
+    At most `max_queued` jobs wait or run at a time. Finished jobs are
+    swept every PRUNE_INTERVAL seconds once older than `result_ttl`.
+
+    Args:
+        max_workers (int): Number of scans running at the same time
+        result_ttl (int): Seconds a finished job is kept for polling
+        check_workers (int): Maximum number of sub-checks per scan
+        cache (ResultCache): Optional cache of category results
+        history (HistoryStore): Optional store finished scans are recorded in
+        max_queued (int): Jobs waiting or running before new ones are refused
+    """
+    def __init__(self, max_workers=4, result_ttl=3600, check_workers=None, cache=None,
+                 history=None, max_queued=1000):
+        self.result_ttl = result_ttl
+        self.check_workers = check_workers
+        self.cache = cache
+        self.history = history
+        self.max_queued = max_queued
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scan-job")
+        self._jobs = OrderedDict()
+        self._active = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        threading.Thread(target=self._prune_loop, name="job-pruner", daemon=True).start()
+
+    def submit(self, suite, domain):
+        """
+        Queue a scan and return immediately
+
+        Args:
+            suite (str): Suite name ("website" or "email")
+            domain (str): Domain name to test
+
+        Returns:
+            dict: Snapshot of the new job
+
+        Raises:
+            ValueError: If `domain` is not a domain name
+            JobQueueFull: If `max_queued` jobs are already waiting or running
+        """
+        domain = normalize_domain(domain) if isinstance(domain, str) else ''
+        try:
+            domain = domain.encode('idna').decode('ascii')
+        except UnicodeError:
+            raise ValueError("Invalid domain name")
+        if not domain or len(domain) > 253 or not all(_LABEL.fullmatch(label) for label in domain.split('.')):
+            raise ValueError("Invalid domain name")
+
+        job = {
+            "id": uuid.uuid4().hex,
+            "suite": suite,
+            "domain": domain,
+            "status": TestStatus.SCHEDULED.value,
+            "submitted": time.time(),
+            "started": None,
+            "finished": None,
+            "categories": {},
+            "result": None
+        }
+
+        with self._lock:
+            if self._active >= self.max_queued:
+                raise JobQueueFull(f"Job queue is full ({self._active} jobs), try again later")
+            self._active += 1
+            self._jobs[job["id"]] = job
+            snapshot = copy.deepcopy(job)
+
+        self._executor.submit(self._run, job)
+        logger.info(f"Queued {suite} job {job['id']} for domain: {domain}")
+        return snapshot
+
+    def get(self, job_id):
+        """
+        Look up a job
+
+        Args:
+            job_id (str): Job id returned by submit
+
+        Returns:
+            dict: Snapshot of the job including partial per-category
+                results, or None if the job is unknown or expired
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return copy.deepcopy(job) if job else None
+
+    def _run(self, job):
+        """Execute a job on a worker thread"""
+        with self._lock:
+            job["status"] = TestStatus.RUNNING.value
+            job["started"] = time.time()
+
+        def on_check(category, test, result):
+            with self._lock:
+                partial = job["categories"].setdefault(
+                    category, {"status": TestStatus.RUNNING.value, "tests": {}}
+                )
+                if "tests" in partial and partial.get("status") == TestStatus.RUNNING.value:
+                    partial["tests"][test] = result
+
+        def on_category(category, result):
+            with self._lock:
+                job["categories"][category] = result
+
+        try:
+            result = run_scan(
+                job["suite"],
+                job["domain"],
+                max_workers=self.check_workers,
+                on_check=on_check,
+                on_category=on_category,
+                cache=self.cache,
+                history=self.history
+            )
+            status = result.get("status", TestStatus.DONE.value)
+        except Exception as e:
+            logger.error(f"Error in job {job['id']}: {str(e)}")
+            result = {"domain": job["domain"], "status": TestStatus.ERROR.value, "error": str(e)}
+            status = TestStatus.ERROR.value
+
+        with self._lock:
+            job["result"] = result
+            job["status"] = status
+            job["finished"] = time.time()
+            self._active -= 1
+
+    def close(self):
+        """Stop sweeping expired jobs"""
+        self._stop.set()
+
+    def _prune_loop(self):
+        """Sweep expired jobs until closed"""
+        while not self._stop.wait(PRUNE_INTERVAL):
+            with self._lock:
+                self._prune()
+
+    def _prune(self):
+        """Forget finished jobs older than the result TTL (caller holds the lock)"""
+        cutoff = time.time() - self.result_ttl
+        for job_id in list(self._jobs):
+            job = self._jobs[job_id]
+            if job["finished"] is not None and job["finished"] < cutoff:
+                del self._jobs[job_id]
@@ -2,12 +2,19 @@
 Mail testing module for Internet security tests.
 Replaces Django-specific mail testing implementation.
 """
+import asyncio
+import contextvars
 import logging
+import os
 import socket
 import smtplib
 import ssl
+from concurrent.futures import ThreadPoolExecutor, wait
+from dns.resolver import NXDOMAIN
 from .shared import create_test_result, dns_lookup
 from .scoring import Score, TestStatus
+from .scheduler import Check, run_category
+from . import aio
 
 logger = logging.getLogger(__name__)
 
@@ -23,47 +30,44 @@ def test_mail(domain):
     """
     logger.info(f"Testing mail server for domain: {domain}")
     
-    results = {
-        "name": "Mail",
-        "status": TestStatus.RUNNING.value,
-        "tests": {},
-        "score": None
-    }
+    return run_category("Mail", get_checks(domain))
+
+def get_checks(domain):
+    """
+    Build the mail server checks and their dependencies
     
-    try:
-        # Test for MX records
-        mx_test = test_mx_records(domain)
-        results["tests"]["mx_records"] = mx_test
-        
-        if mx_test["score"] > 0:
-            # Test STARTTLS
-            starttls_test = test_starttls(domain)
-            results["tests"]["starttls"] = starttls_test
-            
-            # Test DKIM
-            dkim_test = test_dkim(domain)
-            results["tests"]["dkim"] = dkim_test
-        else:
-            # Skip other tests if no MX records
-            for test_name in ["starttls", "dkim"]:
-                results["tests"][test_name] = create_test_result(
-                    test_name.replace("_", " ").title(),
-                    "skipped",
-                    Score.FAILED,
-                    {"reason": "No MX records found"}
-                )
-        
-        # Calculate overall score
-        score_sum = sum(test["score"] for test in results["tests"].values())
-        results["score"] = score_sum / len(results["tests"])
-        results["status"] = TestStatus.DONE.value
+    Args:
+        domain (str): Domain name to test
         
-    except Exception as e:
-        logger.error(f"Error in mail test for {domain}: {str(e)}")
-        results["status"] = TestStatus.ERROR.value
-        results["error"] = str(e)
+    Returns:
+        list: List of Check objects
+    """
+    checks = [Check(
+        "mx_records",
+        lambda: test_mx_records(domain),
+        afunc=lambda: test_mx_records_async(domain)
+    )]
+    
+    # STARTTLS and DKIM are skipped when the domain has no MX records
+    for test_name, func, afunc in [
+        ("starttls", test_starttls, test_starttls_async),
+        ("dkim", test_dkim, test_dkim_async)
+    ]:
+        checks.append(Check(
+            test_name,
+            lambda func=func: func(domain),
+            afunc=lambda afunc=afunc: afunc(domain),
+            requires=("mx_records",),
+            when=lambda deps: deps["mx_records"]["score"] > 0,
+            skip=create_test_result(
+                test_name.replace("_", " ").title(),
+                "skipped",
+                Score.FAILED,
+                {"reason": "No MX records found"}
+            )
+        ))
     
-    return results
+    return checks
 
 def test_mx_records(domain):
     """
@@ -76,22 +80,27 @@ def test_mx_records(domain):
         dict: Test result
     """
     try:
-        mx_records = dns_lookup(domain, 'MX')
+        return _mx_records_result(dns_lookup(domain, 'MX'))
+    except Exception as e:
+        return create_test_result(
+            "MX Records",
+            "error",
+            Score.FAILED,
+            {"error": str(e)}
+        )
+
+async def test_mx_records_async(domain):
+    """
+    Test MX records for a domain without blocking
+    
+    Args:
+        domain (str): Domain name to test
         
-        if mx_records and len(mx_records) > 0:
-            return create_test_result(
-                "MX Records",
-                "done",
-                Score.GOOD,
-                {"records": mx_records}
-            )
-        else:
-            return create_test_result(
-                "MX Records",
-                "done",
-                Score.FAILED,
-                {"records": []}
-            )
+    Returns:
+        dict: Test result
+    """
+    try:
+        return _mx_records_result(await aio.dns_lookup(domain, 'MX'))
     except Exception as e:
         return create_test_result(
             "MX Records",
@@ -100,6 +109,23 @@ def test_mx_records(domain):
             {"error": str(e)}
         )
 
+def _mx_records_result(mx_records):
+    """Score the MX records of a domain"""
+    if mx_records and len(mx_records) > 0:
+        return create_test_result(
+            "MX Records",
+            "done",
+            Score.GOOD,
+            {"records": mx_records}
+        )
+    else:
+        return create_test_result(
+            "MX Records",
+            "done",
+            Score.FAILED,
+            {"records": []}
+        )
+
 def test_starttls(domain):
     """
     Test STARTTLS support for a domain's mail servers
@@ -114,69 +140,11 @@ def test_starttls(domain):
         mx_records = dns_lookup(domain, 'MX')
         
         if not mx_records or len(mx_records) == 0:
-            return create_test_result(
-                "STARTTLS",
-                "skipped",
-                Score.FAILED,
-                {"reason": "No MX records found"}
-            )
+            return _no_mx_starttls_result()
         
         # Test each MX server
-        results = []
-        for mx in mx_records:
-            try:
-                smtp = smtplib.SMTP(mx, 25, timeout=10)
-                smtp.ehlo()
-                starttls_supported = smtp.has_extn('STARTTLS')
-                
-                if starttls_supported:
-                    # Try to establish STARTTLS connection
-                    context = ssl.create_default_context()
-                    smtp.starttls(context=context)
-                    smtp.ehlo()
-                    results.append({
-                        "server": mx,
-                        "starttls": True,
-                        "protocol": smtp.sock.version()
-                    })
-                else:
-                    results.append({
-                        "server": mx,
-                        "starttls": False
-                    })
-                
-                smtp.quit()
-            except Exception as e:
-                results.append({
-                    "server": mx,
-                    "starttls": False,
-                    "error": str(e)
-                })
-        
-        # Check if all servers support STARTTLS
-        all_support_starttls = all(result.get("starttls", False) for result in results)
-        
-        if all_support_starttls:
-            return create_test_result(
-                "STARTTLS",
-                "done",
-                Score.GOOD,
-                {"servers": results}
-            )
-        elif any(result.get("starttls", False) for result in results):
-            return create_test_result(
-                "STARTTLS",
-                "done",
-                Score.WARNING,
-                {"servers": results, "note": "Some servers don't support STARTTLS"}
-            )
-        else:
-            return create_test_result(
-                "STARTTLS",
-                "done",
-                Score.FAILED,
-                {"servers": results, "note": "No servers support STARTTLS"}
-            )
+        results = [_probe_starttls(mx) for mx in mx_records]
+        return _starttls_result(results)
     except Exception as e:
         return create_test_result(
             "STARTTLS",
@@ -185,10 +153,165 @@ def test_starttls(domain):
             {"error": str(e)}
         )
 
+async def test_starttls_async(domain):
+    """
+    Test STARTTLS support for a domain's mail servers without blocking
+    
+    All MX servers are probed concurrently.
+    
+    Args:
+        domain (str): Domain name to test
+        
+    Returns:
+        dict: Test result
+    """
+    try:
+        mx_records = await aio.dns_lookup(domain, 'MX')
+        
+        if not mx_records or len(mx_records) == 0:
+            return _no_mx_starttls_result()
+        
+        results = await asyncio.gather(*(_probe_starttls_async(mx) for mx in mx_records))
+        return _starttls_result(list(results))
+    except Exception as e:
+        return create_test_result(
+            "STARTTLS",
+            "error",
+            Score.FAILED,
+            {"error": str(e)}
+        )
+
+def _probe_starttls(mx):
+    """Check a single mail server for STARTTLS support"""
+    try:
+        smtp = smtplib.SMTP(mx, 25, timeout=10)
+        smtp.ehlo()
+        starttls_supported = smtp.has_extn('STARTTLS')
+        
+        if starttls_supported:
+            # Try to establish STARTTLS connection
+            context = ssl.create_default_context()
+            smtp.starttls(context=context)
+            smtp.ehlo()
+            result = {
+                "server": mx,
+                "starttls": True,
+                "protocol": smtp.sock.version()
+            }
+        else:
+            result = {
+                "server": mx,
+                "starttls": False
+            }
+        
+        smtp.quit()
+        return result
+    except Exception as e:
+        return {
+            "server": mx,
+            "starttls": False,
+            "error": str(e)
+        }
+
+async def _probe_starttls_async(mx):
+    """Check a single mail server for STARTTLS support without blocking"""
+    try:
+        return {"server": mx, **(await aio.smtp_starttls(mx, 25, timeout=10))}
+    except Exception as e:
+        return {
+            "server": mx,
+            "starttls": False,
+            "error": str(e)
+        }
+
+def _no_mx_starttls_result():
+    """STARTTLS result for a domain without MX records"""
+    return create_test_result(
+        "STARTTLS",
+        "skipped",
+        Score.FAILED,
+        {"reason": "No MX records found"}
+    )
+
+def _starttls_result(results):
+    """Score the STARTTLS support of all mail servers"""
+    # Check if all servers support STARTTLS
+    all_support_starttls = all(result.get("starttls", False) for result in results)
+    
+    if all_support_starttls:
+        return create_test_result(
+            "STARTTLS",
+            "done",
+            Score.GOOD,
+            {"servers": results}
+        )
+    elif any(result.get("starttls", False) for result in results):
+        return create_test_result(
+            "STARTTLS",
+            "done",
+            Score.WARNING,
+            {"servers": results, "note": "Some servers don't support STARTTLS"}
+        )
+    else:
+        return create_test_result(
+            "STARTTLS",
+            "done",
+            Score.FAILED,
+            {"servers": results, "note": "No servers support STARTTLS"}
+        )
+
+# Selector dictionary probed by the DKIM test
+DKIM_SELECTORS_FILE = os.path.join(os.path.dirname(__file__), 'data', 'dkim_selectors.txt')
+
+# Number of selector lookups in flight at the same time
+DKIM_CONCURRENCY = 16
+
+# Seconds all selector lookups of one domain may take together
+DKIM_TIME_BUDGET = 30
+
+def load_dkim_selectors(path=None):
+    """
+    Read a DKIM selector dictionary
+    
+    Args:
+        path (str): File with one selector per line, defaults to the bundled dictionary
+        
+    Returns:
+        list: Selectors in file order, without duplicates, blank lines or # comments
+    """
+    with open(path or DKIM_SELECTORS_FILE, 'r') as f:
+        selectors = (line.strip() for line in f)
+        return list(dict.fromkeys(s for s in selectors if s and not s.startswith('#')))
+
+DKIM_SELECTORS = load_dkim_selectors()
+
+def configure_dkim(selectors=None, concurrency=None, time_budget=None):
+    """
+    Override the DKIM selector dictionary, lookup concurrency and time budget
+    
+    Args:
+        selectors (list): Selectors to probe
+        concurrency (int): Number of selector lookups in flight at once
+        time_budget (float): Seconds all selector lookups of one domain may take
+    """
+    global DKIM_SELECTORS, DKIM_CONCURRENCY, DKIM_TIME_BUDGET
+    if selectors is not None:
+        DKIM_SELECTORS = list(selectors)
+    if concurrency is not None:
+        DKIM_CONCURRENCY = concurrency
+    if time_budget is not None:
+        DKIM_TIME_BUDGET = time_budget
+
 def test_dkim(domain):
     """
     Test DKIM configuration for a domain
     
+    Selectors from the dictionary are queried concurrently. When
+    _domainkey.<domain> does not exist, no selector below it can exist
+    either (RFC 8020), so the selectors are not queried at all. Lookups
+    still pending when DKIM_TIME_BUDGET runs out are cancelled and
+    reported as not checked.
+    
     Args:
         domain (str): Domain name to test
         
@@ -196,35 +319,68 @@ def test_dkim(domain):
         dict: Test result
     """
     try:
-        # Check for DKIM records (common selectors)
-        selectors = ['default', 'mail', 'email', 'dkim', 'selector1', 'selector2']
-        dkim_records = []
-        
-        for selector in selectors:
-            try:
-                records = dns_lookup(f"{selector}._domainkey.{domain}", 'TXT')
-                if records and any('v=DKIM1' in record for record in records):
-                    dkim_records.append({
-                        "selector": selector,
-                        "record": records[0]
-                    })
-            except:
-                continue
-        
-        if dkim_records:
-            return create_test_result(
-                "DKIM",
-                "done",
-                Score.GOOD,
-                {"records": dkim_records}
-            )
-        else:
-            return create_test_result(
-                "DKIM",
-                "done",
-                Score.FAILED,
-                {"records": [], "note": "No DKIM records found with common selectors"}
-            )
+        if not _domainkey_exists(domain):
+            return _dkim_result([], 0, nxdomain=True)
+        
+        selectors = DKIM_SELECTORS
+        executor = ThreadPoolExecutor(max_workers=DKIM_CONCURRENCY)
+        try:
+            # Each lookup runs in a copy of the scan's context
+            futures = [
+                executor.submit(contextvars.copy_context().run, _lookup_selector, domain, selector)
+                for selector in selectors
+            ]
+            done, _ = wait(futures, timeout=DKIM_TIME_BUDGET)
+        finally:
+            # Lookups already running finish on their own resolver timeout
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        dkim_records = [future.result() for future in futures if future in done]
+        return _dkim_result(
+            [record for record in dkim_records if record],
+            len(done),
+            len(selectors) - len(done)
+        )
+    except Exception as e:
+        return create_test_result(
+            "DKIM",
+            "error",
+            Score.FAILED,
+            {"error": str(e)}
+        )
+
+async def test_dkim_async(domain):
+    """
+    Test DKIM configuration for a domain without blocking
+    
+    Args:
+        domain (str): Domain name to test
+        
+    Returns:
+        dict: Test result
+    """
+    try:
+        if not await _domainkey_exists_async(domain):
+            return _dkim_result([], 0, nxdomain=True)
+        
+        selectors = DKIM_SELECTORS
+        semaphore = asyncio.Semaphore(DKIM_CONCURRENCY)
+        
+        async def lookup(selector):
+            async with semaphore:
+                return await _lookup_selector_async(domain, selector)
+        
+        tasks = [asyncio.ensure_future(lookup(selector)) for selector in selectors]
+        done, pending = await asyncio.wait(tasks, timeout=DKIM_TIME_BUDGET)
+        for task in pending:
+            task.cancel()
+        
+        dkim_records = [task.result() for task in tasks if task in done]
+        return _dkim_result(
+            [record for record in dkim_records if record],
+            len(done),
+            len(pending)
+        )
     except Exception as e:
         return create_test_result(
             "DKIM",
@@ -232,3 +388,101 @@ def test_dkim(domain):
             Score.FAILED,
             {"error": str(e)}
         )
+
+def _domainkey_exists(domain):
+    """False if _domainkey.<domain> is NXDOMAIN, True otherwise"""
+    try:
+        dns_lookup(f"_domainkey.{domain}", 'TXT')
+    except NXDOMAIN:
+        return False
+    except Exception:
+        # NoAnswer means the name exists without TXT records; errors prove nothing
+        pass
+    return True
+
+async def _domainkey_exists_async(domain):
+    """Non-blocking counterpart of _domainkey_exists"""
+    try:
+        await aio.dns_lookup(f"_domainkey.{domain}", 'TXT')
+    except NXDOMAIN:
+        return False
+    except Exception:
+        pass
+    return True
+
+def _lookup_selector(domain, selector):
+    """DKIM record published for a selector, or None"""
+    try:
+        return _selector_record(selector, dns_lookup(f"{selector}._domainkey.{domain}", 'TXT'))
+    except Exception:
+        return None
+
+async def _lookup_selector_async(domain, selector):
+    """Non-blocking counterpart of _lookup_selector"""
+    try:
+        return _selector_record(selector, await aio.dns_lookup(f"{selector}._domainkey.{domain}", 'TXT'))
+    except Exception:
+        return None
+
+def _selector_record(selector, records):
+    """Describe the DKIM record among a selector's TXT records"""
+    if records and any('v=DKIM1' in record for record in records):
+        return {
+            "selector": selector,
+            "record": records[0]
+        }
+    return None
+
+def _dkim_result(dkim_records, selectors_checked, selectors_not_checked=0, nxdomain=False):
+    """
+    Score the DKIM records found
+
+    Args:
+        dkim_records (list): Records found
+        selectors_checked (int): Selectors whose lookup finished
+        selectors_not_checked (int): Selectors cancelled when the time budget ran out
+        nxdomain (bool): True if _domainkey.<domain> does not exist
+
+    Returns:
+        dict: Test result, an error if the time budget ran out before any record was found
+    """
+    if dkim_records:
+        details = {"records": dkim_records, "selectors_checked": selectors_checked}
+        if selectors_not_checked:
+            details["selectors_not_checked"] = selectors_not_checked
+        return create_test_result(
+            "DKIM",
+            "done",
+            Score.GOOD,
+            details
+        )
+    elif selectors_not_checked:
+        return create_test_result(
+            "DKIM",
+            "error",
+            Score.FAILED,
+            {
+                "records": [],
+                "selectors_checked": selectors_checked,
+                "selectors_not_checked": selectors_not_checked,
+                "error": "DKIM lookup time budget ran out before a record was found"
+            }
+        )
+    elif nxdomain:
+        return create_test_result(
+            "DKIM",
+            "done",
+            Score.FAILED,
+            {"records": [], "selectors_checked": 0, "note": "_domainkey subdomain does not exist"}
+        )
+    else:
+        return create_test_result(
+            "DKIM",
+            "done",
+            Score.FAILED,
+            {
+                "records": [],
+                "selectors_checked": selectors_checked,
+                "note": "No DKIM records found with common selectors"
+            }
+        )
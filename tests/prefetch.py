@@ -0,0 +1,149 @@
+"""
+DNS prefetching for Internet security tests.
+Resolves the predictable lookups of upcoming bulk scan domains ahead of their scans.
+"""
+import asyncio
+import logging
+import threading
+from dns.resolver import NXDOMAIN, NoAnswer
+from .resolver import resolvers
+
+logger = logging.getLogger(__name__)
+
+# Lookups every scan of a suite makes: (name template, record type, DO bit)
+SUITE_QUERIES = {
+    "website": (
+        ("{domain}", "A", False),
+        ("{domain}", "AAAA", False),
+        ("{domain}", "DS", True),
+        ("{domain}", "DNSKEY", True),
+        ("{domain}", "A", True)
+    ),
+    "email": (
+        ("{domain}", "MX", False),
+        ("{domain}", "TXT", False),
+        ("_dmarc.{domain}", "TXT", False),
+        ("_domainkey.{domain}", "TXT", False)
+    )
+}
+
+# Default number of prefetch queries in flight
+DEFAULT_CONCURRENCY = 64
+
+class PrefetchStats:
+    """Thread-safe counters of the prefetched domains and queries"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.domains = 0
+        self.queries = 0
+        self.negative = 0
+        self.errors = 0
+
+    def record(self, domains=0, queries=0, negative=0, errors=0):
+        with self._lock:
+            self.domains += domains
+            self.queries += queries
+            self.negative += negative
+            self.errors += errors
+
+    def snapshot(self):
+        """Counters as a dict"""
+        with self._lock:
+            return {
+                "domains": self.domains,
+                "queries": self.queries,
+                "negative": self.negative,
+                "errors": self.errors
+            }
+
+# Counters of every prefetcher in this process
+prefetch_stats = PrefetchStats()
+
+# Event loop shared by every prefetcher, started on first use
+_loop = None
+_loop_lock = threading.Lock()
+
+def _prefetch_loop():
+    """Event loop running the prefetches of all bulk scans"""
+    global _loop
+    if _loop is not None:
+        return _loop
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="dns-prefetch", daemon=True).start()
+            _loop = loop
+        return _loop
+
+class Prefetcher:
+    """
+    Background resolution of the lookups upcoming scans will make
+
+    Each domain fed in has the predictable lookups of its suite resolved on
+    a background event loop shared by all prefetchers, at most
+    `concurrency` at a time per prefetcher. Answers, and
+    NXDOMAIN/NoAnswer results, land in the DNS answer cache of the shared
+    resolvers, which every lookup of a scan consults first, so a scan
+    starting later finds them there instead of waiting on the network.
+    Prefetching is only useful with the answer cache enabled.
+
+    Args:
+        suite (str): Suite name ("website" or "email")
+        concurrency (int): Prefetch queries in flight at the same time
+        timeout (int): Timeout of each query in seconds
+    """
+    def __init__(self, suite, concurrency=None, timeout=5):
+        self.queries = SUITE_QUERIES.get(suite, ())
+        self.concurrency = concurrency or DEFAULT_CONCURRENCY
+        self.timeout = timeout
+        self._semaphore = None
+        self._futures = set()
+        self._lock = threading.Lock()
+
+    def feed(self, domain):
+        """
+        Start prefetching the lookups of a domain
+
+        Args:
+            domain (str): Normalized domain name
+        """
+        if not self.queries:
+            return
+        future = asyncio.run_coroutine_threadsafe(self._prefetch(domain), _prefetch_loop())
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._done)
+
+    def close(self):
+        """Cancel the outstanding prefetches"""
+        with self._lock:
+            futures, self._futures = self._futures, set()
+        for future in futures:
+            future.cancel()
+
+    def _done(self, future):
+        with self._lock:
+            self._futures.discard(future)
+
+    async def _prefetch(self, domain):
+        """Resolve the lookups of one domain into the answer cache"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def lookup(name, record_type, use_dnssec):
+            async with self._semaphore:
+                try:
+                    await resolvers.resolve_async(name, record_type, timeout=self.timeout, use_dnssec=use_dnssec)
+                    prefetch_stats.record(queries=1)
+                except (NXDOMAIN, NoAnswer):
+                    prefetch_stats.record(queries=1, negative=1)
+                except Exception as e:
+                    prefetch_stats.record(queries=1, errors=1)
+                    logger.debug(f"Prefetch of {name} ({record_type}) failed: {str(e)}")
+
+        await asyncio.gather(*[
+            lookup(template.format(domain=domain), record_type, use_dnssec)
+            for template, record_type, use_dnssec in self.queries
+        ])
+        prefetch_stats.record(domains=1)
@@ -0,0 +1,251 @@
+"""
+Shared DNS resolvers for Internet security tests.
+Resolvers are built once per configuration and reused by every lookup.
+"""
+import logging
+import threading
+import time
+import dns.asyncresolver
+import dns.flags
+import dns.resolver
+from dns.resolver import NXDOMAIN, NoAnswer
+from .dns_cache import DNSCache
+
+logger = logging.getLogger(__name__)
+
+class ResolverStats:
+    """Thread-safe counters of the queries issued through a ResolverManager"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Zero all counters"""
+        with self._lock:
+            self.queries = 0
+            self.errors = 0
+            self.negative = 0
+            self.time_spent = 0.0
+            self.by_type = {}
+
+    def record(self, record_type, elapsed, outcome):
+        """
+        Count one query
+
+        Args:
+            record_type (str): DNS record type that was queried
+            elapsed (float): Seconds spent on the query
+            outcome (str): "ok", "negative" (NXDOMAIN/NoAnswer) or "error"
+        """
+        with self._lock:
+            self.queries += 1
+            self.time_spent += elapsed
+            self.by_type[record_type] = self.by_type.get(record_type, 0) + 1
+            if outcome == "negative":
+                self.negative += 1
+            elif outcome == "error":
+                self.errors += 1
+
+    def snapshot(self):
+        """Current counters as a dict"""
+        with self._lock:
+            return {
+                "queries": self.queries,
+                "errors": self.errors,
+                "negative": self.negative,
+                "time_spent": round(self.time_spent, 3),
+                "avg_time": round(self.time_spent / self.queries, 4) if self.queries else None,
+                "by_type": dict(self.by_type)
+            }
+
+class ResolverManager:
+    """
+    Process-wide pool of configured DNS resolvers
+
+    A resolver is created the first time a (timeout, nameservers, DNSSEC)
+    combination is used and shared by every later lookup with the same
+    settings, so the system resolver configuration is read only once.
+    dnspython resolvers are safe to share between threads and event loops
+    as long as they are not reconfigured, which this class never does after
+    construction.
+
+    Lookups through the system resolvers are answered from `cache` when
+    possible; lookups against explicit nameservers always go to the network.
+    With a `transport`, queries are sent through it instead of a resolver.
+
+    Args:
+        cache (DNSCache): Optional cache of DNS answers
+        transport (LoopTransport): Optional transport for all queries
+    """
+    def __init__(self, cache=None, transport=None):
+        self._resolvers = {}
+        self._async_resolvers = {}
+        self._lock = threading.Lock()
+        self.cache = cache
+        self.transport = transport
+        self.stats = ResolverStats()
+
+    def set_cache(self, cache):
+        """
+        Replace the answer cache
+
+        Args:
+            cache (DNSCache): New cache, or None to disable caching
+        """
+        self.cache = cache
+
+    def set_transport(self, transport):
+        """
+        Replace the transport
+
+        Args:
+            transport (LoopTransport): New transport, or None to use resolvers
+        """
+        self.transport = transport
+
+    def get(self, timeout=5, nameservers=None, use_dnssec=False):
+        """
+        Resolver for a configuration
+
+        Args:
+            timeout (int): Timeout in seconds
+            nameservers (list): Optional list of nameservers to use
+            use_dnssec (bool): Set the DO bit on queries
+
+        Returns:
+            dns.resolver.Resolver: Shared resolver
+        """
+        return self._get(self._resolvers, dns.resolver.Resolver, timeout, nameservers, use_dnssec)
+
+    def get_async(self, timeout=5, nameservers=None, use_dnssec=False):
+        """
+        Asyncio resolver for a configuration
+
+        Args:
+            timeout (int): Timeout in seconds
+            nameservers (list): Optional list of nameservers to use
+            use_dnssec (bool): Set the DO bit on queries
+
+        Returns:
+            dns.asyncresolver.Resolver: Shared resolver
+        """
+        return self._get(self._async_resolvers, dns.asyncresolver.Resolver, timeout, nameservers, use_dnssec)
+
+    def resolve(self, domain, record_type='A', timeout=5, nameservers=None, use_dnssec=False):
+        """
+        Resolve a DNS record with a shared resolver
+
+        Args:
+            domain (str): Domain name to query
+            record_type (str): DNS record type
+            timeout (int): Timeout in seconds
+            nameservers (list): Optional list of nameservers to use
+            use_dnssec (bool): Set the DO bit on the query
+
+        Returns:
+            dns.resolver.Answer: DNS answer
+        """
+        cache = None if nameservers else self.cache
+        if cache is not None:
+            answer = cache.get(domain, record_type, use_dnssec)
+            if answer is not None:
+                return answer
+
+        started = time.monotonic()
+        outcome = "error"
+        try:
+            if self.transport is not None:
+                answer = self.transport.resolve(domain, record_type, timeout, nameservers, use_dnssec)
+            else:
+                answer = self.get(timeout, nameservers, use_dnssec).resolve(domain, record_type)
+            outcome = "ok"
+        except (NXDOMAIN, NoAnswer) as e:
+            outcome = "negative"
+            if cache is not None:
+                cache.put_negative(domain, record_type, use_dnssec, e)
+            raise
+        finally:
+            self.stats.record(record_type, time.monotonic() - started, outcome)
+
+        if cache is not None:
+            cache.put(domain, record_type, use_dnssec, answer)
+        return answer
+
+    async def resolve_async(self, domain, record_type='A', timeout=5, nameservers=None, use_dnssec=False):
+        """
+        Resolve a DNS record with a shared asyncio resolver
+
+        Args:
+            domain (str): Domain name to query
+            record_type (str): DNS record type
+            timeout (int): Timeout in seconds
+            nameservers (list): Optional list of nameservers to use
+            use_dnssec (bool): Set the DO bit on the query
+
+        Returns:
+            dns.resolver.Answer: DNS answer
+        """
+        cache = None if nameservers else self.cache
+        if cache is not None:
+            answer = cache.get(domain, record_type, use_dnssec)
+            if answer is not None:
+                return answer
+
+        started = time.monotonic()
+        outcome = "error"
+        try:
+            if self.transport is not None:
+                answer = await self.transport.resolve_async(domain, record_type, timeout, nameservers, use_dnssec)
+            else:
+                answer = await self.get_async(timeout, nameservers, use_dnssec).resolve(domain, record_type)
+            outcome = "ok"
+        except (NXDOMAIN, NoAnswer) as e:
+            outcome = "negative"
+            if cache is not None:
+                cache.put_negative(domain, record_type, use_dnssec, e)
+            raise
+        finally:
+            self.stats.record(record_type, time.monotonic() - started, outcome)
+
+        if cache is not None:
+            cache.put(domain, record_type, use_dnssec, answer)
+        return answer
+
+    def reset(self):
+        """Drop all resolvers so the next lookups re-read the system configuration"""
+        with self._lock:
+            self._resolvers.clear()
+            self._async_resolvers.clear()
+
+    def _get(self, resolvers, factory, timeout, nameservers, use_dnssec):
+        """Look up or build the resolver for a configuration"""
+        key = (timeout, tuple(nameservers) if nameservers else None, bool(use_dnssec))
+        resolver = resolvers.get(key)
+        if resolver is not None:
+            return resolver
+
+        with self._lock:
+            resolver = resolvers.get(key)
+            if resolver is None:
+                resolver = resolvers[key] = _build(factory, timeout, nameservers, use_dnssec)
+                logger.debug(f"Created resolver for {key}")
+            return resolver
+
+def _build(factory, timeout, nameservers, use_dnssec):
+    """Create and configure a resolver"""
+    # Explicit nameservers make the system configuration irrelevant
+    resolver = factory(configure=not nameservers)
+    resolver.timeout = timeout
+    resolver.lifetime = timeout
+    if nameservers:
+        resolver.nameservers = list(nameservers)
+    if use_dnssec:
+        resolver.use_edns(0, dns.flags.DO, 1232)
+        # Checking disabled: return signatures even for bogus data, the
+        # chain of trust is validated by dnssec_validator
+        resolver.flags = dns.flags.RD | dns.flags.CD
+    return resolver
+
+# Resolvers and answer cache shared by all tests in this process
+resolvers = ResolverManager(cache=DNSCache())
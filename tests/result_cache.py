@@ -0,0 +1,215 @@
+"""
+Result caching for Internet security tests.
+Caches category results per (suite, domain, category) with stale-while-revalidate.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .scheduler import Category, Check, run_suite
+from .scoring import TestStatus
+from .shared import TTLTracker, track_ttls
+
+logger = logging.getLogger(__name__)
+
+class ResultCache:
+    """
+    Category result cache on top of a Flask-Caching style backend
+
+    Entries are fresh for their TTL and may then be served stale for
+    `stale_ttl` more seconds while one background refresh per key runs.
+    Categories listed in `dns_categories` use the smallest TTL of the DNS
+    records they looked at (clamped to min/max), the others use their
+    entry in `category_ttls` or `default_ttl`.
+
+    Args:
+        backend: Object with get(key) and set(key, value, timeout=...)
+        default_ttl (int): Freshness window in seconds for categories without a TTL
+        category_ttls (dict): Fixed freshness window per category key
+        dns_categories (iterable): Category keys following DNS record TTLs
+        min_dns_ttl (int): Lower bound for DNS derived TTLs
+        max_dns_ttl (int): Upper bound for DNS derived TTLs
+        error_ttl (int): Freshness window for results containing errors
+        stale_ttl (int): Seconds an expired entry may still be served
+        refresh_workers (int): Background refreshes running at once
+    """
+    def __init__(self, backend, default_ttl=300, category_ttls=None, dns_categories=(),
+                 min_dns_ttl=60, max_dns_ttl=86400, error_ttl=60, stale_ttl=3600,
+                 refresh_workers=2):
+        self.backend = backend
+        self.default_ttl = default_ttl
+        self.category_ttls = dict(category_ttls or {})
+        self.dns_categories = set(dns_categories)
+        self.min_dns_ttl = min_dns_ttl
+        self.max_dns_ttl = max_dns_ttl
+        self.error_ttl = error_ttl
+        self.stale_ttl = stale_ttl
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix="cache-refresh")
+
+    def get(self, suite, domain, category):
+        """
+        Look up a cached category result
+
+        Returns:
+            tuple: (result, fresh) or None when nothing usable is cached
+        """
+        entry = self.backend.get(self._key(suite, domain, category))
+        if entry is None:
+            return None
+        return entry["result"], time.time() < entry["fresh_until"]
+
+    def set(self, suite, domain, category, result, dns_ttl=None):
+        """
+        Store a category result
+
+        Args:
+            suite (str): Suite name
+            domain (str): Domain name
+            category (str): Category key
+            result (dict): Category result
+            dns_ttl (int): Smallest TTL of the DNS answers used, if any
+        """
+        if result.get("status") == TestStatus.ERROR.value:
+            return
+
+        ttl = self.ttl_for(category, result, dns_ttl)
+        entry = {"result": result, "fresh_until": time.time() + ttl}
+        self.backend.set(self._key(suite, domain, category), entry, timeout=ttl + self.stale_ttl)
+
+    def ttl_for(self, category, result, dns_ttl=None):
+        """Freshness window in seconds for a category result"""
+        if _has_errors(result):
+            return self.error_ttl
+        if category in self.dns_categories and dns_ttl is not None:
+            return max(self.min_dns_ttl, min(self.max_dns_ttl, dns_ttl))
+        return self.category_ttls.get(category, self.default_ttl)
+
+    def refresh(self, suite, domain, category, check_source):
+        """
+        Recompute a category in the background unless a refresh is running
+
+        Args:
+            suite (str): Suite name
+            domain (str): Domain name
+            category (str): Category key
+            check_source: Category or Check to run
+        """
+        key = self._key(suite, domain, category)
+
+        # Stampede protection: one refresh per key at a time
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def run():
+            try:
+                self.compute(suite, domain, {category: check_source})
+            except Exception as e:
+                logger.error(f"Error refreshing cached {suite} result {category} for {domain}: {str(e)}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        self._executor.submit(run)
+
+    def compute(self, suite, domain, categories, max_workers=None, on_check=None, on_category=None):
+        """
+        Run categories with DNS TTL tracking and store their results
+
+        Args:
+            suite (str): Suite name
+            domain (str): Domain name
+            categories (dict): Mapping of category key to Category or Check
+            max_workers (int): Maximum number of sub-checks running concurrently
+            on_check (callable): Optional callback(category, test, result)
+            on_category (callable): Optional callback(category, result)
+
+        Returns:
+            dict: Category results
+        """
+        trackers = {}
+        tracked = {}
+        for cat_key, category in categories.items():
+            tracker = trackers[cat_key] = TTLTracker()
+            if isinstance(category, Check):
+                tracked[cat_key] = _tracked_check(category, tracker)
+            else:
+                tracked[cat_key] = Category(
+                    category.name, [_tracked_check(check, tracker) for check in category.checks]
+                )
+
+        results = run_suite(tracked, max_workers=max_workers, on_check=on_check, on_category=on_category)
+        for cat_key, result in results.items():
+            self.set(suite, domain, cat_key, result, trackers[cat_key].min_ttl)
+        return results
+
+    def _key(self, suite, domain, category):
+        return f"scan:{suite}:{domain}:{category}"
+
+def run_cached_suite(cache, suite, domain, categories, max_workers=None, on_check=None, on_category=None):
+    """
+    Run a suite's categories, reusing cached results where possible
+
+    Fresh entries are used as is. Stale entries are returned immediately
+    and refreshed in the background. Only missing categories are scanned.
+
+    Args:
+        cache (ResultCache): Result cache
+        suite (str): Suite name
+        domain (str): Domain name
+        categories (dict): Mapping of category key to Category or Check
+        max_workers (int): Maximum number of sub-checks running concurrently
+        on_check (callable): Optional callback(category, test, result)
+        on_category (callable): Optional callback(category, result)
+
+    Returns:
+        tuple: (category results in input order, dict listing the categories
+            served "fresh" and "stale" from the cache)
+    """
+    results = {}
+    served = {"fresh": [], "stale": []}
+    missing = {}
+
+    for cat_key, category in categories.items():
+        cached = cache.get(suite, domain, cat_key)
+        if cached is None:
+            missing[cat_key] = category
+            continue
+
+        result, fresh = cached
+        results[cat_key] = result
+        if fresh:
+            served["fresh"].append(cat_key)
+        else:
+            served["stale"].append(cat_key)
+            cache.refresh(suite, domain, cat_key, category)
+        if on_category:
+            on_category(cat_key, result)
+
+    if missing:
+        results.update(cache.compute(
+            suite, domain, missing,
+            max_workers=max_workers, on_check=on_check, on_category=on_category
+        ))
+
+    return {cat_key: results[cat_key] for cat_key in categories}, served
+
+def _tracked_check(check, tracker):
+    """Copy of a check that runs with TTL tracking enabled"""
+    def run():
+        with track_ttls(tracker):
+            return check.func()
+
+    return Check(check.key, run, requires=check.requires, when=check.when, skip=check.skip)
+
+def _has_errors(result):
+    """True when a category (or single check) result contains an errored test"""
+    if result.get("status") == TestStatus.ERROR.value:
+        return True
+    return any(
+        test.get("status") == TestStatus.ERROR.value
+        for test in result.get("tests", {}).values()
+    )
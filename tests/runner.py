@@ -0,0 +1,138 @@
+"""
+Scan runner for Internet security tests.
+Single entry point that dispatches a domain to the requested test suite.
+"""
+import copy
+import logging
+import queue
+import threading
+from . import website_tests, email_tests
+from .scoring import TestStatus
+from .shared import normalize_domain
+
+logger = logging.getLogger(__name__)
+
+# Test suites that can be run for a domain
+SUITES = {
+    "website": website_tests.run_website_tests,
+    "email": email_tests.run_email_tests
+}
+
+def run_scan(suite, domain, max_workers=None, on_check=None, on_category=None, cache=None,
+             history=None):
+    """
+    Run a test suite for a domain
+    
+    Args:
+        suite (str): Suite name ("website" or "email")
+        domain (str): Domain name to test
+        max_workers (int): Maximum number of sub-checks running concurrently
+        on_check (callable): Optional callback(category, test, result) per finished sub-check
+        on_category (callable): Optional callback(category, result) per finished category
+        cache (ResultCache): Optional cache of category results
+        history (HistoryStore): Optional store the results are recorded in
+        
+    Returns:
+        dict: Results of all tests
+        
+    Raises:
+        ValueError: If the suite is unknown
+    """
+    if suite not in SUITES:
+        raise ValueError(f"Unknown test suite: {suite}")
+    
+    results = SUITES[suite](
+        domain,
+        max_workers=max_workers,
+        on_check=on_check,
+        on_category=on_category,
+        cache=cache
+    )
+    if history is not None:
+        history.record(suite, results)
+    return results
+
+def run_scan_coalesced(flight, suite, domain, max_workers=None, cache=None, history=None):
+    """
+    Run a test suite for a domain, sharing the scan with concurrent callers
+    
+    Calls are keyed by (suite, normalized domain); callers arriving while an
+    identical scan is in flight wait for it instead of probing again.
+    
+    Args:
+        flight (SingleFlight): Coalescing group shared by the callers
+        suite (str): Suite name ("website" or "email")
+        domain (str): Domain name to test
+        max_workers (int): Maximum number of sub-checks running concurrently
+        cache (ResultCache): Optional cache of category results
+        history (HistoryStore): Optional store the results are recorded in
+        
+    Returns:
+        dict: Results of all tests
+    """
+    domain = normalize_domain(domain)
+    # Only the caller running the scan records it
+    result, shared = flight.do(
+        (suite, domain), lambda: run_scan(suite, domain, max_workers, cache=cache, history=history)
+    )
+    if shared:
+        logger.info(f"Shared in-flight {suite} test for domain: {domain}")
+        # Every caller gets its own copy of a shared result
+        result = copy.deepcopy(result)
+    return result
+
+def iter_scan_events(suite, domain, max_workers=None, heartbeat=15, cache=None, history=None):
+    """
+    Run a test suite in the background and yield its progress as events
+    
+    Yields ("check", ...) for every finished sub-check, ("category", ...) for
+    every finished category and a final ("done", results). While nothing
+    happens for `heartbeat` seconds, (None, None) is yielded so callers can
+    keep idle connections alive.
+    
+    Args:
+        suite (str): Suite name ("website" or "email")
+        domain (str): Domain name to test
+        max_workers (int): Maximum number of sub-checks running concurrently
+        heartbeat (int): Seconds between keep-alive events
+        cache (ResultCache): Optional cache of category results
+        history (HistoryStore): Optional store the results are recorded in
+        
+    Yields:
+        tuple: (event name, event data)
+    """
+    events = queue.Queue()
+    
+    def on_check(category, test, result):
+        events.put(("check", {"category": category, "test": test, "result": result}))
+    
+    def on_category(category, result):
+        events.put(("category", {"category": category, "result": result}))
+    
+    def scan():
+        try:
+            results = run_scan(
+                suite,
+                domain,
+                max_workers,
+                on_check=on_check,
+                on_category=on_category,
+                cache=cache,
+                history=history
+            )
+        except Exception as e:
+            logger.error(f"Error in streamed {suite} test for {domain}: {str(e)}")
+            results = {"domain": domain, "status": TestStatus.ERROR.value, "error": str(e)}
+        events.put(("done", results))
+    
+    threading.Thread(target=scan, name=f"scan-stream-{domain}", daemon=True).start()
+    
+    while True:
+        try:
+            event, data = events.get(timeout=heartbeat)
+        except queue.Empty:
+            yield None, None
+            continue
+        yield event, data
+        if event == "done":
+            return
@@ -0,0 +1,276 @@
+"""
+Dependency-aware check scheduler for Internet security tests.
+Runs every sub-check as a node in a DAG so independent probes overlap.
+"""
+import asyncio
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from .scoring import TestStatus
+
+logger = logging.getLogger(__name__)
+
+# Default cap on concurrently running sub-checks
+DEFAULT_MAX_WORKERS = 8
+
+class Check:
+    """
+    A single sub-check and its prerequisites
+
+    Args:
+        key (str): Key of the result inside its category's "tests" dict
+        func (callable): Zero-argument callable returning a test result dict
+        requires (tuple): Keys of checks in the same category that must finish first
+        when (callable): Optional predicate receiving the required results;
+            if it returns False the check is not run and `skip` is used instead
+        skip (dict): Result to record when `when` returns False
+        afunc (callable): Optional zero-argument coroutine function used by
+            the async runner instead of running `func` in a thread
+    """
+    def __init__(self, key, func, requires=(), when=None, skip=None, afunc=None):
+        self.key = key
+        self.func = func
+        self.requires = tuple(requires)
+        self.when = when
+        self.skip = skip
+        self.afunc = afunc
+
+class Category:
+    """
+    A named group of checks whose results are combined into one category dict
+
+    Args:
+        name (str): Display name of the category
+        checks (list): List of Check objects
+    """
+    def __init__(self, name, checks):
+        self.name = name
+        self.checks = list(checks)
+
+def run_category(name, checks, max_workers=None):
+    """
+    Run the checks of a single category
+
+    Args:
+        name (str): Display name of the category
+        checks (list): List of Check objects
+        max_workers (int): Maximum number of checks running at once
+
+    Returns:
+        dict: Category results
+    """
+    results = run_suite({"category": Category(name, checks)}, max_workers=max_workers)
+    return results["category"]
+
+async def run_category_async(name, checks, max_concurrency=None):
+    """
+    Run the checks of a single category on the running event loop
+
+    Args:
+        name (str): Display name of the category
+        checks (list): List of Check objects
+        max_concurrency (int): Maximum number of checks running at once
+
+    Returns:
+        dict: Category results
+    """
+    results = await run_suite_async(
+        {"category": Category(name, checks)}, max_concurrency=max_concurrency
+    )
+    return results["category"]
+
+def run_suite(categories, max_workers=None, on_check=None, on_category=None):
+    """
+    Run the checks of several categories as one dependency graph
+
+    Args:
+        categories (dict): Mapping of category key to a Category, or to a
+            single Check whose result is used as the category result
+        max_workers (int): Maximum number of checks running at once
+        on_check (callable): Optional callback(category_key, check_key, result)
+        on_category (callable): Optional callback(category_key, result)
+
+    Returns:
+        dict: Mapping of category key to category results, in input order
+    """
+    graph = _Graph(categories, on_check, on_category)
+
+    with ThreadPoolExecutor(max_workers=max_workers or DEFAULT_MAX_WORKERS) as executor:
+        running = {}
+        while True:
+            for node_id, check in graph.take_runnable():
+                ctx = contextvars.copy_context()
+                running[executor.submit(ctx.run, check.func)] = node_id
+
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                node_id = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    graph.fail(node_id, e)
+                    continue
+                graph.complete(node_id, result)
+
+    return graph.results()
+
+async def run_suite_async(categories, max_concurrency=None, on_check=None, on_category=None):
+    """
+    Run the checks of several categories as one dependency graph on the
+    running event loop
+
+    Checks with an `afunc` are awaited directly; the others run in the
+    loop's default executor.
+
+    Args:
+        categories (dict): Mapping of category key to a Category or Check
+        max_concurrency (int): Maximum number of checks running at once
+        on_check (callable): Optional callback(category_key, check_key, result)
+        on_category (callable): Optional callback(category_key, result)
+
+    Returns:
+        dict: Mapping of category key to category results, in input order
+    """
+    graph = _Graph(categories, on_check, on_category)
+    semaphore = asyncio.Semaphore(max_concurrency or DEFAULT_MAX_WORKERS)
+    loop = asyncio.get_running_loop()
+
+    async def execute(check):
+        async with semaphore:
+            if check.afunc is not None:
+                return await check.afunc()
+            ctx = contextvars.copy_context()
+            return await loop.run_in_executor(None, ctx.run, check.func)
+
+    running = {}
+    try:
+        while True:
+            for node_id, check in graph.take_runnable():
+                running[asyncio.ensure_future(execute(check))] = node_id
+
+            if not running:
+                break
+
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                node_id = running.pop(task)
+                try:
+                    result = task.result()
+                except Exception as e:
+                    graph.fail(node_id, e)
+                    continue
+                graph.complete(node_id, result)
+    finally:
+        # A failing category or a cancelled caller leaves checks behind
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+
+    return graph.results()
+
+class _Graph:
+    """Bookkeeping shared by the thread and asyncio runners"""
+
+    def __init__(self, categories, on_check=None, on_category=None):
+        self.categories = categories
+        self.on_check = on_check
+        self.on_category = on_category
+        self.nodes = {}
+        self.dependents = {}
+        self.remaining = {}
+        self.tests = {cat_key: {} for cat_key in categories}
+        self.outstanding = {cat_key: 0 for cat_key in categories}
+        self.errors = {}
+        self.finished = {}
+
+        for cat_key, category in categories.items():
+            for check in _checks_of(category):
+                node_id = (cat_key, check.key)
+                self.nodes[node_id] = check
+                self.remaining[node_id] = len(check.requires)
+                self.outstanding[cat_key] += 1
+                for dep in check.requires:
+                    self.dependents.setdefault((cat_key, dep), []).append(node_id)
+
+        self.ready = [node_id for node_id, count in self.remaining.items() if count == 0]
+
+    def take_runnable(self):
+        """Resolve skipped checks and return the checks that must be executed"""
+        runnable = []
+        while self.ready:
+            node_id = self.ready.pop(0)
+            check = self.nodes[node_id]
+            cat_key = node_id[0]
+            if cat_key in self.errors:
+                self.complete(node_id, None)
+                continue
+            if check.when is not None:
+                required = {dep: self.tests[cat_key][dep] for dep in check.requires}
+                if not check.when(required):
+                    self.complete(node_id, check.skip)
+                    continue
+            runnable.append((node_id, check))
+        return runnable
+
+    def fail(self, node_id, error):
+        """Record a check that raised; the whole category is marked as errored"""
+        logger.error(f"Error in check {node_id[0]}.{node_id[1]}: {str(error)}")
+        self.errors[node_id[0]] = str(error)
+        self.complete(node_id, None)
+
+    def complete(self, node_id, result):
+        """Store a check result and release the checks depending on it"""
+        cat_key, check_key = node_id
+        self.tests[cat_key][check_key] = result
+        if self.on_check and result is not None:
+            self.on_check(cat_key, check_key, result)
+        for dependent in self.dependents.get(node_id, []):
+            self.remaining[dependent] -= 1
+            if self.remaining[dependent] == 0:
+                self.ready.append(dependent)
+        self.outstanding[cat_key] -= 1
+        if self.outstanding[cat_key] == 0:
+            self.finished[cat_key] = _finalize(
+                self.categories[cat_key], self.tests[cat_key], self.errors.get(cat_key)
+            )
+            if self.on_category:
+                self.on_category(cat_key, self.finished[cat_key])
+
+    def results(self):
+        """Category results in input order"""
+        return {cat_key: self.finished[cat_key] for cat_key in self.categories}
+
+def _checks_of(category):
+    """Checks belonging to a Category, or the Check itself"""
+    return [category] if isinstance(category, Check) else category.checks
+
+def _finalize(category, tests, error):
+    """Combine the check results of one category into its result dict"""
+    if isinstance(category, Check):
+        if error:
+            raise RuntimeError(error)
+        return tests[category.key]
+
+    results = {
+        "name": category.name,
+        "status": TestStatus.RUNNING.value,
+        "tests": {},
+        "score": None
+    }
+
+    if error:
+        results["status"] = TestStatus.ERROR.value
+        results["error"] = error
+        return results
+
+    # Keep the declaration order of the checks
+    for check in category.checks:
+        results["tests"][check.key] = tests[check.key]
+
+    score_sum = sum(test["score"] for test in results["tests"].values())
+    results["score"] = score_sum / len(results["tests"])
+    results["status"] = TestStatus.DONE.value
+    return results
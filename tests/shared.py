@@ -2,15 +2,51 @@
 Shared utility functions for Internet security tests.
 Replaces Django-specific utility functions.
 """
+import contextvars
 import logging
 import socket
+import threading
+import time
+from contextlib import contextmanager
 import dns.resolver
 import dns.exception
 from dns.resolver import NXDOMAIN, NoAnswer, NoNameservers
 from .scoring import Score
+from .resolver import resolvers
+from .context import memoize
 
 logger = logging.getLogger(__name__)
 
+# TTL tracker of the check running in the current context, if any
+_ttl_tracker = contextvars.ContextVar('ttl_tracker', default=None)
+
+class TTLTracker:
+    """Records the smallest TTL among the DNS answers used by a check"""
+    
+    def __init__(self):
+        self.min_ttl = None
+        self._lock = threading.Lock()
+    
+    def observe(self, ttl):
+        """Record the TTL of an answer"""
+        with self._lock:
+            if self.min_ttl is None or ttl < self.min_ttl:
+                self.min_ttl = ttl
+
+@contextmanager
+def track_ttls(tracker):
+    """
+    Report the TTLs of DNS answers resolved in this context to `tracker`
+    
+    Args:
+        tracker (TTLTracker): Tracker receiving the TTLs
+    """
+    token = _ttl_tracker.set(tracker)
+    try:
+        yield tracker
+    finally:
+        _ttl_tracker.reset(token)
+
 def dns_lookup(domain, record_type='A', timeout=5, nameservers=None):
     """
     Perform a DNS lookup for a specific record type
@@ -30,27 +66,8 @@ def dns_lookup(domain, record_type='A', timeout=5, nameservers=None):
         Exception: For other errors
     """
     try:
-        resolver = dns.resolver.Resolver()
-        resolver.timeout = timeout
-        resolver.lifetime = timeout
-        
-        if nameservers:
-            resolver.nameservers = nameservers
-        
-        answer = resolver.resolve(domain, record_type)
-        results = []
-        
-        for rdata in answer:
-            if record_type in ('A', 'AAAA'):
-                results.append(str(rdata.address))
-            elif record_type == 'MX':
-                results.append(str(rdata.exchange))
-            elif record_type == 'TXT':
-                results.append(str(rdata.strings[0].decode('utf-8')))
-            else:
-                results.append(str(rdata))
-                
-        return results
+        answer = resolve(domain, record_type, timeout=timeout, nameservers=nameservers)
+        return format_answer(answer, record_type)
     
     except (NXDOMAIN, NoAnswer, NoNameservers) as e:
         logger.debug(f"DNS lookup failed for {domain} ({record_type}): {str(e)}")
@@ -59,6 +76,83 @@ def dns_lookup(domain, record_type='A', timeout=5, nameservers=None):
         logger.error(f"Error in DNS lookup for {domain} ({record_type}): {str(e)}")
         raise
 
+def resolve(domain, record_type='A', timeout=5, nameservers=None, use_dnssec=False):
+    """
+    Resolve a DNS record with a shared resolver and return the raw answer
+    
+    Args:
+        domain (str): Domain name to query
+        record_type (str): DNS record type
+        timeout (int): Timeout in seconds
+        nameservers (list): Optional list of nameservers to use
+        use_dnssec (bool): Set the DO bit on the query
+        
+    Returns:
+        dns.resolver.Answer: DNS answer
+    """
+    answer = memoize(
+        dns_key(domain, record_type, nameservers, use_dnssec),
+        lambda: resolvers.resolve(
+            domain, record_type, timeout=timeout, nameservers=nameservers, use_dnssec=use_dnssec
+        )
+    )
+    observe_ttl(answer)
+    return answer
+
+def dns_key(domain, record_type, nameservers=None, use_dnssec=False):
+    """Scan context key of a DNS lookup"""
+    return ("dns", domain.lower().rstrip('.'), record_type, tuple(nameservers or ()), bool(use_dnssec))
+
+def observe_ttl(answer):
+    """Report the TTL of an answer to the TTL tracker of the current context"""
+    tracker = _ttl_tracker.get()
+    if tracker is not None and answer.rrset is not None:
+        # Cached answers only have their remaining TTL left
+        tracker.observe(max(0, int(answer.expiration - time.time())))
+
+def format_answer(answer, record_type):
+    """
+    Convert a DNS answer into a list of record values
+    
+    Args:
+        answer (dns.resolver.Answer): Answer returned by a resolver
+        record_type (str): DNS record type that was queried
+        
+    Returns:
+        list: List of record values
+    """
+    results = []
+    
+    for rdata in answer:
+        if record_type in ('A', 'AAAA'):
+            results.append(str(rdata.address))
+        elif record_type == 'MX':
+            results.append(str(rdata.exchange))
+        elif record_type == 'TXT':
+            results.append(str(rdata.strings[0].decode('utf-8')))
+        else:
+            results.append(str(rdata))
+            
+    return results
+
+def normalize_domain(domain):
+    """
+    Normalize user input to a bare, lowercase domain name
+    
+    Strips whitespace, a URL scheme, any path or port and the trailing dot.
+    
+    Args:
+        domain (str): Domain name or URL
+        
+    Returns:
+        str: Normalized domain name (empty string if nothing is left)
+    """
+    domain = domain.strip().lower()
+    if '://' in domain:
+        domain = domain.split('://', 1)[1]
+    domain = domain.split('/', 1)[0].split(':', 1)[0]
+    return domain.rstrip('.')
+
 def is_domain_valid(domain):
     """
     Check if a domain is valid
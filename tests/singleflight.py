@@ -0,0 +1,204 @@
+"""
+Request coalescing for Internet security tests.
+Concurrent callers asking for the same key share one in-flight call.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: cross-worker coalescing is unavailable
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+class _Call:
+    """An in-flight call and the outcome its waiters will share"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key into a single execution
+
+    Within one process, callers arriving while a call for their key is
+    running wait for it and receive its result. When `lock_dir` is set,
+    worker processes sharing that directory coalesce as well: one worker
+    runs the call while the others block on a lock file and then read the
+    JSON result it wrote, so results must be JSON serializable.
+
+    Args:
+        lock_dir (str): Optional directory for cross-process lock and result files
+        result_max_age (int): Seconds cross-process result files are kept
+    """
+    def __init__(self, lock_dir=None, result_max_age=300):
+        if lock_dir and fcntl is None:
+            logger.warning("Cross-worker coalescing needs fcntl; using in-process coalescing only")
+            lock_dir = None
+        if lock_dir:
+            os.makedirs(lock_dir, exist_ok=True)
+        self.lock_dir = lock_dir
+        self.result_max_age = result_max_age
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._last_cleanup = 0
+
+    def do(self, key, fn):
+        """
+        Run `fn` unless a call for `key` is already in flight
+
+        Args:
+            key (hashable): Identity of the call
+            fn (callable): Zero-argument callable producing the result
+
+        Returns:
+            tuple: (result, shared) where shared is True if the result came
+                from a call started by another caller
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        shared = False
+        try:
+            if self.lock_dir:
+                call.result, shared = self._do_across_workers(key, fn)
+            else:
+                call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        return call.result, shared
+
+    def in_flight(self):
+        """Number of keys currently being computed in this process"""
+        with self._lock:
+            return len(self._calls)
+
+    def _do_across_workers(self, key, fn):
+        """Coalesce with other processes through a lock file per key"""
+        name = hashlib.sha256(repr(key).encode('utf-8')).hexdigest()
+        lock_path = os.path.join(self.lock_dir, f"{name}.lock")
+        result_path = os.path.join(self.lock_dir, f"{name}.json")
+        started = time.time()
+
+        lock_file, waited = self._acquire_lock_file(lock_path)
+        with lock_file:
+            if waited:
+                # Another worker ran this call while we waited for it to finish
+                result = self._read_result(result_path, started)
+                if result is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                    return result, True
+                # The other worker failed; run the call while holding the lock
+
+            try:
+                result = fn()
+                self._write_result(result_path, result)
+                return result, False
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+                self._cleanup()
+
+    def _acquire_lock_file(self, path):
+        """
+        Open and lock a key's lock file
+
+        _cleanup() may remove the file between our open() and flock(), so
+        the lock only counts if the path still names the locked file.
+
+        Args:
+            path (str): Lock file path
+
+        Returns:
+            tuple: (locked file object, True if another worker held the lock first)
+        """
+        waited = False
+        while True:
+            lock_file = open(path, 'a+')
+            try:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    waited = True
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                if os.path.samestat(os.fstat(lock_file.fileno()), os.stat(path)):
+                    return lock_file, waited
+            except FileNotFoundError:
+                pass
+            except BaseException:
+                lock_file.close()
+                raise
+            lock_file.close()
+
+    def _read_result(self, path, newer_than):
+        """Load a result written after `newer_than`, or None"""
+        try:
+            if os.path.getmtime(path) < newer_than:
+                return None
+            with open(path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_result(self, path, result):
+        """Atomically publish a result for waiting workers"""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(result, f)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"Could not share coalesced result: {str(e)}")
+
+    def _cleanup(self):
+        """Remove old result and idle lock files, at most once a minute"""
+        now = time.time()
+        if now - self._last_cleanup < 60:
+            return
+        self._last_cleanup = now
+        try:
+            entries = list(os.scandir(self.lock_dir))
+        except OSError:
+            return
+        for entry in entries:
+            try:
+                if now - entry.stat().st_mtime <= self.result_max_age:
+                    continue
+                if entry.name.endswith('.json'):
+                    os.remove(entry.path)
+                elif entry.name.endswith('.lock'):
+                    self._remove_lock_file(entry.path)
+            except OSError:
+                pass
+
+    def _remove_lock_file(self, path):
+        """Remove a lock file unless a worker holds it"""
+        with open(path, 'r') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+            # Workers that opened the file before this check it and reopen
+            os.remove(path)
@@ -6,6 +6,9 @@ import logging
 import re
 from .shared import create_test_result, dns_lookup
 from .scoring import Score, TestStatus
+from .scheduler import Check, run_category
+from .spf_tree import build_spf_tree, build_spf_tree_async, spf_tree_errors
+from . import aio
 
 logger = logging.getLogger(__name__)
 
@@ -21,42 +24,38 @@ def test_spf(domain):
     """
     logger.info(f"Testing SPF for domain: {domain}")
     
-    results = {
-        "name": "SPF",
-        "status": TestStatus.RUNNING.value,
-        "tests": {},
-        "score": None
-    }
+    return run_category("SPF", get_checks(domain))
+
+def get_checks(domain):
+    """
+    Build the SPF checks and their dependencies
     
-    try:
-        # Test for SPF record
-        record_test = test_spf_record(domain)
-        results["tests"]["spf_record"] = record_test
+    Args:
+        domain (str): Domain name to test
         
-        if record_test["score"] > 0:
-            # Test SPF syntax
-            syntax_test = test_spf_syntax(domain)
-            results["tests"]["syntax"] = syntax_test
-        else:
-            # Skip syntax test if no SPF record
-            results["tests"]["syntax"] = create_test_result(
+    Returns:
+        list: List of Check objects
+    """
+    return [
+        Check(
+            "spf_record",
+            lambda: test_spf_record(domain),
+            afunc=lambda: test_spf_record_async(domain)
+        ),
+        Check(
+            "syntax",
+            lambda: test_spf_syntax(domain),
+            afunc=lambda: test_spf_syntax_async(domain),
+            requires=("spf_record",),
+            when=lambda deps: deps["spf_record"]["score"] > 0,
+            skip=create_test_result(
                 "SPF Syntax",
                 "skipped",
                 Score.FAILED,
                 {"reason": "No SPF record found"}
             )
-        
-        # Calculate overall score
-        score_sum = sum(test["score"] for test in results["tests"].values())
-        results["score"] = score_sum / len(results["tests"])
-        results["status"] = TestStatus.DONE.value
-        
-    except Exception as e:
-        logger.error(f"Error in SPF test for {domain}: {str(e)}")
-        results["status"] = TestStatus.ERROR.value
-        results["error"] = str(e)
-    
-    return results
+        )
+    ]
 
 def test_spf_record(domain):
     """
@@ -69,32 +68,7 @@ def test_spf_record(domain):
         dict: Test result
     """
     try:
-        txt_records = dns_lookup(domain, 'TXT')
-        
-        spf_records = [record for record in txt_records if record.startswith('v=spf1')]
-        
-        if spf_records:
-            if len(spf_records) > 1:
-                return create_test_result(
-                    "SPF Record",
-                    "done",
-                    Score.WARNING,
-                    {"records": spf_records, "note": "Multiple SPF records found"}
-                )
-            else:
-                return create_test_result(
-                    "SPF Record",
-                    "done",
-                    Score.GOOD,
-                    {"record": spf_records[0]}
-                )
-        else:
-            return create_test_result(
-                "SPF Record",
-                "done",
-                Score.FAILED,
-                {"records": []}
-            )
+        return _spf_record_result(dns_lookup(domain, 'TXT'))
     except Exception as e:
         return create_test_result(
             "SPF Record",
@@ -103,9 +77,9 @@ def test_spf_record(domain):
             {"error": str(e)}
         )
 
-def test_spf_syntax(domain):
+async def test_spf_record_async(domain):
     """
-    Test SPF syntax for a domain
+    Test if a domain has an SPF record without blocking
     
     Args:
         domain (str): Domain name to test
@@ -114,63 +88,60 @@ def test_spf_syntax(domain):
         dict: Test result
     """
     try:
-        txt_records = dns_lookup(domain, 'TXT')
-        
-        spf_records = [record for record in txt_records if record.startswith('v=spf1')]
-        
-        if not spf_records:
-            return create_test_result(
-                "SPF Syntax",
-                "skipped",
-                Score.FAILED,
-                {"reason": "No SPF record found"}
-            )
-        
-        # Use the first SPF record
-        spf_record = spf_records[0]
-        
-        # Check for common syntax errors
-        errors = []
-        
-        # Check for missing all mechanism
-        if not re.search(r'\s(?:[-~+?])?all\b', spf_record):
-            errors.append("Missing 'all' mechanism")
-        
-        # Check for too many DNS lookups (max 10 allowed)
-        lookups = 0
-        for mechanism in re.finditer(r'\b(?:include|exists|a|mx):[^\s]+', spf_record):
-            lookups += 1
-        
-        if lookups > 10:
-            errors.append(f"Too many DNS lookups ({lookups}), maximum is 10")
-        
-        # Check for nested includes (can cause issues)
-        if 'include:' in spf_record:
-            for include_match in re.finditer(r'include:([^\s]+)', spf_record):
-                included_domain = include_match.group(1)
-                try:
-                    included_txt = dns_lookup(included_domain, 'TXT')
-                    for record in included_txt:
-                        if 'include:' in record:
-                            errors.append(f"Nested includes detected: {included_domain}")
-                            break
-                except:
-                    errors.append(f"Cannot resolve included domain: {included_domain}")
-        
-        if errors:
+        return _spf_record_result(await aio.dns_lookup(domain, 'TXT'))
+    except Exception as e:
+        return create_test_result(
+            "SPF Record",
+            "error",
+            Score.FAILED,
+            {"error": str(e)}
+        )
+
+def _spf_record_result(txt_records):
+    """Score the SPF records found among a domain's TXT records"""
+    spf_records = [record for record in txt_records if record.startswith('v=spf1')]
+    
+    if spf_records:
+        if len(spf_records) > 1:
             return create_test_result(
-                "SPF Syntax",
+                "SPF Record",
                 "done",
                 Score.WARNING,
-                {"record": spf_record, "errors": errors}
+                {"records": spf_records, "note": "Multiple SPF records found"}
             )
         else:
             return create_test_result(
-                "SPF Syntax",
+                "SPF Record",
                 "done",
                 Score.GOOD,
-                {"record": spf_record, "valid": True}
+                {"record": spf_records[0]}
             )
+    else:
+        return create_test_result(
+            "SPF Record",
+            "done",
+            Score.FAILED,
+            {"records": []}
+        )
+
+def test_spf_syntax(domain):
+    """
+    Test SPF syntax for a domain
+    
+    The record is resolved recursively, so the RFC 7208 lookup limits are
+    checked for the whole include chain.
+    
+    Args:
+        domain (str): Domain name to test
+        
+    Returns:
+        dict: Test result
+    """
+    try:
+        tree = build_spf_tree(domain)
+        if tree.record is None:
+            return _no_spf_record_result()
+        return _spf_syntax_result(tree, _spf_syntax_errors(tree.record) + spf_tree_errors(tree))
     except Exception as e:
         return create_test_result(
             "SPF Syntax",
@@ -178,3 +149,68 @@ def test_spf_syntax(domain):
             Score.FAILED,
             {"error": str(e)}
         )
+
+async def test_spf_syntax_async(domain):
+    """
+    Test SPF syntax for a domain without blocking
+    
+    Args:
+        domain (str): Domain name to test
+        
+    Returns:
+        dict: Test result
+    """
+    try:
+        tree = await build_spf_tree_async(domain)
+        if tree.record is None:
+            return _no_spf_record_result()
+        return _spf_syntax_result(tree, _spf_syntax_errors(tree.record) + spf_tree_errors(tree))
+    except Exception as e:
+        return create_test_result(
+            "SPF Syntax",
+            "error",
+            Score.FAILED,
+            {"error": str(e)}
+        )
+
+def _no_spf_record_result():
+    """Result for a syntax check on a domain without SPF record"""
+    return create_test_result(
+        "SPF Syntax",
+        "skipped",
+        Score.FAILED,
+        {"reason": "No SPF record found"}
+    )
+
+def _spf_syntax_errors(spf_record):
+    """Check an SPF record for common syntax errors"""
+    errors = []
+    
+    # Check for missing all mechanism
+    if not re.search(r'\s(?:[-~+?])?all\b', spf_record) and 'redirect=' not in spf_record:
+        errors.append("Missing 'all' mechanism")
+    
+    return errors
+
+def _spf_syntax_result(tree, errors):
+    """Score a resolved SPF tree given the errors found"""
+    details = {
+        "record": tree.record,
+        "lookups": tree.lookups,
+        "void_lookups": tree.void_lookups,
+        "tree": tree.to_dict()
+    }
+    if errors:
+        return create_test_result(
+            "SPF Syntax",
+            "done",
+            Score.WARNING,
+            {**details, "errors": errors}
+        )
+    else:
+        return create_test_result(
+            "SPF Syntax",
+            "done",
+            Score.GOOD,
+            {**details, "valid": True}
+        )
@@ -0,0 +1,390 @@
+"""
+Compiled SPF policies for Internet security tests.
+Answers check_host() (RFC 7208) for many IP addresses from one resolved SPF tree.
+"""
+import bisect
+import ipaddress
+import logging
+import socket
+from collections import namedtuple
+from .spf_tree import MAX_DNS_LOOKUPS, MAX_VOID_LOOKUPS, build_spf_tree, build_spf_tree_async
+
+logger = logging.getLogger(__name__)
+
+# Result of a qualifier (RFC 7208 section 4.6.2)
+QUALIFIER_RESULTS = {'+': 'pass', '-': 'fail', '~': 'softfail', '?': 'neutral'}
+
+# Results of an included policy that make include propagate an error
+ERROR_RESULTS = ('permerror', 'temperror', 'unknown')
+
+# Size of the IPv4 and IPv6 address spaces
+ADDRESS_BITS = {4: 32, 6: 128}
+
+# First 96 bits of an IPv4-mapped IPv6 address (::ffff:0:0/96)
+IPV4_MAPPED_PREFIX = bytes(10) + b'\xff\xff'
+
+SPFResult = namedtuple('SPFResult', ['result', 'mechanism', 'domain'])
+SPFResult.__doc__ = """
+Outcome of check_host() for one address
+
+Attributes:
+    result (str): pass, fail, softfail, neutral, none, permerror or
+        temperror, or "unknown" when the address reaches a term that
+        depends on the message (ptr, macros) or was left unresolved by the
+        lookup limit, and cannot be decided
+    mechanism (str): Term that decided the result, None for the default
+    domain (str): Domain whose record holds that term
+"""
+
+class SPFPolicy:
+    """
+    Immutable, precompiled SPF policy of a domain
+
+    The resolved SPF tree is flattened once into disjoint, sorted address
+    intervals per IP version, each carrying the result of the first term
+    that matches it (include and redirect targets are compiled into their
+    parent). check_host() then is a binary search in O(log n).
+
+    Terms that depend on the message (ptr, macros in a target) cannot be
+    compiled; addresses that reach one of them get the result "unknown".
+    The DNS lookup limit applies during evaluation as in RFC 7208: only
+    addresses whose evaluation makes more than MAX_DNS_LOOKUPS lookups get
+    permerror, those matched earlier keep their result. Trees exceeding
+    the void lookup limit evaluate to permerror for every address.
+
+    Args:
+        tree (SPFNode): Resolved SPF tree, see build_spf_tree
+    """
+    def __init__(self, tree):
+        self.domain = tree.domain
+        self.record = tree.record
+        self.lookups = tree.lookups
+        self.void_lookups = tree.void_lookups
+        self.unevaluated = []
+
+        if tree.void_lookups > MAX_VOID_LOOKUPS:
+            fault = SPFResult('permerror', None, tree.domain)
+            self._index = {version: _whole_space(version, fault) for version in ADDRESS_BITS}
+        else:
+            memo = {}
+            self._index = {
+                version: _limit(_compile(tree, version, memo, self.unevaluated), tree.domain)
+                for version in ADDRESS_BITS
+            }
+        # Columns for bisect
+        self._starts = {version: [start for start, _, _ in segments] for version, segments in self._index.items()}
+
+    def check_host(self, ip):
+        """
+        Evaluate the policy for one sender address
+
+        Args:
+            ip (str): IPv4 or IPv6 address (an ipaddress object works too)
+
+        Returns:
+            SPFResult: Result with the deciding term
+
+        Raises:
+            ValueError: If `ip` is not an IP address
+        """
+        version, value = _address(ip)
+        index = bisect.bisect_right(self._starts[version], value) - 1
+        return self._index[version][index][2]
+
+    def check_hosts(self, ips):
+        """
+        Evaluate the policy for many sender addresses in one call
+
+        Args:
+            ips (iterable): IPv4 or IPv6 addresses
+
+        Returns:
+            list: SPFResult per address, in input order
+
+        Raises:
+            ValueError: If an entry is not an IP address
+        """
+        starts = self._starts
+        index = self._index
+        bisect_right = bisect.bisect_right
+        results = []
+        for ip in ips:
+            version, value = _address(ip)
+            results.append(index[version][bisect_right(starts[version], value) - 1][2])
+        return results
+
+    def intervals(self, version=4):
+        """
+        Compiled address ranges and their results
+
+        Args:
+            version (int): IP version, 4 or 6
+
+        Returns:
+            list: (first address, last address, SPFResult) tuples, in order
+        """
+        factory = ipaddress.IPv4Address if version == 4 else ipaddress.IPv6Address
+        return [(str(factory(start)), str(factory(end)), result) for start, end, result in self._index[version]]
+
+    def __len__(self):
+        """Number of compiled intervals over both IP versions"""
+        return sum(len(segments) for segments in self._index.values())
+
+def compile_spf_policy(domain):
+    """
+    Resolve and compile the SPF policy of a domain
+
+    Args:
+        domain (str): Domain name
+
+    Returns:
+        SPFPolicy: Compiled policy
+    """
+    return SPFPolicy(build_spf_tree(domain))
+
+async def compile_spf_policy_async(domain):
+    """
+    Resolve and compile the SPF policy of a domain without blocking
+
+    Args:
+        domain (str): Domain name
+
+    Returns:
+        SPFPolicy: Compiled policy
+    """
+    return SPFPolicy(await build_spf_tree_async(domain))
+
+def _compile(node, version, memo, unevaluated):
+    """
+    Evaluate a subtree for the whole address space
+
+    Terms are applied in record order to the addresses no earlier term
+    decided, counting the DNS lookups the evaluation of each address makes
+    (RFC 7208 section 4.6.4). The counts are relative to the start of the
+    record, so shared subtrees are compiled once.
+
+    Returns:
+        list: Sorted (first, last, result, lookups) segments covering the space
+    """
+    key = (id(node), version)
+    if key in memo:
+        return memo[key]
+
+    if node.record is None:
+        result = 'temperror' if node.fault else 'none'
+        memo[key] = segments = _whole_space(version, SPFResult(result, None, node.domain), 0)
+        return segments
+    if node.fault:
+        memo[key] = segments = _whole_space(version, SPFResult(node.fault, None, node.domain), 0)
+        return segments
+
+    undecided = [(0, (1 << ADDRESS_BITS[version]) - 1, 0)]
+    decided = []
+    redirect = None
+    for term in node.terms:
+        if term.mechanism == 'redirect' and not term.ignored:
+            redirect = term
+            continue
+        if term.is_modifier or term.ignored or not undecided:
+            continue
+        try:
+            outcome = _term_outcome(node, term, version, memo, unevaluated)
+        except ValueError:
+            # An invalid ip4/ip6 network is a syntax error of the record
+            memo[key] = segments = _whole_space(version, SPFResult('permerror', str(term), node.domain), 0)
+            return segments
+        undecided = _apply(undecided, outcome, decided)
+
+    # No mechanism matched: redirect, or the neutral default
+    if undecided:
+        if redirect is not None:
+            outcome = _redirect_outcome(node, redirect, version, memo, unevaluated)
+        else:
+            outcome = _whole_space(version, SPFResult('neutral', None, node.domain), 0)
+        _apply(undecided, outcome, decided)
+
+    decided.sort(key=lambda segment: segment[0])
+    memo[key] = segments = _merge(decided)
+    return segments
+
+def _term_outcome(node, term, version, memo, unevaluated):
+    """
+    What one mechanism does to every address
+
+    Returns:
+        list: Sorted (first, last, result or None, lookups) segments covering
+            the space, None where evaluation moves on to the next term
+    """
+    lookups = 1 if term.counts_lookup else 0
+    qualified = SPFResult(QUALIFIER_RESULTS[term.qualifier], str(term), node.domain)
+
+    if term.fault:
+        return _whole_space(version, SPFResult(term.fault, str(term), node.domain), lookups)
+    if term.over_limit:
+        # Addresses reaching it after the full count are over the limit; those
+        # skipping lookups in an include that ended early can't be decided
+        return _whole_space(version, SPFResult('unknown', str(term), node.domain), lookups)
+    if term.unevaluated:
+        if version == 4:
+            unevaluated.append(f"{node.domain}: {term}")
+        return _whole_space(version, SPFResult('unknown', str(term), node.domain), lookups)
+
+    if term.mechanism == 'all':
+        return _whole_space(version, qualified, lookups)
+    if term.mechanism in ('ip4', 'ip6'):
+        network = ipaddress.ip_network(term.value, strict=False)
+        if term.mechanism != f"ip{network.version}":
+            raise ValueError(f"{term} is not an IPv{term.mechanism[-1]} network")
+        if network.version != version:
+            return _whole_space(version, None, lookups)
+        return _matching(version, [(int(network.network_address), int(network.broadcast_address))],
+                         qualified, lookups)
+    if term.mechanism == 'exists':
+        # Without macros exists does not depend on the sender address
+        return _whole_space(version, qualified if term.addresses else None, lookups)
+    if term.mechanism in ('a', 'mx'):
+        prefix = term.cidr4 if version == 4 else term.cidr6
+        ranges = []
+        for address in term.addresses or []:
+            ip = ipaddress.ip_address(address)
+            if ip.version != version:
+                continue
+            network = ipaddress.ip_network(f"{ip}/{prefix if prefix is not None else ADDRESS_BITS[version]}", strict=False)
+            ranges.append((int(network.network_address), int(network.broadcast_address)))
+        return _matching(version, ranges, qualified, lookups)
+    if term.mechanism == 'include':
+        if term.child is None:
+            return _whole_space(version, None, lookups)
+        # include matches where the target passes; errors propagate
+        outcome = []
+        for first, end, result, used in _compile(term.child, version, memo, unevaluated):
+            if result.result == 'pass':
+                result = qualified
+            elif result.result == 'none':
+                result = SPFResult('permerror', str(term), node.domain)
+            elif result.result not in ERROR_RESULTS:
+                result = None
+            outcome.append((first, end, result, lookups + used))
+        return outcome
+    return _whole_space(version, None, lookups)
+
+def _redirect_outcome(node, term, version, memo, unevaluated):
+    """Result of the redirect target for every address"""
+    if term.fault:
+        return _whole_space(version, SPFResult(term.fault, str(term), node.domain), 1)
+    if term.over_limit:
+        return _whole_space(version, SPFResult('unknown', str(term), node.domain), 1)
+    if term.unevaluated:
+        if version == 4:
+            unevaluated.append(f"{node.domain}: {term}")
+        return _whole_space(version, SPFResult('unknown', str(term), node.domain), 1)
+    if term.child is None:
+        return _whole_space(version, SPFResult('neutral', None, node.domain), 1)
+
+    outcome = []
+    for first, end, result, used in _compile(term.child, version, memo, unevaluated):
+        if result.result == 'none':
+            result = SPFResult('permerror', str(term), node.domain)
+        outcome.append((first, end, result, 1 + used))
+    return outcome
+
+def _matching(version, ranges, result, lookups):
+    """Outcome of a term matching `ranges` (possibly overlapping) with `result`"""
+    outcome = []
+    position = 0
+    for first, end in sorted(ranges):
+        if end < position:
+            continue
+        first = max(first, position)
+        if first > position:
+            outcome.append((position, first - 1, None, lookups))
+        outcome.append((first, end, result, lookups))
+        position = end + 1
+    last = (1 << ADDRESS_BITS[version]) - 1
+    if position <= last:
+        outcome.append((position, last, None, lookups))
+    return outcome
+
+def _apply(undecided, outcome, decided):
+    """
+    Evaluate one term for the addresses still undecided
+
+    Args:
+        undecided (list): Sorted (first, last, lookups) segments
+        outcome (list): The term's (first, last, result or None, lookups) segments
+        decided (list): Receives (first, last, result, lookups) of the addresses
+            the term decides
+
+    Returns:
+        list: Segments still undecided after the term, with their lookups counted
+    """
+    remaining = []
+    index = 0
+    for first, end, used in undecided:
+        while outcome[index][1] < first:
+            index += 1
+        position = first
+        while position <= end:
+            _, term_end, result, lookups = outcome[index]
+            piece_end = min(end, term_end)
+            if result is None:
+                remaining.append((position, piece_end, used + lookups))
+            else:
+                decided.append((position, piece_end, result, used + lookups))
+            position = piece_end + 1
+            if position <= end:
+                index += 1
+    return _merge(remaining)
+
+def _merge(segments):
+    """Join adjacent segments carrying the same data"""
+    merged = []
+    for segment in segments:
+        if merged and merged[-1][1] + 1 == segment[0] and merged[-1][2:] == segment[2:]:
+            merged[-1] = (merged[-1][0], segment[1]) + segment[2:]
+        else:
+            merged.append(segment)
+    return merged
+
+def _limit(segments, domain):
+    """
+    Apply the DNS lookup limit to compiled segments
+
+    Counts only grow during evaluation, so an address whose evaluation
+    made more than MAX_DNS_LOOKUPS lookups hit the limit on the way and
+    gets permerror; addresses decided earlier keep their result.
+    """
+    fault = SPFResult('permerror', None, domain)
+    return _merge([
+        (first, end, fault if used > MAX_DNS_LOOKUPS else result)
+        for first, end, result, used in segments
+    ])
+
+def _whole_space(version, result, lookups=None):
+    """One segment over the whole space, with a lookup count for outcomes"""
+    last = (1 << ADDRESS_BITS[version]) - 1
+    if lookups is None:
+        return [(0, last, result)]
+    return [(0, last, result, lookups)]
+
+def _address(ip):
+    """IP version and integer value of an address, IPv4-mapped IPv6 as IPv4"""
+    if isinstance(ip, str):
+        # inet_pton is much faster than ipaddress for bulk input
+        ip = ip.strip()
+        try:
+            return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, ip), 'big')
+        except OSError:
+            pass
+        try:
+            packed = socket.inet_pton(socket.AF_INET6, ip.split('%', 1)[0])
+        except OSError:
+            raise ValueError(f"{ip!r} does not appear to be an IPv4 or IPv6 address") from None
+        if packed[:12] == IPV4_MAPPED_PREFIX:
+            return 4, int.from_bytes(packed[12:], 'big')
+        return 6, int.from_bytes(packed, 'big')
+
+    ip = ipaddress.ip_address(ip)
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.version, int(ip)
@@ -0,0 +1,725 @@
+"""
+SPF tree builder for Internet security tests.
+Resolves an SPF record and everything it references, following RFC 7208.
+"""
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dns.resolver import NXDOMAIN, NoAnswer
+from .shared import resolve
+from . import aio
+
+logger = logging.getLogger(__name__)
+
+# Limits from RFC 7208 section 4.6.4
+MAX_DNS_LOOKUPS = 10
+MAX_VOID_LOOKUPS = 2
+MAX_MX_NAMES = 10
+
+# Nesting depth at which expansion stops (a valid tree is far shallower)
+MAX_DEPTH = 12
+
+# Lookups of one tree resolved at the same time
+SPF_CONCURRENCY = 8
+
+# Freshness of cached trees whose answers carried no TTL
+DEFAULT_TTL = 300
+
+MECHANISMS = ('all', 'include', 'a', 'mx', 'ptr', 'ip4', 'ip6', 'exists')
+QUALIFIERS = '+-~?'
+
+class SPFTerm:
+    """
+    A mechanism or modifier of an SPF record
+
+    Attributes:
+        qualifier (str): One of + - ~ ? (mechanisms only)
+        mechanism (str): Mechanism or modifier name
+        value (str): Argument as written in the record, or None
+        target (str): Domain looked up by include, a, mx, exists and redirect
+        cidr4 (int): IPv4 prefix length of ip4, a and mx
+        cidr6 (int): IPv6 prefix length of ip6, a and mx
+        addresses (list): Addresses an a or mx mechanism resolved to
+        child (SPFNode): Tree of an include or redirect target
+        unevaluated (bool): True when the term depends on the message
+            (ptr, macros) and was not resolved
+        ignored (bool): True for a redirect next to an all mechanism
+        over_limit (bool): True when the term was not resolved because the
+            tree reaches the DNS lookup limit before it
+        fault (str): "permerror" or "temperror" when evaluating the term
+            cannot succeed (loops, failed lookups, too many MX names)
+    """
+    def __init__(self, qualifier, mechanism, value=None):
+        self.qualifier = qualifier
+        self.mechanism = mechanism
+        self.value = value
+        self.target = None
+        self.cidr4 = None
+        self.cidr6 = None
+        self.addresses = None
+        self.child = None
+        self.unevaluated = False
+        self.ignored = False
+        self.over_limit = False
+        self.fault = None
+
+    @property
+    def is_modifier(self):
+        return self.qualifier is None
+
+    @property
+    def counts_lookup(self):
+        """True for terms counted against the 10 DNS lookup limit"""
+        return self.mechanism in ('include', 'a', 'mx', 'ptr', 'exists', 'redirect') and not self.ignored
+
+    def __str__(self):
+        if self.is_modifier:
+            return f"{self.mechanism}={self.value}"
+        qualifier = '' if self.qualifier == '+' else self.qualifier
+        return f"{qualifier}{self.mechanism}" + (f":{self.value}" if self.value else '')
+
+class SPFNode:
+    """
+    A domain's SPF record with its include and redirect targets resolved
+
+    Nodes are immutable once built, so subtrees can be shared between trees.
+
+    Attributes:
+        domain (str): Domain the record was fetched from
+        record (str): SPF record, or None if the domain has none
+        terms (list): SPFTerm objects in record order
+        errors (list): Problems found in this record itself
+        lookups (int): DNS lookups of the whole subtree (RFC 7208 4.6.4)
+        void_lookups (int): Lookups of the subtree returning no records
+        ttl (int): Smallest remaining TTL of the answers in the subtree
+        path_dependent (bool): True if the subtree was cut short because of
+            the path it was reached through (include loop or nesting depth)
+        fault (str): "permerror" for an invalid record, "temperror" if the
+            record could not be fetched
+    """
+    def __init__(self, domain):
+        self.domain = domain
+        self.record = None
+        self.terms = []
+        self.errors = []
+        self.lookups = 0
+        self.void_lookups = 0
+        self.ttl = None
+        self.path_dependent = False
+        self.fault = None
+        self._lock = threading.Lock()
+
+    @property
+    def children(self):
+        return [term.child for term in self.terms if term.child is not None]
+
+    def observe_ttl(self, ttl):
+        with self._lock:
+            if ttl is not None and (self.ttl is None or ttl < self.ttl):
+                self.ttl = ttl
+
+    def add_error(self, error):
+        with self._lock:
+            self.errors.append(error)
+
+    def add_void_lookup(self):
+        with self._lock:
+            self.void_lookups += 1
+
+    def all_errors(self):
+        """Errors of the subtree, prefixed with the domain they occur in"""
+        errors = [f"{self.domain}: {error}" for error in self.errors]
+        for child in self.children:
+            errors.extend(child.all_errors())
+        return list(dict.fromkeys(errors))
+
+    def to_dict(self):
+        """JSON friendly view of the tree"""
+        return {
+            "domain": self.domain,
+            "record": self.record,
+            "lookups": self.lookups,
+            "includes": [child.to_dict() for child in self.children]
+        }
+
+    def _finish(self):
+        """Compute the subtree totals once all children are resolved"""
+        self.lookups = sum(1 for term in self.terms if term.counts_lookup)
+        for child in self.children:
+            self.lookups += child.lookups
+            self.void_lookups += child.void_lookups
+            self.observe_ttl(child.ttl)
+            self.path_dependent = self.path_dependent or child.path_dependent
+
+class SPFTreeCache:
+    """
+    Thread-safe LRU cache of resolved SPF subtrees keyed by domain
+
+    Entries expire with the smallest TTL of the answers in their subtree,
+    so popular provider trees (e.g. _spf.google.com) are resolved once per
+    TTL no matter how many domains include them.
+
+    Args:
+        max_entries (int): Maximum number of cached trees
+    """
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, domain):
+        """Cached tree of a domain, or None"""
+        with self._lock:
+            entry = self._entries.get(domain)
+            if entry is None or entry[0] <= time.time():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(domain)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, node):
+        """Cache a tree unless it depends on the path it was reached through"""
+        if node.path_dependent or self.max_entries <= 0:
+            return
+        ttl = node.ttl if node.ttl is not None else DEFAULT_TTL
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[node.domain] = (time.time() + ttl, node)
+            self._entries.move_to_end(node.domain)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+# Trees shared by all scans in this process
+spf_tree_cache = SPFTreeCache()
+
+class _LookupBudget:
+    """Lookup terms resolved for one tree, shared by all of its records"""
+    def __init__(self, limit=MAX_DNS_LOOKUPS):
+        self.limit = limit
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def take(self, count=1):
+        """Count `count` lookups, True while the total stays within the limit"""
+        with self._lock:
+            self.used += count
+            return self.used <= self.limit
+
+    def remaining(self):
+        """Lookups left before the limit"""
+        with self._lock:
+            return max(0, self.limit - self.used)
+
+def parse_spf(record):
+    """
+    Split an SPF record into terms
+
+    Args:
+        record (str): SPF record starting with v=spf1
+
+    Returns:
+        tuple: (list of SPFTerm, list of syntax errors)
+    """
+    terms = []
+    errors = []
+
+    for token in record.split()[1:]:
+        name, sep, value = token.partition('=')
+        if sep and name.replace('-', '').replace('_', '').replace('.', '').isalnum() and ':' not in name:
+            term = SPFTerm(None, name.lower(), value)
+            if term.mechanism == 'redirect':
+                term.target = value
+            terms.append(term)
+            continue
+
+        qualifier = '+'
+        if token[0] in QUALIFIERS:
+            qualifier, token = token[0], token[1:]
+        name, _, value = token.partition(':')
+        if '/' in name:
+            name, _, cidr = name.partition('/')
+            value = f"/{cidr}"
+        name = name.lower()
+
+        if name not in MECHANISMS:
+            errors.append(f"Unknown mechanism: {token}")
+            continue
+
+        term = SPFTerm(qualifier, name, value or None)
+        if name in ('a', 'mx'):
+            target, cidr4, cidr6 = _split_dual_cidr(value)
+            term.target = target or None
+            term.cidr4, term.cidr6 = cidr4, cidr6
+        elif name in ('include', 'exists'):
+            if not value:
+                errors.append(f"Mechanism without domain: {token}")
+                continue
+            term.target = value
+        elif name == 'ptr':
+            term.target = value or None
+            term.unevaluated = True
+        elif name in ('ip4', 'ip6'):
+            if not value:
+                errors.append(f"Mechanism without network: {token}")
+                continue
+        terms.append(term)
+
+    redirects = [term for term in terms if term.mechanism == 'redirect']
+    if len(redirects) > 1:
+        errors.append("Multiple redirect modifiers")
+
+    return terms, errors
+
+def build_spf_tree(domain, cache=spf_tree_cache):
+    """
+    Resolve the SPF record of a domain and everything it references
+
+    The records of sibling include and redirect targets are fetched
+    concurrently, as are the a, mx and exists lookups, on a pool shared by
+    the whole tree; the lookup budget is still charged in evaluation order.
+    Once the tree reaches MAX_DNS_LOOKUPS, further lookup terms are not
+    resolved (SPFTerm.over_limit). Subtrees are taken from and added to
+    `cache`.
+
+    Args:
+        domain (str): Domain name
+        cache (SPFTreeCache): Cache of resolved subtrees, or None
+
+    Returns:
+        SPFNode: Root of the tree
+    """
+    return _build(domain.lower().rstrip('.'), cache)
+
+async def build_spf_tree_async(domain, cache=spf_tree_cache):
+    """
+    Resolve the SPF record of a domain and everything it references without blocking
+
+    Args:
+        domain (str): Domain name
+        cache (SPFTreeCache): Cache of resolved subtrees, or None
+
+    Returns:
+        SPFNode: Root of the tree
+    """
+    return await _build_async(
+        domain.lower().rstrip('.'), (), cache, _LookupBudget(), asyncio.Semaphore(SPF_CONCURRENCY)
+    )
+
+def spf_tree_errors(tree):
+    """
+    Problems of a resolved SPF tree, including the RFC 7208 limits
+
+    Args:
+        tree (SPFNode): Root of the tree
+
+    Returns:
+        list: Error messages
+    """
+    errors = tree.all_errors()
+    if tree.lookups > MAX_DNS_LOOKUPS:
+        errors.append(f"Too many DNS lookups ({tree.lookups}), maximum is {MAX_DNS_LOOKUPS}")
+    if tree.void_lookups > MAX_VOID_LOOKUPS:
+        errors.append(f"Too many void DNS lookups ({tree.void_lookups}), maximum is {MAX_VOID_LOOKUPS}")
+    return errors
+
+def _build(domain, cache):
+    """
+    Build the tree of a domain on one bounded thread pool
+
+    The records of a node's include and redirect targets are fetched on
+    the pool as soon as the node is parsed. The node is then expanded in
+    evaluation order on the calling thread: a target's subtree is charged
+    to the lookup budget before the terms after it, so the budget is spent
+    in the order RFC 7208 counts it. The a, mx and exists lookups run on
+    the pool meanwhile. Workers never wait for each other, so the pool
+    cannot deadlock.
+    """
+    if cache is not None:
+        cached = cache.get(domain)
+        if cached is not None:
+            return cached
+
+    budget = _LookupBudget()
+    with ThreadPoolExecutor(max_workers=SPF_CONCURRENCY) as executor:
+        def fetch(domain, path):
+            return executor.submit(contextvars.copy_context().run, _fetch_node, domain, path)
+
+        def build(domain, path, fetched=None):
+            node = (fetched or fetch(domain, path)).result()
+            child_path = path + (node.domain,)
+            ahead = {}
+            for term, target in _prefetch_targets(node, path, budget):
+                cached = cache.get(target) if cache is not None else None
+                ahead[id(term)] = cached or fetch(target, child_path)
+
+            lookups = []
+            try:
+                for term in _expandable_terms(node, path, budget):
+                    if term.mechanism not in ('include', 'redirect'):
+                        lookups.append(executor.submit(contextvars.copy_context().run, _resolve_term, node, term))
+                        continue
+                    target = _child_target(node, term, path)
+                    if target is None:
+                        continue
+                    child = ahead.pop(id(term), None)
+                    if child is None and cache is not None:
+                        child = cache.get(target)
+                    if isinstance(child, SPFNode):
+                        _attach(node, term, child, budget)
+                    else:
+                        _attach(node, term, build(target, child_path, child))
+            finally:
+                # Targets past the lookup limit are not needed after all
+                for future in ahead.values():
+                    if not isinstance(future, SPFNode):
+                        future.cancel()
+            for future in lookups:
+                future.result()
+            node._finish()
+            if cache is not None:
+                cache.put(node)
+            return node
+
+        return build(domain, ())
+
+async def _build_async(domain, path, cache, budget, semaphore, fetched=None):
+    """
+    Coroutine counterpart of _build, bounded by one semaphore for the whole tree
+
+    `fetched` is a task already fetching the node of `domain`.
+    """
+    if fetched is None and cache is not None:
+        cached = cache.get(domain)
+        if cached is not None:
+            return cached
+
+    async def fetch(domain, path):
+        async with semaphore:
+            return await _fetch_node_async(domain, path)
+
+    node = await (fetched or fetch(domain, path))
+    child_path = path + (node.domain,)
+    ahead = {}
+    for term, target in _prefetch_targets(node, path, budget):
+        cached = cache.get(target) if cache is not None else None
+        ahead[id(term)] = cached or asyncio.ensure_future(fetch(target, child_path))
+
+    async def resolve_term(term):
+        async with semaphore:
+            await _resolve_term_async(node, term)
+
+    lookups = []
+    try:
+        for term in _expandable_terms(node, path, budget):
+            if term.mechanism not in ('include', 'redirect'):
+                lookups.append(asyncio.ensure_future(resolve_term(term)))
+                continue
+            target = _child_target(node, term, path)
+            if target is None:
+                continue
+            child = ahead.pop(id(term), None)
+            if child is None and cache is not None:
+                child = cache.get(target)
+            if isinstance(child, SPFNode):
+                _attach(node, term, child, budget)
+            else:
+                # The semaphore is only held around queries, never across a subtree
+                _attach(node, term, await _build_async(target, child_path, cache, budget, semaphore, child))
+        await asyncio.gather(*lookups)
+    finally:
+        for task in ahead.values():
+            if not isinstance(task, SPFNode):
+                task.cancel()
+        for task in lookups:
+            task.cancel()
+    node._finish()
+
+    if cache is not None:
+        cache.put(node)
+    return node
+
+def _fetch_node(domain, path):
+    """Fetch and parse the SPF record of a domain"""
+    node = SPFNode(domain)
+    try:
+        answer = resolve(domain, 'TXT')
+        node.observe_ttl(_remaining_ttl(answer))
+        _parse_into(node, _txt_strings(answer), path)
+    except (NXDOMAIN, NoAnswer) as e:
+        if path:
+            node.void_lookups += 1
+        node.errors.append("Domain does not exist" if isinstance(e, NXDOMAIN) else "No SPF record")
+    except Exception as e:
+        node.fault = "temperror"
+        node.errors.append(f"Cannot resolve SPF record: {str(e)}")
+    return node
+
+async def _fetch_node_async(domain, path):
+    """Coroutine counterpart of _fetch_node"""
+    node = SPFNode(domain)
+    try:
+        answer = await aio.resolve(domain, 'TXT')
+        node.observe_ttl(_remaining_ttl(answer))
+        _parse_into(node, _txt_strings(answer), path)
+    except (NXDOMAIN, NoAnswer) as e:
+        if path:
+            node.void_lookups += 1
+        node.errors.append("Domain does not exist" if isinstance(e, NXDOMAIN) else "No SPF record")
+    except Exception as e:
+        node.fault = "temperror"
+        node.errors.append(f"Cannot resolve SPF record: {str(e)}")
+    return node
+
+def _parse_into(node, txt_records, path):
+    """Pick the SPF record among TXT records and parse it into `node`"""
+    spf_records = [record for record in txt_records if record.lower().startswith('v=spf1')
+                   and (len(record) == 6 or record[6] == ' ')]
+    if not spf_records:
+        node.errors.append("No SPF record")
+        return
+    if len(spf_records) > 1:
+        node.fault = "permerror"
+        node.errors.append("Multiple SPF records")
+
+    node.record = spf_records[0]
+    node.terms, errors = parse_spf(node.record)
+    node.errors.extend(errors)
+    if errors:
+        node.fault = "permerror"
+
+    if any(term.mechanism == 'all' for term in node.terms):
+        # redirect is ignored when the record has an all mechanism
+        for term in node.terms:
+            if term.mechanism == 'redirect':
+                term.ignored = True
+
+    lookups = sum(1 for term in node.terms if term.counts_lookup)
+    if lookups > MAX_DNS_LOOKUPS:
+        # The tree's lookup budget stops expansion at the limit, so the
+        # terms before it still decide the addresses they match
+        node.errors.append(f"Record has {lookups} DNS lookups, maximum is {MAX_DNS_LOOKUPS}")
+
+def _needs_lookup(term, path):
+    """True for terms that are resolved while building the tree"""
+    if not term.counts_lookup or term.unevaluated:
+        return False
+    if term.target and '%' in term.target:
+        # Macros depend on the message being checked
+        term.unevaluated = True
+        return False
+    return True
+
+def _prefetch_targets(node, path, budget):
+    """
+    Include and redirect targets of a record worth fetching ahead
+
+    Only terms within the remaining lookup budget are considered, and
+    targets that would loop or nest too deeply are skipped. Nothing is
+    charged or recorded; _expandable_terms and _child_target do that in
+    evaluation order.
+
+    Yields:
+        tuple: (SPFTerm, target domain)
+    """
+    reachable = budget.remaining()
+    for term in node.terms:
+        if reachable <= 0:
+            return
+        if not _needs_lookup(term, path):
+            continue
+        reachable -= 1
+        if term.mechanism not in ('include', 'redirect'):
+            continue
+        target = (term.target or node.domain).lower().rstrip('.')
+        if target not in path and target != node.domain and len(path) < MAX_DEPTH:
+            yield term, target
+
+def _expandable_terms(node, path, budget):
+    """
+    Terms of a record to resolve, in record order, within the lookup budget
+
+    A generator: each term is charged when the caller asks for it, after
+    the subtrees of the terms before it were built. Terms past the RFC 7208
+    limit are left unresolved, so a hostile tree cannot fan out into
+    thousands of queries.
+    """
+    for term in node.terms:
+        if not _needs_lookup(term, path):
+            continue
+        if not budget.take():
+            term.over_limit = True
+            # Where the limit is hit depends on the rest of the tree
+            node.path_dependent = True
+            node.add_error(f"{term} not resolved, the tree exceeds {MAX_DNS_LOOKUPS} DNS lookups")
+            continue
+        yield term
+
+def _child_target(node, term, path):
+    """Target of an include or redirect, or None if following it would loop or nest too deeply"""
+    target = (term.target or node.domain).lower().rstrip('.')
+    if target in path or target == node.domain:
+        node.path_dependent = True
+        term.fault = "permerror"
+        node.add_error(f"{term.mechanism} loop through {target}")
+        return None
+    if len(path) >= MAX_DEPTH:
+        node.path_dependent = True
+        term.fault = "permerror"
+        node.add_error(f"{term.mechanism} of {target} nested too deeply")
+        return None
+    return target
+
+def _attach(node, term, child, budget=None):
+    """
+    Hang the tree of an include or redirect target below its term
+
+    A cached subtree is charged to `budget` in full, although its lookups
+    cost no queries, so the limit cuts the same terms either way.
+    """
+    term.child = child
+    if budget is not None:
+        budget.take(child.lookups)
+    if child.record is None:
+        node.add_error(f"{term.mechanism} target {child.domain} has no SPF record")
+
+def _resolve_term(node, term):
+    """Resolve the addresses of an a, mx or exists mechanism of `node`"""
+    target = (term.target or node.domain).lower().rstrip('.')
+    if term.mechanism == 'exists':
+        answers = [_lookup(node, term, target, 'A')]
+    elif term.mechanism == 'a':
+        answers = [_lookup(node, term, target, 'A'), _lookup(node, term, target, 'AAAA')]
+    else:
+        answers = _lookup_mx(node, term, target)
+    _set_addresses(node, term, answers)
+
+async def _resolve_term_async(node, term):
+    """Coroutine counterpart of _resolve_term"""
+    target = (term.target or node.domain).lower().rstrip('.')
+    if term.mechanism == 'exists':
+        answers = [await _lookup_async(node, term, target, 'A')]
+    elif term.mechanism == 'a':
+        answers = list(await asyncio.gather(
+            _lookup_async(node, term, target, 'A'), _lookup_async(node, term, target, 'AAAA')
+        ))
+    else:
+        answers = await _lookup_mx_async(node, term, target)
+    _set_addresses(node, term, answers)
+
+def _lookup(node, term, name, record_type):
+    """Addresses of a name, or None for an empty answer"""
+    try:
+        answer = resolve(name, record_type)
+    except (NXDOMAIN, NoAnswer):
+        return None
+    except Exception as e:
+        term.fault = "temperror"
+        node.add_error(f"Cannot resolve {name} ({record_type}): {str(e)}")
+        return []
+    node.observe_ttl(_remaining_ttl(answer))
+    return [str(rdata) for rdata in answer]
+
+async def _lookup_async(node, term, name, record_type):
+    """Coroutine counterpart of _lookup"""
+    try:
+        answer = await aio.resolve(name, record_type)
+    except (NXDOMAIN, NoAnswer):
+        return None
+    except Exception as e:
+        term.fault = "temperror"
+        node.add_error(f"Cannot resolve {name} ({record_type}): {str(e)}")
+        return []
+    node.observe_ttl(_remaining_ttl(answer))
+    return [str(rdata) for rdata in answer]
+
+def _lookup_mx(node, term, name):
+    """Address lookups of the mail exchangers of a name"""
+    exchanges = _mx_names(node, term, name, lambda: resolve(name, 'MX'))
+    if exchanges is None:
+        return [None]
+    answers = []
+    for exchange in exchanges:
+        answers.append(_lookup(node, term, exchange, 'A'))
+        answers.append(_lookup(node, term, exchange, 'AAAA'))
+    return answers
+
+async def _lookup_mx_async(node, term, name):
+    """Coroutine counterpart of _lookup_mx"""
+    try:
+        answer = await aio.resolve(name, 'MX')
+    except Exception as e:
+        answer = e
+    exchanges = _mx_names(node, term, name, lambda: _raise_or_return(answer))
+    if exchanges is None:
+        return [None]
+    lookups = []
+    for exchange in exchanges:
+        lookups.append(_lookup_async(node, term, exchange, 'A'))
+        lookups.append(_lookup_async(node, term, exchange, 'AAAA'))
+    return list(await asyncio.gather(*lookups))
+
+def _mx_names(node, term, name, fetch):
+    """Exchange names of an MX answer, or None when there are none"""
+    try:
+        answer = fetch()
+    except (NXDOMAIN, NoAnswer):
+        return None
+    except Exception as e:
+        term.fault = "temperror"
+        node.add_error(f"Cannot resolve {name} (MX): {str(e)}")
+        return []
+    node.observe_ttl(_remaining_ttl(answer))
+    # A null MX (RFC 7505) has "." as its only exchange
+    exchanges = [str(rdata.exchange).rstrip('.') for rdata in answer if str(rdata.exchange) != '.']
+    if len(exchanges) > MAX_MX_NAMES:
+        term.fault = "permerror"
+        node.add_error(f"{name} has {len(exchanges)} MX records, maximum is {MAX_MX_NAMES}")
+        exchanges = exchanges[:MAX_MX_NAMES]
+    return exchanges
+
+def _raise_or_return(value):
+    if isinstance(value, Exception):
+        raise value
+    return value
+
+def _set_addresses(node, term, answers):
+    """Store the addresses of an a, mx or exists mechanism and count void lookups"""
+    if all(answer is None for answer in answers):
+        node.add_void_lookup()
+    term.addresses = [address for answer in answers if answer for address in answer]
+
+def _split_dual_cidr(value):
+    """Split "domain/24//64" into (domain, 24, 64)"""
+    if not value:
+        return None, None, None
+    cidr4 = cidr6 = None
+    if '//' in value:
+        value, _, cidr6 = value.partition('//')
+        cidr6 = int(cidr6) if cidr6.isdigit() else None
+    if '/' in value:
+        value, _, cidr4 = value.partition('/')
+        cidr4 = int(cidr4) if cidr4.isdigit() else None
+    return value, cidr4, cidr6
+
+def _txt_strings(answer):
+    """TXT records of an answer, joining records split into several strings"""
+    return [b''.join(rdata.strings).decode('utf-8', 'replace') for rdata in answer]
+
+def _remaining_ttl(answer):
+    return max(0, int(answer.expiration - time.time()))
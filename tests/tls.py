@@ -3,12 +3,12 @@ TLS testing module for Internet security tests.
 Replaces Django-specific TLS testing implementation.
 """
 import logging
-import ssl
-import socket
-import datetime
-from OpenSSL import SSL, crypto
-from .shared import create_test_result, is_port_open
+from .shared import create_test_result, dns_lookup
 from .scoring import Score, TestStatus
+from .scheduler import Check, run_category
+from .tls_probe import tls_session, tls_session_async
+from .tls_enum import enumerator, tls_enumeration, tls_enumeration_async
+from .cert_cache import certificate_cache
 
 logger = logging.getLogger(__name__)
 
@@ -31,6 +31,12 @@ SECURE_PROTOCOLS = [
     'TLSv1.3'
 ]
 
+# Substrings of cipher suite names that must not be accepted at all
+WEAK_CIPHER_MARKERS = ('NULL', 'EXP', 'RC4', 'DES', 'MD5', 'ADH', 'AECDH')
+
+# Enumerate every accepted version and cipher suite rather than only the negotiated ones
+TLS_ENUMERATION = True
+
 def test_tls_website(domain):
     """
     Test TLS support for a website
@@ -43,51 +49,63 @@ def test_tls_website(domain):
     """
     logger.info(f"Testing TLS for website: {domain}")
     
-    results = {
-        "name": "TLS",
-        "status": TestStatus.RUNNING.value,
-        "tests": {},
-        "score": None
-    }
+    return run_category("TLS", get_website_checks(domain))
+
+def get_website_checks(domain):
+    """
+    Build the TLS website checks and their dependencies
     
-    try:
-        # Test for HTTPS availability
-        https_test = test_https_availability(domain)
-        results["tests"]["https_availability"] = https_test
-        
-        if https_test["score"] > 0:
-            # Test certificate
-            cert_test = test_certificate(domain)
-            results["tests"]["certificate"] = cert_test
-            
-            # Test TLS version
-            tls_version_test = test_tls_version(domain)
-            results["tests"]["tls_version"] = tls_version_test
-            
-            # Test cipher suites
-            cipher_test = test_cipher_suites(domain)
-            results["tests"]["cipher_suites"] = cipher_test
-        else:
-            # Skip other tests if HTTPS is not available
-            for test_name in ["certificate", "tls_version", "cipher_suites"]:
-                results["tests"][test_name] = create_test_result(
-                    test_name.replace("_", " ").title(),
-                    "skipped",
-                    Score.FAILED,
-                    {"reason": "HTTPS not available"}
-                )
-        
-        # Calculate overall score
-        score_sum = sum(test["score"] for test in results["tests"].values())
-        results["score"] = score_sum / len(results["tests"])
-        results["status"] = TestStatus.DONE.value
+    Args:
+        domain (str): Domain name to test
         
-    except Exception as e:
-        logger.error(f"Error in TLS test for {domain}: {str(e)}")
-        results["status"] = TestStatus.ERROR.value
-        results["error"] = str(e)
+    Returns:
+        list: List of Check objects
+    """
+    checks = [Check(
+        "https_availability",
+        lambda: test_https_availability(domain),
+        afunc=lambda: test_https_availability_async(domain)
+    )]
     
-    return results
+    # Certificate, version and cipher checks need HTTPS to be available
+    for test_name, func, afunc in [
+        ("certificate", test_certificate, test_certificate_async),
+        ("tls_version", test_tls_version, test_tls_version_async),
+        ("cipher_suites", test_cipher_suites, test_cipher_suites_async)
+    ]:
+        checks.append(Check(
+            test_name,
+            lambda func=func: func(domain),
+            afunc=lambda afunc=afunc: afunc(domain),
+            requires=("https_availability",),
+            when=lambda deps: deps["https_availability"]["score"] > 0,
+            skip=create_test_result(
+                test_name.replace("_", " ").title(),
+                "skipped",
+                Score.FAILED,
+                {"reason": "HTTPS not available"}
+            )
+        ))
+    
+    return checks
+
+def configure_enumeration(enabled=None, per_host=None, endpoint_ttl=None):
+    """
+    Override whether and how hard the TLS checks enumerate servers
+    
+    Args:
+        enabled (bool): Enumerate accepted versions and cipher suites
+        per_host (int): Enumeration handshakes in flight at once per host
+        endpoint_ttl (int): Seconds an enumeration is shared by the names
+            on the same IP address and port, 0 disables sharing
+    """
+    global TLS_ENUMERATION
+    if enabled is not None:
+        TLS_ENUMERATION = enabled
+    if per_host is not None:
+        enumerator.per_host = per_host
+    if endpoint_ttl is not None:
+        enumerator.endpoints.ttl = endpoint_ttl
 
 def test_https_availability(domain):
     """
@@ -100,23 +118,28 @@ def test_https_availability(domain):
         dict: Test result
     """
     try:
-        # Check if port 443 is open
-        is_https_available = is_port_open(domain, 443)
+        # The probe shared with the other TLS checks tells whether port 443 is open
+        return _https_availability_result(tls_session(domain))
+    except Exception as e:
+        return create_test_result(
+            "HTTPS Availability",
+            "error",
+            Score.FAILED,
+            {"error": str(e)}
+        )
+
+async def test_https_availability_async(domain):
+    """
+    Test if a domain has HTTPS available without blocking
+    
+    Args:
+        domain (str): Domain name to test
         
-        if is_https_available:
-            return create_test_result(
-                "HTTPS Availability",
-                "done",
-                Score.GOOD,
-                {"available": True}
-            )
-        else:
-            return create_test_result(
-                "HTTPS Availability",
-                "done",
-                Score.FAILED,
-                {"available": False}
-            )
+    Returns:
+        dict: Test result
+    """
+    try:
+        return _https_availability_result(await tls_session_async(domain))
     except Exception as e:
         return create_test_result(
             "HTTPS Availability",
@@ -125,6 +148,27 @@ def test_https_availability(domain):
             {"error": str(e)}
         )
 
+def _https_availability_result(session):
+    """Score whether port 443 accepts connections"""
+    if session.connected:
+        return create_test_result(
+            "HTTPS Availability",
+            "done",
+            Score.GOOD,
+            {
+                "available": True,
+                "connect_ms": session.connect_ms,
+                "handshake_ms": session.handshake_ms
+            }
+        )
+    else:
+        return create_test_result(
+            "HTTPS Availability",
+            "done",
+            Score.FAILED,
+            {"available": False}
+        )
+
 def test_certificate(domain):
     """
     Test the SSL certificate for a domain
@@ -136,91 +180,9 @@ def test_certificate(domain):
         dict: Test result
     """
     try:
-        # Create SSL connection
-        context = SSL.Context(SSL.SSLv23_METHOD)
-        context.set_verify(SSL.VERIFY_PEER, lambda *args: True)
-        
-        conn = SSL.Connection(context, socket.socket(socket.AF_INET, socket.SOCK_STREAM))
-        conn.settimeout(5)
-        conn.connect((domain, 443))
-        conn.setblocking(1)
-        conn.do_handshake()
-        conn.set_tlsext_host_name(domain.encode())
-        
-        # Get certificate
-        cert = conn.get_peer_certificate()
-        conn.close()
-        
-        if not cert:
-            return create_test_result(
-                "Certificate",
-                "done",
-                Score.FAILED,
-                {"valid": False, "reason": "No certificate found"}
-            )
-        
-        # Check certificate validity
-        not_before = datetime.datetime.strptime(cert.get_notBefore().decode('ascii'), "%Y%m%d%H%M%SZ")
-        not_after = datetime.datetime.strptime(cert.get_notAfter().decode('ascii'), "%Y%m%d%H%M%SZ")
-        now = datetime.datetime.utcnow()
-        
-        is_valid = now >= not_before and now <= not_after
-        
-        # Check if certificate matches domain
-        common_name = cert.get_subject().CN
-        is_domain_match = common_name == domain or (common_name.startswith('*.') and domain.endswith(common_name[2:]))
-        
-        # Get all SANs (Subject Alternative Names)
-        alt_names = []
-        for i in range(cert.get_extension_count()):
-            ext = cert.get_extension(i)
-            if ext.get_short_name() == b'subjectAltName':
-                alt_names = str(ext).split(', ')
-                break
-        
-        # Check if domain is in SANs
-        has_san_match = False
-        for name in alt_names:
-            if name.startswith('DNS:'):
-                san = name[4:]
-                if san == domain or (san.startswith('*.') and domain.endswith(san[2:])):
-                    has_san_match = True
-                    break
-        
-        domain_match = is_domain_match or has_san_match
-        
-        if is_valid and domain_match:
-            return create_test_result(
-                "Certificate",
-                "done",
-                Score.GOOD,
-                {
-                    "valid": True,
-                    "issuer": cert.get_issuer().CN,
-                    "expires": not_after.isoformat(),
-                    "subject": common_name,
-                    "alt_names": alt_names
-                }
-            )
-        else:
-            reasons = []
-            if not is_valid:
-                reasons.append("Certificate is not valid")
-            if not domain_match:
-                reasons.append("Certificate does not match domain")
-                
-            return create_test_result(
-                "Certificate",
-                "done",
-                Score.FAILED,
-                {
-                    "valid": False,
-                    "reason": ", ".join(reasons),
-                    "issuer": cert.get_issuer().CN,
-                    "expires": not_after.isoformat(),
-                    "subject": common_name
-                }
-            )
+        session = tls_session(domain)
+        session.raise_for_error()
+        return _certificate_result(domain, session)
     except Exception as e:
         return create_test_result(
             "Certificate",
@@ -229,9 +191,9 @@ def test_certificate(domain):
             {"error": str(e)}
         )
 
-def test_tls_version(domain):
+async def test_certificate_async(domain):
     """
-    Test supported TLS versions for a domain
+    Test the SSL certificate for a domain without blocking
     
     Args:
         domain (str): Domain name to test
@@ -240,45 +202,131 @@ def test_tls_version(domain):
         dict: Test result
     """
     try:
-        supported_versions = []
+        session = await tls_session_async(domain)
+        session.raise_for_error()
+        return _certificate_result(domain, session)
+    except Exception as e:
+        return create_test_result(
+            "Certificate",
+            "error",
+            Score.FAILED,
+            {"error": str(e)}
+        )
+
+def _certificate_result(domain, session):
+    """
+    Score the peer certificate of a probe for validity and hostname match
+    
+    Args:
+        domain (str): Domain name the certificate should cover
+        session (TLSProbe): Completed handshake with the server
         
-        # Test TLSv1.2
-        try:
-            context = ssl.create_default_context()
-            context.minimum_version = ssl.TLSVersion.TLSv1_2
-            context.maximum_version = ssl.TLSVersion.TLSv1_2
-            
-            with socket.create_connection((domain, 443), timeout=5) as sock:
-                with context.wrap_socket(sock, server_hostname=domain) as ssock:
-                    supported_versions.append(ssock.version())
-        except:
-            pass
-            
-        # Test TLSv1.3
-        try:
-            context = ssl.create_default_context()
-            context.minimum_version = ssl.TLSVersion.TLSv1_3
-            context.maximum_version = ssl.TLSVersion.TLSv1_3
+    Returns:
+        dict: Test result
+    """
+    # Parsed once per distinct certificate, later scans only match the host name
+    cert = certificate_cache.analyze(session.chain)
+    if not cert:
+        return create_test_result(
+            "Certificate",
+            "done",
+            Score.FAILED,
+            {"valid": False, "reason": "No certificate found"}
+        )
+    
+    is_valid = cert.is_valid()
+    domain_match = cert.matches(domain)
+    trusted, trust_error = certificate_cache.verify(cert, session.chain)
+    
+    details = {
+        "issuer": cert.issuer,
+        "expires": cert.not_after.isoformat(),
+        "subject": cert.subject,
+        "key_type": cert.key_type,
+        "key_bits": cert.key_bits,
+        "trusted": trusted,
+        "chain_length": len(session.chain),
+        "ocsp_stapled": bool(session.ocsp_response)
+    }
+    if trust_error:
+        details["trust_error"] = trust_error
+    
+    if is_valid and domain_match:
+        return create_test_result(
+            "Certificate",
+            "done",
+            Score.GOOD,
+            {"valid": True, **details, "alt_names": cert.alt_names}
+        )
+    else:
+        reasons = []
+        if not is_valid:
+            reasons.append("Certificate is not valid")
+        if not domain_match:
+            reasons.append("Certificate does not match domain")
             
-            with socket.create_connection((domain, 443), timeout=5) as sock:
-                with context.wrap_socket(sock, server_hostname=domain) as ssock:
-                    supported_versions.append(ssock.version())
-        except:
-            pass
+        return create_test_result(
+            "Certificate",
+            "done",
+            Score.FAILED,
+            {"valid": False, "reason": ", ".join(reasons), **details}
+        )
+
+def test_tls_version(domain):
+    """
+    Test supported TLS versions for a domain
+    
+    With enumeration every version from TLSv1 to TLSv1.3 is probed.
+    Otherwise the default handshake shows the highest version the server
+    supports, and only a server negotiating TLSv1.3 is probed again with
+    TLSv1.2 as the highest version offered.
+    
+    Args:
+        domain (str): Domain name to test
         
-        if 'TLSv1.3' in supported_versions:
-            score = Score.GOOD
-        elif 'TLSv1.2' in supported_versions:
-            score = Score.SUFFICIENT
+    Returns:
+        dict: Test result
+    """
+    try:
+        session = tls_session(domain)
+        session.raise_for_error()
+        if TLS_ENUMERATION:
+            supported_versions = tls_enumeration(session).supported_versions
         else:
-            score = Score.FAILED
-            
+            fallback = None
+            if session.version == 'TLSv1.3':
+                fallback = tls_session(domain, max_version='TLSv1.2', resume=True)
+            supported_versions = _probed_versions(session, fallback)
+        return _tls_version_result(supported_versions)
+    except Exception as e:
         return create_test_result(
             "TLS Version",
-            "done",
-            score,
-            {"supported_versions": supported_versions}
+            "error",
+            Score.FAILED,
+            {"error": str(e)}
         )
+
+async def test_tls_version_async(domain):
+    """
+    Test supported TLS versions for a domain without blocking
+    
+    Args:
+        domain (str): Domain name to test
+        
+    Returns:
+        dict: Test result
+    """
+    try:
+        session = await tls_session_async(domain)
+        session.raise_for_error()
+        if TLS_ENUMERATION:
+            supported_versions = (await tls_enumeration_async(session)).supported_versions
+        else:
+            fallback = None
+            if session.version == 'TLSv1.3':
+                fallback = await tls_session_async(domain, max_version='TLSv1.2', resume=True)
+            supported_versions = _probed_versions(session, fallback)
+        return _tls_version_result(supported_versions)
     except Exception as e:
         return create_test_result(
             "TLS Version",
@@ -287,6 +335,37 @@ def test_tls_version(domain):
             {"error": str(e)}
         )
 
+def _probed_versions(session, fallback=None):
+    """Protocol versions negotiated by the default and TLSv1.2 probes"""
+    supported_versions = []
+    if fallback is not None and fallback.ok and fallback.version == 'TLSv1.2':
+        supported_versions.append('TLSv1.2')
+    if session.version in SECURE_PROTOCOLS and session.version not in supported_versions:
+        supported_versions.append(session.version)
+    return supported_versions
+
+def _tls_version_result(supported_versions):
+    """Score the list of supported protocol versions"""
+    legacy_versions = [version for version in supported_versions if version not in SECURE_PROTOCOLS]
+    
+    if 'TLSv1.3' in supported_versions:
+        score = Score.GOOD
+    elif 'TLSv1.2' in supported_versions:
+        score = Score.SUFFICIENT
+    else:
+        score = Score.FAILED
+    
+    # Accepting TLSv1 or TLSv1.1 leaves clients open to downgrades
+    if legacy_versions and score != Score.FAILED:
+        score = Score.WARNING
+        
+    return create_test_result(
+        "TLS Version",
+        "done",
+        score,
+        {"supported_versions": supported_versions, "legacy_versions": legacy_versions}
+    )
+
 def test_cipher_suites(domain):
     """
     Test supported cipher suites for a domain
@@ -298,52 +377,33 @@ def test_cipher_suites(domain):
         dict: Test result
     """
     try:
-        context = SSL.Context(SSL.SSLv23_METHOD)
-        
-        conn = SSL.Connection(context, socket.socket(socket.AF_INET, socket.SOCK_STREAM))
-        conn.settimeout(5)
-        conn.connect((domain, 443))
-        conn.setblocking(1)
-        conn.do_handshake()
-        
-        # Get cipher used
-        cipher = conn.get_cipher_name()
-        protocol = conn.get_protocol_version_name()
-        conn.close()
-        
-        # Check if cipher is secure
-        is_secure_cipher = any(secure in cipher for secure in SECURE_CIPHER_SUITES)
-        is_secure_protocol = protocol in SECURE_PROTOCOLS
+        session = tls_session(domain)
+        session.raise_for_error()
+        enumeration = tls_enumeration(session) if TLS_ENUMERATION else None
+        return _cipher_suites_result(session, enumeration)
+    except Exception as e:
+        return create_test_result(
+            "Cipher Suites",
+            "error",
+            Score.FAILED,
+            {"error": str(e)}
+        )
+
+async def test_cipher_suites_async(domain):
+    """
+    Test supported cipher suites for a domain without blocking
+    
+    Args:
+        domain (str): Domain name to test
         
-        if is_secure_cipher and is_secure_protocol:
-            return create_test_result(
-                "Cipher Suites",
-                "done",
-                Score.GOOD,
-                {
-                    "cipher": cipher,
-                    "protocol": protocol,
-                    "secure": True
-                }
-            )
-        else:
-            reasons = []
-            if not is_secure_cipher:
-                reasons.append("Insecure cipher suite")
-            if not is_secure_protocol:
-                reasons.append("Insecure protocol")
-                
-            return create_test_result(
-                "Cipher Suites",
-                "done",
-                Score.WARNING if is_secure_protocol else Score.FAILED,
-                {
-                    "cipher": cipher,
-                    "protocol": protocol,
-                    "secure": False,
-                    "reason": ", ".join(reasons)
-                }
-            )
+    Returns:
+        dict: Test result
+    """
+    try:
+        session = await tls_session_async(domain)
+        session.raise_for_error()
+        enumeration = await tls_enumeration_async(session) if TLS_ENUMERATION else None
+        return _cipher_suites_result(session, enumeration)
     except Exception as e:
         return create_test_result(
             "Cipher Suites",
@@ -352,6 +412,66 @@ def test_cipher_suites(domain):
             {"error": str(e)}
         )
 
+def _cipher_suites_result(session, enumeration=None):
+    """
+    Score the negotiated cipher suite and protocol
+    
+    Args:
+        session (TLSProbe): Default handshake with the server
+        enumeration (TLSEnumeration): Accepted cipher suites, if enumerated
+        
+    Returns:
+        dict: Test result
+    """
+    cipher = session.cipher
+    protocol = session.version
+    # Check if cipher is secure
+    is_secure_cipher = any(secure in cipher for secure in SECURE_CIPHER_SUITES)
+    is_secure_protocol = protocol in SECURE_PROTOCOLS
+    
+    details = {
+        "cipher": cipher,
+        "protocol": protocol,
+        "alpn": session.alpn
+    }
+    weak_ciphers = []
+    if enumeration is not None:
+        # Suites a server accepts can be forced on clients even if it never prefers them
+        accepted = [name for names in enumeration.ciphers.values() for name in names]
+        weak_ciphers = [name for name in accepted if any(marker in name for marker in WEAK_CIPHER_MARKERS)]
+        details.update({
+            "accepted_ciphers": enumeration.ciphers,
+            "weak_ciphers": weak_ciphers,
+            "server_preference": enumeration.server_preference,
+            "groups": enumeration.groups,
+            "endpoint_shared": enumeration.shared
+        })
+    
+    if is_secure_cipher and is_secure_protocol and not weak_ciphers:
+        details["secure"] = True
+        return create_test_result(
+            "Cipher Suites",
+            "done",
+            Score.GOOD,
+            details
+        )
+    else:
+        reasons = []
+        if not is_secure_cipher:
+            reasons.append("Insecure cipher suite")
+        if not is_secure_protocol:
+            reasons.append("Insecure protocol")
+        if weak_ciphers:
+            reasons.append("Weak cipher suites accepted")
+        
+        details.update({"secure": False, "reason": ", ".join(reasons)})
+        return create_test_result(
+            "Cipher Suites",
+            "done",
+            Score.WARNING if is_secure_protocol else Score.FAILED,
+            details
+        )
+
 # Function to test STARTTLS for email servers (used in email_tests.py)
 def test_starttls(domain):
     """
@@ -379,12 +499,9 @@ def test_starttls(domain):
         import smtplib
         
         # Get MX records
-        import dns.resolver
         mx_records = []
         try:
-            answers = dns.resolver.resolve(domain, 'MX')
-            for rdata in answers:
-                mx_records.append(str(rdata.exchange))
+            mx_records = dns_lookup(domain, 'MX')
         except:
             pass
         
@@ -0,0 +1,463 @@
+"""
+TLS enumeration for Internet security tests.
+Finds every protocol version, cipher suite and key exchange group an endpoint accepts.
+"""
+import asyncio
+import copy
+import logging
+import threading
+import time
+from collections import OrderedDict
+from OpenSSL import SSL
+from .context import memoize, memoize_async
+from .tls_probe import VERSIONS, probe_async
+from .tls_sessions import session_cache
+
+logger = logging.getLogger(__name__)
+
+# Protocol versions probed, oldest first; TLSv1 and TLSv1.1 are only detected
+LEGACY_VERSIONS = ('TLSv1', 'TLSv1.1')
+
+# TLSv1.3 cipher suites (RFC 8446, appendix B.4)
+TLS13_CIPHERSUITES = (
+    'TLS_AES_256_GCM_SHA384',
+    'TLS_CHACHA20_POLY1305_SHA256',
+    'TLS_AES_128_GCM_SHA256',
+    'TLS_AES_128_CCM_SHA256',
+    'TLS_AES_128_CCM_8_SHA256'
+)
+
+# Key exchange groups probed one at a time (X25519 is only seen when negotiated by default)
+CURVES = ('prime256v1', 'secp384r1', 'secp521r1')
+
+# Default number of handshakes in flight per host
+DEFAULT_PER_HOST = 8
+
+# Default number of endpoints whose findings are shared
+DEFAULT_MAX_ENDPOINTS = 10000
+
+def _cipher_candidates():
+    """Every TLSv1.2-and-older cipher suite the local OpenSSL can offer, strongest first"""
+    context = SSL.Context(SSL.SSLv23_METHOD)
+    context.set_cipher_list(b'ALL:COMPLEMENTOFALL:@SECLEVEL=0')
+    return tuple(
+        name for name in SSL.Connection(context).get_cipher_list()
+        if name not in TLS13_CIPHERSUITES
+    )
+
+# Cipher suites offered when enumerating TLSv1.2
+CIPHER_CANDIDATES = _cipher_candidates()
+
+class TLSEnumeration:
+    """
+    Protocol versions, cipher suites and groups accepted by an endpoint
+
+    Args:
+        host (str): Hostname or IP address connected to
+        port (int): Port number
+        server_name (str): SNI name sent, defaults to host
+    """
+    def __init__(self, host, port, server_name=None):
+        self.host = host
+        self.port = port
+        self.server_name = server_name or host
+        self.shared = False
+        self.error = None
+        self.versions = {}
+        self.ciphers = {}
+        self.server_preference = {}
+        self.groups = []
+        self.handshakes = 0
+        self.elapsed_ms = None
+
+    @property
+    def supported_versions(self):
+        """Accepted protocol versions, oldest first"""
+        return [version for version in VERSIONS if self.versions.get(version)]
+
+    @property
+    def legacy_versions(self):
+        """Accepted protocol versions older than TLSv1.2"""
+        return [version for version in LEGACY_VERSIONS if self.versions.get(version)]
+
+    def to_dict(self):
+        """Summary of the enumeration"""
+        return {
+            "error": self.error,
+            "server_name": self.server_name,
+            "shared": self.shared,
+            "supported_versions": self.supported_versions,
+            "legacy_versions": self.legacy_versions,
+            "ciphers": self.ciphers,
+            "server_preference": self.server_preference,
+            "groups": self.groups,
+            "handshakes": self.handshakes,
+            "elapsed_ms": self.elapsed_ms
+        }
+
+class EndpointCache:
+    """
+    Enumerations shared by the names served from the same (IP, port)
+
+    Versions, cipher suites and groups are a property of the TLS endpoint
+    rather than of the name, so one enumeration serves every domain on a
+    load balancer until it expires. Each entry records the version and
+    cipher the default handshake of its first domain negotiated; when
+    another domain's default handshake differs, the endpoint configures
+    TLS per SNI name, and from then on is enumerated per (IP, port, SNI).
+    SNI-sensitive markers expire with the same ttl and are bounded by
+    max_entries as well.
+    Only used from the enumerator's event loop, apart from stats().
+
+    Args:
+        ttl (int): Seconds an enumeration is shared, 0 disables sharing
+        max_entries (int): Maximum number of shared enumerations
+    """
+    def __init__(self, ttl=3600, max_entries=DEFAULT_MAX_ENDPOINTS):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._sensitive = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.max_entries > 0
+
+    def key(self, address, port, server_name):
+        """Key findings of a name are shared under, per SNI name on SNI-sensitive endpoints"""
+        with self._lock:
+            expires = self._sensitive.get((address, port))
+        if expires is not None and expires > time.time():
+            return (address, port, server_name)
+        return (address, port)
+
+    def get(self, key, signature):
+        """
+        Look up the findings of an endpoint
+
+        Args:
+            key (tuple): Key returned by key()
+            signature (tuple): (version, cipher) negotiated by the caller's default handshake
+
+        Returns:
+            TLSEnumeration: Shared enumeration, or None on a miss
+        """
+        with self._lock:
+            now = time.time()
+            self._prune_sensitive(now)
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                del self._entries[key]
+                entry = None
+            if entry is not None and len(key) == 2 and entry[2] != signature:
+                # The endpoint negotiates differently per name
+                self._mark(key, now)
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, enumeration, signature):
+        """
+        Share the findings of an endpoint
+
+        Args:
+            key (tuple): Key returned by key()
+            enumeration (TLSEnumeration): Completed enumeration
+            signature (tuple): (version, cipher) negotiated by the default handshake
+        """
+        if not self.enabled or enumeration.error:
+            return
+        with self._lock:
+            now = time.time()
+            self._prune_sensitive(now)
+            self._entries[key] = (now + self.ttl, enumeration, signature)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def mark_sensitive(self, address, port):
+        """Share findings of an endpoint per SNI name from now on"""
+        with self._lock:
+            self._mark((address, port), time.time())
+            self._entries.pop((address, port), None)
+
+    def clear(self):
+        """Remove all entries"""
+        with self._lock:
+            self._entries.clear()
+            self._sensitive.clear()
+
+    def _mark(self, endpoint, now):
+        """Record an SNI-sensitive (IP, port), dropping the oldest markers past max_entries"""
+        self._sensitive[endpoint] = now + self.ttl
+        self._sensitive.move_to_end(endpoint)
+        while len(self._sensitive) > self.max_entries:
+            self._sensitive.popitem(last=False)
+
+    def _prune_sensitive(self, now):
+        """Drop expired SNI-sensitive markers, which are kept in expiry order"""
+        while self._sensitive:
+            endpoint, expires = next(iter(self._sensitive.items()))
+            if expires > now:
+                break
+            del self._sensitive[endpoint]
+
+    def stats(self):
+        """Hit, miss and SNI-sensitivity counters as a dict"""
+        with self._lock:
+            now = time.time()
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "sni_sensitive": sum(1 for expires in self._sensitive.values() if expires > now),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None
+            }
+
+class TLSEnumerator:
+    """
+    Concurrent TLS enumeration with a per-host limit on handshakes in flight
+
+    Every protocol version, the cipher suites of TLSv1.2 and TLSv1.3 and
+    every group in CURVES are probed in parallel with minimal ClientHellos
+    (no ALPN, no OCSP request). Cipher suites are enumerated in server
+    preference order: all remaining candidates are offered, the one the
+    server picks is recorded and dropped, and the walk stops at the first
+    refused handshake, so it takes one handshake per accepted suite plus
+    one instead of one per candidate. A final handshake with the accepted
+    suites reversed tells whether the server enforces its own order.
+    Only the version probes resume cached sessions; the cipher and group
+    probes need the server to negotiate from scratch.
+
+    Handshakes run on a background event loop shared by all scans, so the
+    per-host limit holds across concurrent scans of the same host. With an
+    endpoint cache, scans of names on the same endpoint share one
+    enumeration, and those arriving while it runs wait for it.
+
+    Args:
+        per_host (int): Handshakes in flight at the same time per host
+        timeout (int): Timeout of each handshake in seconds
+        endpoints (EndpointCache): Enumerations shared across names, if any
+    """
+    def __init__(self, per_host=DEFAULT_PER_HOST, timeout=5, endpoints=None):
+        self.per_host = per_host
+        self.timeout = timeout
+        self.endpoints = endpoints
+        self._loop = None
+        self._lock = threading.Lock()
+        self._hosts = {}
+        self._running = {}
+
+    def enumerate(self, host, port=443, server_name=None, signature=None):
+        """
+        Enumerate an endpoint, blocking until done
+
+        Args:
+            host (str): Hostname or IP address to connect to
+            port (int): Port number
+            server_name (str): SNI name, defaults to host
+            signature (tuple): (version, cipher) of the default handshake
+                with the endpoint, to share findings with other names
+
+        Returns:
+            TLSEnumeration: Accepted versions, cipher suites and groups
+        """
+        coro = self._shared(host, port, server_name or host, signature)
+        return asyncio.run_coroutine_threadsafe(coro, self._start()).result()
+
+    async def enumerate_async(self, host, port=443, server_name=None, signature=None):
+        """
+        Coroutine counterpart of enumerate
+
+        Args:
+            host (str): Hostname or IP address to connect to
+            port (int): Port number
+            server_name (str): SNI name, defaults to host
+            signature (tuple): (version, cipher) of the default handshake
+                with the endpoint, to share findings with other names
+
+        Returns:
+            TLSEnumeration: Accepted versions, cipher suites and groups
+        """
+        coro = self._shared(host, port, server_name or host, signature)
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self._start()))
+
+    def _start(self):
+        """Event loop running the handshakes, started on first use"""
+        if self._loop is not None:
+            return self._loop
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="tls-enum", daemon=True).start()
+                self._loop = loop
+            return self._loop
+
+    async def _handshake(self, result, **options):
+        """One minimal handshake, waiting for a free slot of the host"""
+        slot = self._hosts.get(result.host)
+        if slot is None:
+            slot = self._hosts[result.host] = [asyncio.Semaphore(self.per_host), 0]
+        slot[1] += 1
+        try:
+            async with slot[0]:
+                result.handshakes += 1
+                return await probe_async(result.host, result.port, server_name=result.server_name,
+                                         timeout=self.timeout, alpn=None, ocsp=False, **options)
+        finally:
+            slot[1] -= 1
+            if not slot[1]:
+                del self._hosts[result.host]
+
+    async def _shared(self, host, port, server_name, signature):
+        """Findings shared by the endpoint, enumerating it once when there are none"""
+        endpoints = self.endpoints
+        if endpoints is None or not endpoints.enabled or signature is None:
+            return await self._enumerate(host, port, server_name)
+
+        key = endpoints.key(host, port, server_name)
+        shared = endpoints.get(key, signature)
+        if shared is not None:
+            return _shared_copy(shared, server_name)
+        # The lookup may have found the endpoint to be SNI-sensitive
+        key = endpoints.key(host, port, server_name)
+
+        running = self._running.get(key)
+        if running is not None and len(key) == 2 and running[1] != signature:
+            # Same endpoint, different default negotiation: enumerate per SNI name
+            endpoints.mark_sensitive(host, port)
+            key = endpoints.key(host, port, server_name)
+            running = self._running.get(key)
+        if running is not None:
+            endpoints.coalesced += 1
+            return _shared_copy(await asyncio.shield(running[0]), server_name)
+
+        task = asyncio.ensure_future(self._enumerate(host, port, server_name))
+        self._running[key] = (task, signature)
+        try:
+            enumeration = await asyncio.shield(task)
+            endpoints.put(key, enumeration, signature)
+        finally:
+            del self._running[key]
+        return enumeration
+
+    async def _enumerate(self, host, port, server_name):
+        result = TLSEnumeration(host, port, server_name)
+        started = time.monotonic()
+
+        # Detecting a version does not need a full handshake, resuming a session of it is proof enough
+        probes = await asyncio.gather(*(
+            self._handshake(result, min_version=version, max_version=version,
+                            ciphers=None if version == 'TLSv1.3' else CIPHER_CANDIDATES, sessions=session_cache)
+            for version in VERSIONS
+        ))
+        for version, session in zip(VERSIONS, probes):
+            result.versions[version] = session.ok
+        if not any(session.connected for session in probes):
+            result.error = probes[0].error
+            result.elapsed_ms = round((time.monotonic() - started) * 1000, 1)
+            return result
+
+        walks = [self._walk(result, version) for version in ('TLSv1.2', 'TLSv1.3') if result.versions[version]]
+        highest = next((session for session in reversed(probes) if session.ok), None)
+        await asyncio.gather(*walks, self._groups(result, highest))
+        result.elapsed_ms = round((time.monotonic() - started) * 1000, 1)
+        return result
+
+    async def _walk(self, result, version):
+        """Enumerate the cipher suites of one version in server preference order"""
+        option = 'ciphersuites' if version == 'TLSv1.3' else 'ciphers'
+        remaining = list(TLS13_CIPHERSUITES if version == 'TLSv1.3' else CIPHER_CANDIDATES)
+        accepted = []
+        while remaining:
+            session = await self._handshake(result, min_version=version, max_version=version, **{option: remaining})
+            if not session.ok or session.cipher not in remaining:
+                break
+            accepted.append(session.cipher)
+            remaining.remove(session.cipher)
+        result.ciphers[version] = accepted
+
+        if len(accepted) > 1:
+            session = await self._handshake(
+                result, min_version=version, max_version=version, **{option: list(reversed(accepted))}
+            )
+            result.server_preference[version] = session.ok and session.cipher == accepted[0]
+        else:
+            result.server_preference[version] = None
+
+    async def _groups(self, result, highest):
+        """Probe each group on its own with the highest accepted version"""
+        if highest is None:
+            return
+        version = highest.version
+        # Before TLSv1.3 only ECDHE suites use the offered group
+        ciphers = None if version == 'TLSv1.3' else ['ECDHE']
+        sessions = await asyncio.gather(*(
+            self._handshake(result, min_version=version, max_version=version, ciphers=ciphers, curve=curve)
+            for curve in CURVES
+        ))
+        groups = [highest.group] if highest.group else []
+        groups += [curve for curve, session in zip(CURVES, sessions) if session.ok and curve not in groups]
+        result.groups = groups
+
+def _shared_copy(enumeration, server_name):
+    """Copy of another name's enumeration, marked as shared"""
+    shared = copy.copy(enumeration)
+    shared.server_name = server_name
+    shared.shared = True
+    return shared
+
+# Enumerations shared by the names on an endpoint
+endpoint_cache = EndpointCache()
+
+# Enumerator shared by all scans in this process
+enumerator = TLSEnumerator(endpoints=endpoint_cache)
+
+def tls_enumeration(session):
+    """
+    Enumerate the endpoint of a probe once per scan
+
+    The endpoint is enumerated at the address the probe connected to,
+    with the same SNI name, and its findings are shared with other names
+    on that address whose default handshake negotiated alike.
+
+    Args:
+        session (TLSProbe): Completed default handshake with the endpoint
+
+    Returns:
+        TLSEnumeration: Accepted versions, cipher suites and groups
+    """
+    return memoize(
+        ("tls_enum", session.address, session.port, session.server_name),
+        lambda: enumerator.enumerate(session.address, session.port, session.server_name, _signature(session))
+    )
+
+async def tls_enumeration_async(session):
+    """
+    Coroutine counterpart of tls_enumeration
+
+    Args:
+        session (TLSProbe): Completed default handshake with the endpoint
+
+    Returns:
+        TLSEnumeration: Accepted versions, cipher suites and groups
+    """
+    return await memoize_async(
+        ("tls_enum", session.address, session.port, session.server_name),
+        lambda: enumerator.enumerate_async(session.address, session.port, session.server_name, _signature(session))
+    )
+
+def _signature(session):
+    """What a default handshake negotiated, compared across names of an endpoint"""
+    return (session.version, session.cipher) if session.ok else None
@@ -0,0 +1,463 @@
+"""
+TLS probing for Internet security tests.
+One handshake per endpoint captures everything the TLS checks need.
+"""
+import asyncio
+import logging
+import selectors
+import socket
+import time
+from OpenSSL import SSL, crypto
+# pyOpenSSL wraps neither SSL_CTX_set_ciphersuites nor SSL_get_server_tmp_key
+from OpenSSL._util import ffi as _ffi, lib as _lib
+from .context import memoize, memoize_async
+from .tls_sessions import CachedSession, session_cache
+
+logger = logging.getLogger(__name__)
+
+# Application protocols offered with ALPN
+DEFAULT_ALPN = (b'h2', b'http/1.1')
+
+# Protocol version names accepted by probe()
+VERSIONS = {
+    'TLSv1': SSL.TLS1_VERSION,
+    'TLSv1.1': SSL.TLS1_1_VERSION,
+    'TLSv1.2': SSL.TLS1_2_VERSION,
+    'TLSv1.3': SSL.TLS1_3_VERSION
+}
+
+# Round trips to wait for TLSv1.3 session tickets, which arrive after the handshake
+TICKET_WAIT_RTTS = 2
+
+# Appended to explicit cipher lists so legacy protocols and suites can be offered
+LEGACY_SECURITY_LEVEL = '@SECLEVEL=0'
+
+class TLSProbe:
+    """
+    Outcome of one TLS handshake with an endpoint
+
+    A probe is returned even when the connection or the handshake fails;
+    `connected` tells whether the TCP connection was established and
+    `error` why the handshake did not complete.
+
+    Args:
+        host (str): Hostname or IP address connected to
+        port (int): Port number
+        server_name (str): SNI name sent
+    """
+    def __init__(self, host, port, server_name):
+        self.host = host
+        self.port = port
+        self.server_name = server_name
+        self.address = None
+        self.connected = False
+        self.error = None
+        self.version = None
+        self.cipher = None
+        self.cipher_bits = None
+        self.alpn = None
+        self.group = None
+        self.resumed = False
+        self.chain = []
+        self.ocsp_response = None
+        self.connect_ms = None
+        self.handshake_ms = None
+
+    @property
+    def ok(self):
+        """True if the handshake completed"""
+        return self.connected and self.error is None
+
+    @property
+    def certificate(self):
+        """Peer certificate as an OpenSSL X509, or None"""
+        if not self.chain:
+            return None
+        return crypto.load_certificate(crypto.FILETYPE_ASN1, self.chain[0])
+
+    def raise_for_error(self):
+        """Raise ConnectionError if the handshake did not complete"""
+        if not self.ok:
+            raise ConnectionError(self.error or "TLS handshake failed")
+
+    def to_dict(self):
+        """Summary of the handshake, without the certificates themselves"""
+        return {
+            "address": self.address,
+            "port": self.port,
+            "server_name": self.server_name,
+            "connected": self.connected,
+            "error": self.error,
+            "version": self.version,
+            "cipher": self.cipher,
+            "cipher_bits": self.cipher_bits,
+            "alpn": self.alpn,
+            "group": self.group,
+            "resumed": self.resumed,
+            "chain_length": len(self.chain),
+            "ocsp_stapled": bool(self.ocsp_response),
+            "connect_ms": self.connect_ms,
+            "handshake_ms": self.handshake_ms
+        }
+
+def probe(host, port=443, server_name=None, timeout=5, min_version=None, max_version=None, alpn=DEFAULT_ALPN,
+          ciphers=None, ciphersuites=None, curve=None, ocsp=True, sessions=None,
+          resume=True):
+    """
+    Connect and complete one TLS handshake, accepting any certificate
+
+    Args:
+        host (str): Hostname or IP address
+        port (int): Port number
+        server_name (str): SNI name, defaults to host
+        timeout (int): Timeout in seconds for the connection and the handshake
+        min_version (str): Optional minimum protocol version, e.g. "TLSv1.2"
+        max_version (str): Optional maximum protocol version
+        alpn (tuple): Application protocols offered
+        ciphers (list): TLSv1.2 and older cipher suites offered, in order
+        ciphersuites (list): TLSv1.3 cipher suites offered, in order
+        curve (str): Only key exchange group offered, e.g. "secp384r1"
+        ocsp (bool): Ask for a stapled OCSP response
+        sessions (TLSSessionCache): Cache of sessions to resume and to keep
+            the new session in
+        resume (bool): Offer a cached session; False makes a full handshake
+            and only caches the new session
+
+    Returns:
+        TLSProbe: Outcome of the handshake
+    """
+    result = TLSProbe(host, port, server_name or host)
+    deadline = time.monotonic() + timeout
+    started = time.monotonic()
+    try:
+        sock = socket.create_connection((host, port), timeout)
+    except OSError as e:
+        result.error = _describe(e)
+        return result
+    result.connected = True
+    result.connect_ms = _elapsed_ms(started)
+    result.address = sock.getpeername()[0]
+
+    conn = _connection(result, sock, min_version, max_version, alpn, ciphers, ciphersuites, curve, ocsp)
+    cached = _offer(conn, result, sessions, min_version, max_version) if resume else None
+    started = time.monotonic()
+    try:
+        sock.setblocking(False)
+        while True:
+            try:
+                conn.do_handshake()
+                break
+            except SSL.WantReadError:
+                _wait(sock, deadline, read=True)
+            except SSL.WantWriteError:
+                _wait(sock, deadline, read=False)
+        result.handshake_ms = _elapsed_ms(started)
+        _capture(conn, result)
+        if sessions is not None and sessions.enabled:
+            if result.version == 'TLSv1.3':
+                _receive_tickets(conn, sock, min(deadline, time.monotonic() + _ticket_wait(result)))
+            _remember(conn, result, sessions, cached)
+        # A session is only resumable after a clean close
+        conn.shutdown()
+    except (SSL.Error, OSError) as e:
+        if result.handshake_ms is None:
+            result.error = _describe(e)
+    finally:
+        sock.close()
+    return result
+
+async def probe_async(host, port=443, server_name=None, timeout=5, min_version=None, max_version=None,
+                      alpn=DEFAULT_ALPN, ciphers=None, ciphersuites=None, curve=None, ocsp=True, sessions=None,
+                      resume=True):
+    """
+    Coroutine counterpart of probe, driving the handshake through memory BIOs
+
+    Args:
+        host (str): Hostname or IP address
+        port (int): Port number
+        server_name (str): SNI name, defaults to host
+        timeout (int): Timeout in seconds for the connection and the handshake
+        min_version (str): Optional minimum protocol version, e.g. "TLSv1.2"
+        max_version (str): Optional maximum protocol version
+        alpn (tuple): Application protocols offered
+        ciphers (list): TLSv1.2 and older cipher suites offered, in order
+        ciphersuites (list): TLSv1.3 cipher suites offered, in order
+        curve (str): Only key exchange group offered, e.g. "secp384r1"
+        ocsp (bool): Ask for a stapled OCSP response
+        sessions (TLSSessionCache): Cache of sessions to resume and to keep
+            the new session in
+        resume (bool): Offer a cached session; False makes a full handshake
+            and only caches the new session
+
+    Returns:
+        TLSProbe: Outcome of the handshake
+    """
+    result = TLSProbe(host, port, server_name or host)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    started = time.monotonic()
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except (OSError, asyncio.TimeoutError) as e:
+        result.error = _describe(e)
+        return result
+    result.connected = True
+    result.connect_ms = _elapsed_ms(started)
+    result.address = writer.get_extra_info('peername')[0]
+
+    conn = _connection(result, None, min_version, max_version, alpn, ciphers, ciphersuites, curve, ocsp)
+    cached = _offer(conn, result, sessions, min_version, max_version) if resume else None
+    started = time.monotonic()
+    try:
+        await asyncio.wait_for(_handshake_async(conn, reader, writer), max(0, deadline - loop.time()))
+        result.handshake_ms = _elapsed_ms(started)
+        _capture(conn, result)
+        if sessions is not None and sessions.enabled:
+            if result.version == 'TLSv1.3':
+                wait = min(deadline - loop.time(), _ticket_wait(result))
+                await _receive_tickets_async(conn, reader, wait)
+            _remember(conn, result, sessions, cached)
+        # A session is only resumable after a clean close
+        conn.shutdown()
+        writer.write(_pending(conn))
+    except (SSL.Error, OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+        if result.handshake_ms is None:
+            result.error = _describe(e)
+    finally:
+        writer.close()
+    return result
+
+def tls_session(host, port=443, min_version=None, max_version=None, resume=False):
+    """
+    Probe an endpoint once per scan
+
+    Threads and coroutines of a scan share the same probe, so every TLS
+    check reads the outcome of a single handshake. Probes with a different
+    ClientHello (version bounds) are memoized separately. The session of
+    every probe is cached for later probes of the endpoint, but only
+    offered with `resume`: a resumed handshake carries no certificate or
+    OCSP staple, so probes whose chain is inspected make a full one.
+
+    Args:
+        host (str): Hostname to connect to (also sent as SNI)
+        port (int): Port number
+        min_version (str): Optional minimum protocol version
+        max_version (str): Optional maximum protocol version
+        resume (bool): Resume a cached session of the endpoint when there is one
+
+    Returns:
+        TLSProbe: Outcome of the handshake
+    """
+    return memoize(
+        ("tls_probe", host, port, min_version, max_version, resume),
+        lambda: probe(host, port, min_version=min_version, max_version=max_version, sessions=session_cache,
+                      resume=resume)
+    )
+
+async def tls_session_async(host, port=443, min_version=None, max_version=None, resume=False):
+    """
+    Coroutine counterpart of tls_session
+
+    Args:
+        host (str): Hostname to connect to (also sent as SNI)
+        port (int): Port number
+        min_version (str): Optional minimum protocol version
+        max_version (str): Optional maximum protocol version
+        resume (bool): Resume a cached session of the endpoint when there is one
+
+    Returns:
+        TLSProbe: Outcome of the handshake
+    """
+    return await memoize_async(
+        ("tls_probe", host, port, min_version, max_version, resume),
+        lambda: probe_async(host, port, min_version=min_version, max_version=max_version, sessions=session_cache,
+                            resume=resume)
+    )
+
+def _connection(result, sock, min_version, max_version, alpn, ciphers, ciphersuites, curve, ocsp):
+    """Client connection recording the stapled OCSP response into `result`"""
+    context = SSL.Context(SSL.SSLv23_METHOD)
+    # Accept any certificate so invalid ones can be inspected too
+    context.set_verify(SSL.VERIFY_PEER, lambda *args: True)
+    if min_version:
+        context.set_min_proto_version(VERSIONS[min_version])
+    if max_version:
+        context.set_max_proto_version(VERSIONS[max_version])
+    if alpn:
+        context.set_alpn_protos(list(alpn))
+    if ciphers:
+        context.set_cipher_list(":".join(list(ciphers) + [LEGACY_SECURITY_LEVEL]).encode())
+    if ciphersuites:
+        if not _lib.SSL_CTX_set_ciphersuites(context._context, ":".join(ciphersuites).encode()):
+            raise ValueError(f"Unknown TLSv1.3 cipher suites: {ciphersuites}")
+    if curve:
+        context.set_tmp_ecdh(crypto.get_elliptic_curve(curve))
+
+    if ocsp:
+        def ocsp_callback(conn, response, data):
+            result.ocsp_response = response or None
+            return True
+        context.set_ocsp_client_callback(ocsp_callback)
+
+    conn = SSL.Connection(context, sock)
+    conn.set_tlsext_host_name(result.server_name.encode())
+    if ocsp:
+        conn.request_ocsp()
+    conn.set_connect_state()
+    return conn
+
+def _offer(conn, result, sessions, min_version, max_version):
+    """Offer the cached session of the endpoint, once connected"""
+    if sessions is None or not sessions.enabled:
+        return None
+    cached = sessions.get(result.address, result.port, result.server_name, min_version, max_version)
+    if cached is not None:
+        conn.set_session(cached.session)
+    return cached
+
+def _remember(conn, result, sessions, cached):
+    """Complete a resumed probe from its cached session and cache the new session"""
+    result.resumed = bool(_lib.SSL_session_reused(conn._ssl))
+    sessions.record(cached is not None, result.resumed)
+    if result.resumed:
+        result.chain = result.chain or cached.chain
+        result.ocsp_response = result.ocsp_response or cached.ocsp_response
+        result.group = result.group or cached.group
+
+    session = conn.get_session()
+    if session is None or (result.version == 'TLSv1.3' and not _has_ticket(conn)):
+        return
+    lifetime = (_lib.SSL_SESSION_get_ticket_lifetime_hint(session._session)
+                or _lib.SSL_SESSION_get_timeout(session._session))
+    sessions.put(result.address, result.port, result.server_name, CachedSession(
+        session, result.version, result.chain, result.ocsp_response, result.group, time.time() + lifetime
+    ))
+
+def _has_ticket(conn):
+    session = conn.get_session()
+    return session is not None and bool(_lib.SSL_SESSION_has_ticket(session._session))
+
+def _ticket_wait(result):
+    """Seconds to wait for session tickets, a few connect round trips"""
+    return max(0.05, TICKET_WAIT_RTTS * (result.connect_ms or 0) / 1000)
+
+def _receive_tickets(conn, sock, deadline):
+    """Process the TLSv1.3 session tickets sent after the handshake"""
+    while not _has_ticket(conn):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not _ready(sock, selectors.EVENT_READ, remaining):
+            return
+        try:
+            conn.recv(1)
+            return
+        except SSL.WantReadError:
+            continue
+        except (SSL.Error, OSError):
+            return
+
+async def _receive_tickets_async(conn, reader, wait):
+    """Coroutine counterpart of _receive_tickets for memory-BIO connections"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+    while not _has_ticket(conn):
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            return
+        try:
+            incoming = await asyncio.wait_for(reader.read(65536), remaining)
+        except asyncio.TimeoutError:
+            return
+        if not incoming:
+            return
+        conn.bio_write(incoming)
+        try:
+            conn.recv(1)
+            return
+        except SSL.WantReadError:
+            continue
+        except (SSL.Error, OSError):
+            return
+
+def _pending(conn):
+    """Records a memory-BIO connection has written and not yet sent"""
+    outgoing = b''
+    while True:
+        try:
+            outgoing += conn.bio_read(65536)
+        except SSL.WantReadError:
+            return outgoing
+
+async def _handshake_async(conn, reader, writer):
+    """Shuttle handshake records between a memory-BIO connection and a stream"""
+    while True:
+        try:
+            conn.do_handshake()
+            done = True
+        except SSL.WantReadError:
+            done = False
+        outgoing = _pending(conn)
+        if outgoing:
+            writer.write(outgoing)
+            await writer.drain()
+        if done:
+            return
+        incoming = await reader.read(65536)
+        if not incoming:
+            raise ConnectionResetError("Connection closed during the TLS handshake")
+        conn.bio_write(incoming)
+
+def _capture(conn, result):
+    """Copy the negotiated parameters and the peer chain into `result`"""
+    result.version = conn.get_protocol_version_name()
+    result.cipher = conn.get_cipher_name()
+    result.cipher_bits = conn.get_cipher_bits()
+    result.alpn = conn.get_alpn_proto_negotiated().decode('ascii', 'replace') or None
+    result.group = _server_group(conn)
+    chain = conn.get_peer_cert_chain() or []
+    if not chain and conn.get_peer_certificate() is not None:
+        chain = [conn.get_peer_certificate()]
+    result.chain = [crypto.dump_certificate(crypto.FILETYPE_ASN1, cert) for cert in chain]
+
+def _server_group(conn):
+    """Name of the negotiated (EC)DHE group, e.g. "X25519", or None"""
+    key = _ffi.new('EVP_PKEY **')
+    if not _lib.SSL_get_server_tmp_key(conn._ssl, key) or key[0] == _ffi.NULL:
+        return None
+    pkey = _ffi.gc(key[0], _lib.EVP_PKEY_free)
+    nid = _lib.EVP_PKEY_id(pkey)
+    if nid == _lib.EVP_PKEY_EC:
+        ec_key = _ffi.gc(_lib.EVP_PKEY_get1_EC_KEY(pkey), _lib.EC_KEY_free)
+        nid = _lib.EC_GROUP_get_curve_name(_lib.EC_KEY_get0_group(ec_key))
+    name = _lib.OBJ_nid2sn(nid)
+    return _ffi.string(name).decode('ascii') if name != _ffi.NULL else None
+
+def _wait(sock, deadline, read):
+    """Wait until a non-blocking socket is ready, raising TimeoutError at the deadline"""
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise TimeoutError("TLS handshake timed out")
+    if not _ready(sock, selectors.EVENT_READ if read else selectors.EVENT_WRITE, remaining):
+        raise TimeoutError("TLS handshake timed out")
+
+def _ready(sock, event, timeout):
+    """True once the socket is ready for `event` within `timeout` seconds
+
+    Uses a selector rather than select.select, which cannot watch file
+    descriptors of 1024 and above.
+    """
+    with selectors.DefaultSelector() as selector:
+        selector.register(sock, event)
+        return bool(selector.select(timeout))
+
+def _elapsed_ms(started):
+    return round((time.monotonic() - started) * 1000, 1)
+
+def _describe(error):
+    """Readable text for connection and handshake errors"""
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, socket.timeout)) and not str(error):
+        return "Timed out"
+    if isinstance(error, SSL.Error) and error.args and isinstance(error.args[0], list):
+        reasons = [entry[2] for entry in error.args[0] if len(entry) > 2]
+        if reasons:
+            return ", ".join(reasons)
+    return str(error) or type(error).__name__
@@ -0,0 +1,150 @@
+"""
+TLS session cache for Internet security tests.
+Keeps resumable sessions per endpoint so later probes can skip the full key exchange.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Default number of cached sessions
+DEFAULT_MAX_ENTRIES = 10000
+
+# Protocol versions, oldest first
+_VERSIONS = ('TLSv1', 'TLSv1.1', 'TLSv1.2', 'TLSv1.3')
+
+class CachedSession:
+    """
+    A resumable session and what its full handshake revealed
+
+    A resumed handshake does not carry the certificate chain or a stapled
+    OCSP response, so they are kept from the handshake that established
+    the session.
+    """
+    __slots__ = ('session', 'version', 'chain', 'ocsp_response', 'group', 'expires')
+
+    def __init__(self, session, version, chain, ocsp_response, group, expires):
+        self.session = session
+        self.version = version
+        self.chain = chain
+        self.ocsp_response = ocsp_response
+        self.group = group
+        self.expires = expires
+
+class TLSSessionCache:
+    """
+    Thread-safe LRU cache of TLS sessions keyed by (IP, port, SNI, version)
+
+    Sessions expire with the lifetime hint of their ticket, capped at
+    `ttl`. TLSv1.3 tickets are removed when handed out, as RFC 8446
+    (appendix C.4) asks clients not to use a ticket twice; the resumed
+    connection brings a fresh one. When full, the least recently used
+    session is evicted.
+
+    Args:
+        max_entries (int): Maximum number of cached sessions, 0 disables the cache
+        ttl (int): Upper bound on the lifetime of a session in seconds
+    """
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.handshakes = 0
+        self.offered = 0
+        self.resumed = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def get(self, address, port, server_name, min_version=None, max_version=None):
+        """
+        Take the session of the newest protocol version within the bounds
+
+        Args:
+            address (str): IP address connected to
+            port (int): Port number
+            server_name (str): SNI name sent
+            min_version (str): Optional minimum protocol version
+            max_version (str): Optional maximum protocol version
+
+        Returns:
+            CachedSession: Session to offer, or None
+        """
+        low = _VERSIONS.index(min_version) if min_version else 0
+        high = _VERSIONS.index(max_version) if max_version else len(_VERSIONS) - 1
+        now = time.time()
+        with self._lock:
+            for version in reversed(_VERSIONS[low:high + 1]):
+                key = (address, port, server_name, version)
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                if entry.expires <= now:
+                    del self._entries[key]
+                    continue
+                if version == 'TLSv1.3':
+                    del self._entries[key]
+                else:
+                    self._entries.move_to_end(key)
+                return entry
+        return None
+
+    def put(self, address, port, server_name, entry):
+        """
+        Cache a session
+
+        Args:
+            address (str): IP address connected to
+            port (int): Port number
+            server_name (str): SNI name sent
+            entry (CachedSession): Session with the data of its full handshake
+        """
+        if not self.enabled or entry.expires <= time.time():
+            return
+        entry.expires = min(entry.expires, time.time() + self.ttl)
+        with self._lock:
+            key = (address, port, server_name, entry.version)
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def record(self, offered, resumed):
+        """
+        Count a handshake made with the cache
+
+        Args:
+            offered (bool): Whether a cached session was offered
+            resumed (bool): Whether the server resumed it
+        """
+        with self._lock:
+            self.handshakes += 1
+            self.offered += offered
+            self.resumed += resumed
+
+    def clear(self):
+        """Remove all sessions"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Handshake, resumption and eviction counters as a dict"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "handshakes": self.handshakes,
+                "offered": self.offered,
+                "resumed": self.resumed,
+                "evictions": self.evictions,
+                "resumption_rate": round(self.resumed / self.handshakes, 4) if self.handshakes else None
+            }
+
+# Sessions shared by all scans in this process
+session_cache = TLSSessionCache()
@@ -0,0 +1,328 @@
+"""
+Upstream resolver pool for Internet security tests.
+Routes each DNS query to the fastest healthy upstream and fails over on errors.
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import deque
+import dns.message
+from dns.resolver import NXDOMAIN, NoAnswer, LifetimeTimeout, NoNameservers
+from .dns_transport import MultiplexedTransport
+
+logger = logging.getLogger(__name__)
+
+# Weight of a new sample in the smoothed RTT and failure rate (RFC 6298 uses 1/8)
+RTT_ALPHA = 0.125
+FAILURE_ALPHA = 0.1
+
+# Latency samples kept per upstream for percentiles
+SAMPLES = 256
+
+# Samples needed before hedging trusts the percentile
+MIN_HEDGE_SAMPLES = 20
+
+class Upstream:
+    """
+    Health and latency of one upstream resolver
+
+    Args:
+        address (str): IP address
+        port (int): Port
+    """
+    def __init__(self, address, port=53):
+        self.address = address
+        self.port = port
+        self.srtt = None
+        self.rttvar = None
+        self.failure_rate = 0.0
+        self.queries = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self._samples = deque(maxlen=SAMPLES)
+        self._lock = threading.Lock()
+
+    @property
+    def server(self):
+        return (self.address, self.port)
+
+    def healthy(self, now=None):
+        """True unless the upstream is currently ejected"""
+        return (now or time.monotonic()) >= self.ejected_until
+
+    def score(self):
+        """Expected cost of a query; upstreams without samples are tried first"""
+        return (self.srtt or 0.0) * (1 + 10 * self.failure_rate)
+
+    def percentile(self, fraction):
+        """Latency percentile of the recent samples, or None without enough samples"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < MIN_HEDGE_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+    def record_success(self, rtt):
+        """Count an answered query (including NXDOMAIN and NoAnswer)"""
+        with self._lock:
+            self.queries += 1
+            self.consecutive_failures = 0
+            self.failure_rate *= 1 - FAILURE_ALPHA
+            self._samples.append(rtt)
+            if self.srtt is None:
+                self.srtt, self.rttvar = rtt, rtt / 2
+            else:
+                self.rttvar += RTT_ALPHA * (abs(self.srtt - rtt) - self.rttvar)
+                self.srtt += RTT_ALPHA * (rtt - self.srtt)
+
+    def record_failure(self, eject_after, eject_seconds):
+        """
+        Count a timeout or error response and eject the upstream if it keeps failing
+
+        Returns:
+            bool: True if the upstream was ejected
+        """
+        with self._lock:
+            self.queries += 1
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.failure_rate += FAILURE_ALPHA * (1 - self.failure_rate)
+            if self.consecutive_failures < eject_after:
+                return False
+            self.consecutive_failures = 0
+            self.ejections += 1
+            self.ejected_until = time.monotonic() + eject_seconds
+            return True
+
+    def snapshot(self):
+        """Current health and latency as a dict"""
+        p50 = self.percentile(0.5)
+        p90 = self.percentile(0.9)
+        with self._lock:
+            return {
+                "address": self.address,
+                "port": self.port,
+                "healthy": self.healthy(),
+                "srtt_ms": round(self.srtt * 1000, 1) if self.srtt is not None else None,
+                "rttvar_ms": round(self.rttvar * 1000, 1) if self.rttvar is not None else None,
+                "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+                "p90_ms": round(p90 * 1000, 1) if p90 is not None else None,
+                "queries": self.queries,
+                "failures": self.failures,
+                "failure_rate": round(self.failure_rate, 4),
+                "ejections": self.ejections
+            }
+
+class UpstreamPool:
+    """
+    Pool of upstream resolvers used as a DNS transport
+
+    Each query goes to the healthy upstream with the lowest smoothed RTT,
+    weighted by its recent failure rate. Timeouts and SERVFAIL/REFUSED
+    answers count as failures: the query fails over to the next upstream
+    and an upstream failing `eject_after` times in a row is left out for
+    `eject_seconds`. When every upstream is ejected the pool still uses
+    them rather than failing every lookup.
+
+    With `hedge_percentile`, a second query is sent to the next best
+    upstream once the first has taken longer than that latency percentile
+    of its upstream; the first usable answer wins.
+
+    Queries with explicit nameservers bypass the pool.
+
+    Args:
+        upstreams (list): Addresses or (address, port) tuples
+        transport (LoopTransport): Transport sending the queries (UDP or DNS-over-TLS)
+        attempt_timeout (float): Seconds before failing over to the next upstream
+        eject_after (int): Consecutive failures that eject an upstream
+        eject_seconds (float): Seconds an ejected upstream is left out
+        hedge_percentile (float): Latency percentile (0-1) after which a
+            hedged query is sent, None to disable hedging
+    """
+    def __init__(self, upstreams, transport=None, attempt_timeout=2.0, eject_after=3, eject_seconds=30,
+                 hedge_percentile=None):
+        if not upstreams:
+            raise ValueError("At least one upstream resolver is required")
+        self.upstreams = [
+            Upstream(upstream) if isinstance(upstream, str) else Upstream(*upstream) for upstream in upstreams
+        ]
+        self.transport = transport or MultiplexedTransport(nameservers=[upstream.address for upstream in self.upstreams])
+        self.attempt_timeout = attempt_timeout
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self.hedge_percentile = hedge_percentile
+        self.failovers = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def resolve(self, domain, record_type='A', timeout=5, nameservers=None, use_dnssec=False):
+        """
+        Resolve a DNS record through the best upstream, blocking the calling thread
+
+        Args:
+            domain (str): Domain name to query
+            record_type (str): DNS record type
+            timeout (int): Overall timeout in seconds, across failovers
+            nameservers (list): Explicit nameservers, bypassing the pool
+            use_dnssec (bool): Set the DO and CD bits
+
+        Returns:
+            dns.resolver.Answer: DNS answer
+        """
+        return self.transport.run(self._resolve(domain, record_type, timeout, nameservers, use_dnssec))
+
+    async def resolve_async(self, domain, record_type='A', timeout=5, nameservers=None, use_dnssec=False):
+        """
+        Coroutine counterpart of resolve
+
+        Args:
+            domain (str): Domain name to query
+            record_type (str): DNS record type
+            timeout (int): Overall timeout in seconds, across failovers
+            nameservers (list): Explicit nameservers, bypassing the pool
+            use_dnssec (bool): Set the DO and CD bits
+
+        Returns:
+            dns.resolver.Answer: DNS answer
+        """
+        return await self.transport.run_async(self._resolve(domain, record_type, timeout, nameservers, use_dnssec))
+
+    def stats(self):
+        """Per-upstream health and latency, and pool counters"""
+        return {
+            "upstreams": [upstream.snapshot() for upstream in self.upstreams],
+            "failovers": self.failovers,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "transport": self.transport.stats()
+        }
+
+    def close(self):
+        """Close the underlying transport"""
+        self.transport.close()
+
+    def select(self, exclude=()):
+        """
+        Best upstream for the next query
+
+        Args:
+            exclude (iterable): Upstreams already tried for this query
+
+        Returns:
+            Upstream: Chosen upstream, or None if all were tried
+        """
+        candidates = [upstream for upstream in self.upstreams if upstream not in exclude]
+        if not candidates:
+            return None
+        now = time.monotonic()
+        healthy = [upstream for upstream in candidates if upstream.healthy(now)]
+        if not healthy:
+            # Everything is ejected: try the one coming back first
+            return min(candidates, key=lambda upstream: upstream.ejected_until)
+        best = min(upstream.score() for upstream in healthy)
+        return random.choice([upstream for upstream in healthy if upstream.score() == best])
+
+    async def _resolve(self, domain, record_type, timeout, nameservers, use_dnssec):
+        """Query upstreams in order of preference until one answers"""
+        if nameservers:
+            return await self.transport.query(domain, record_type, timeout, nameservers, use_dnssec)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        tried = []
+        errors = []
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise LifetimeTimeout(timeout=timeout, errors=errors)
+            upstream = self.select(tried)
+            if upstream is None:
+                raise NoNameservers(request=dns.message.make_query(domain, record_type), errors=errors)
+            if tried:
+                self.failovers += 1
+            tried.append(upstream)
+
+            try:
+                return await self._attempt(upstream, tried, domain, record_type,
+                                           min(remaining, self.attempt_timeout), use_dnssec)
+            except (NXDOMAIN, NoAnswer):
+                raise
+            except Exception as e:
+                errors.append((upstream.address, False, upstream.port, e, None))
+
+    async def _attempt(self, primary, tried, domain, record_type, timeout, use_dnssec):
+        """Query one upstream, hedging to a second one if it is slow"""
+        first = asyncio.ensure_future(self._query(primary, domain, record_type, timeout, use_dnssec))
+        delay = primary.percentile(self.hedge_percentile) if self.hedge_percentile else None
+        if delay is None or delay >= timeout:
+            return await first
+
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        secondary = None if done else self.select(tried)
+        if secondary is None:
+            return await first
+
+        tried.append(secondary)
+        self.hedges += 1
+        second = asyncio.ensure_future(self._query(secondary, domain, record_type, timeout - delay, use_dnssec))
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None or isinstance(task.exception(), (NXDOMAIN, NoAnswer)):
+                    for other in pending:
+                        other.cancel()
+                    if task is second:
+                        self.hedge_wins += 1
+                    return task.result()
+                error = task.exception()
+        raise error
+
+    async def _query(self, upstream, domain, record_type, timeout, use_dnssec):
+        """Send a query to one upstream and record its latency or failure"""
+        started = time.monotonic()
+        try:
+            answer = await self.transport.query(domain, record_type, timeout, [upstream.server], use_dnssec)
+        except (NXDOMAIN, NoAnswer):
+            upstream.record_success(time.monotonic() - started)
+            raise
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            if upstream.record_failure(self.eject_after, self.eject_seconds):
+                logger.warning(f"Ejected DNS upstream {upstream.address}:{upstream.port} "
+                               f"for {self.eject_seconds}s after repeated failures")
+            raise
+        upstream.record_success(time.monotonic() - started)
+        return answer
+
+def parse_upstreams(text, default_port=53):
+    """
+    Parse a comma separated upstream list such as "1.1.1.1, 9.9.9.9:53, [2606:4700::1111]:53"
+
+    Args:
+        text (str): Upstream list
+        default_port (int): Port of the upstreams listed without one
+
+    Returns:
+        list: (address, port) tuples
+    """
+    upstreams = []
+    for item in (text or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        if item.startswith('['):
+            address, _, port = item[1:].partition(']')
+            port = port.lstrip(':')
+        elif item.count(':') == 1:
+            address, _, port = item.partition(':')
+        else:
+            address, port = item, ''
+        upstreams.append((address, int(port) if port else default_port))
+    return upstreams
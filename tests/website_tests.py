@@ -1,16 +1,23 @@
 import logging
 from .scoring import Score, TestStatus
 from .shared import dns_lookup
+from .scheduler import Category, run_suite, run_suite_async
+from .result_cache import run_cached_suite
+from .context import ScanContext, scan_context
 from . import tls, ipv6, dnssec, appsecpriv
 
 logger = logging.getLogger(__name__)
 
-def run_website_tests(domain):
+def run_website_tests(domain, max_workers=None, on_check=None, on_category=None, cache=None):
     """
     Run all website tests for a given domain
     
     Args:
         domain (str): Domain name to test
+        max_workers (int): Maximum number of sub-checks running concurrently
+        on_check (callable): Optional callback(category, test, result) per finished sub-check
+        on_category (callable): Optional callback(category, result) per finished category
+        cache (ResultCache): Optional cache of category results
     
     Returns:
         dict: Results of all tests
@@ -26,20 +33,77 @@ def run_website_tests(domain):
         "score": None
     }
     
+    context = ScanContext()
     try:
-        # Run tests for each category
-        ipv6_results = ipv6.test_ipv6_website(domain)
-        dnssec_results = dnssec.test_dnssec(domain)
-        tls_results = tls.test_tls_website(domain)
-        appsecpriv_results = appsecpriv.test_website_security(domain)
+        with scan_context(context):
+            # Run the sub-checks of all categories as one dependency graph
+            if cache is not None:
+                # Reuse cached categories and only scan the missing ones
+                results["categories"], results["cache"] = run_cached_suite(
+                    cache,
+                    "website",
+                    domain,
+                    get_categories(domain),
+                    max_workers=max_workers,
+                    on_check=on_check,
+                    on_category=on_category
+                )
+            else:
+                results["categories"] = run_suite(
+                    get_categories(domain),
+                    max_workers=max_workers,
+                    on_check=on_check,
+                    on_category=on_category
+                )
         
-        # Combine results
-        results["categories"] = {
-            "ipv6": ipv6_results,
-            "dnssec": dnssec_results,
-            "tls": tls_results,
-            "appsecpriv": appsecpriv_results
-        }
+        # Calculate overall score
+        results["score"] = calculate_website_score(results["categories"])
+        results["status"] = TestStatus.DONE.value
+        
+    except Exception as e:
+        logger.error(f"Error in website test for {domain}: {str(e)}")
+        results["status"] = TestStatus.ERROR.value
+        results["error"] = str(e)
+    
+    results["lookups"] = context.report()
+    
+    return results
+
+async def run_website_tests_async(domain, max_concurrency=None, on_check=None, on_category=None):
+    """
+    Run all website tests for a given domain on the running event loop
+    
+    Network probes use asyncio, so many scans can be in flight in one process.
+    
+    Args:
+        domain (str): Domain name to test
+        max_concurrency (int): Maximum number of sub-checks running concurrently
+        on_check (callable): Optional callback(category, test, result) per finished sub-check
+        on_category (callable): Optional callback(category, result) per finished category
+    
+    Returns:
+        dict: Results of all tests
+    """
+    logger.info(f"Running website tests (async) for domain: {domain}")
+    
+    # Initialize results dictionary
+    results = {
+        "domain": domain,
+        "timestamp": _get_timestamp(),
+        "status": TestStatus.RUNNING.value,
+        "categories": {},
+        "score": None
+    }
+    
+    context = ScanContext()
+    try:
+        with scan_context(context):
+            results["categories"] = await run_suite_async(
+                get_categories(domain),
+                max_concurrency=max_concurrency,
+                on_check=on_check,
+                on_category=on_category
+            )
         
         # Calculate overall score
         results["score"] = calculate_website_score(results["categories"])
@@ -50,8 +114,27 @@ def run_website_tests(domain):
         results["status"] = TestStatus.ERROR.value
         results["error"] = str(e)
     
+    results["lookups"] = context.report()
+    
     return results
 
+def get_categories(domain):
+    """
+    Build the website test categories for a given domain
+    
+    Args:
+        domain (str): Domain name to test
+    
+    Returns:
+        dict: Mapping of category key to Category
+    """
+    return {
+        "ipv6": Category("IPv6", ipv6.get_website_checks(domain)),
+        "dnssec": Category("DNSSEC", dnssec.get_checks(domain)),
+        "tls": Category("TLS", tls.get_website_checks(domain)),
+        "appsecpriv": Category("Security & Privacy", appsecpriv.get_checks(domain))
+    }
+
 def calculate_website_score(categories):
     """
     Calculate the overall score for website tests